@@ -1,20 +1,66 @@
 #!/usr/bin/env python3
 
-from flask import Flask, render_template, request, jsonify
+from flask import (Flask, render_template, request, jsonify, Response, stream_template, stream_with_context,
+                   make_response, redirect, abort, has_request_context, before_render_template, template_rendered,
+                   copy_current_request_context)
 import mariadb
 import os
 from dotenv import load_dotenv
-from collections import namedtuple, Counter
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from itertools import groupby
+from operator import itemgetter
+from urllib.parse import urlencode
+import base64
+import binascii
+import functools
+import hashlib
+import json
 import re
+import statistics
+import tempfile
+import threading
+import time
+
+from exports import EXPORT_FORMATS, stream_export
+from gene_index import GeneAutocompleteIndex
+from metrics import ROW_BUCKETS, MetricsRegistry
+from region_index import EnhancerIndex
+from result_cache import MISS, ResultCache
+from slow_queries import DEFAULT_LOG as DEFAULT_SLOW_QUERY_LOG, SlowQueryLog, explain
+from summaries import BIN_SIZE, LENGTH_BUCKET, SCORE_BUCKET, TILE_SIZES, covered_bins, tile_size
+import snapshot
 
 app = Flask(__name__)
 
 load_dotenv()
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+# Files the worker processes share with each other; only the app's user may write here
+STATE_DIR = os.getenv("STATE_DIR", os.path.join(tempfile.gettempdir(), f"starr_query-{os.getuid()}"))
 
-def connect_db():
-    return mariadb.connect(
+# "mariadb" (default) or "sqlite" to serve a snapshot file written by table_upload.py --snapshot
+DB_BACKEND = os.getenv("DB_BACKEND", "mariadb").strip().lower()
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(BASE_DIR, "starr_query.sqlite"))
+
+# Threads per process running a request's independent queries side by side (0 runs them in turn)
+QUERY_THREADS = int(os.getenv("QUERY_THREADS", 4))
+# One pool per process; the default covers the mod_wsgi daemon's threads=5 plus the query threads
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5 + QUERY_THREADS))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pool_counters = Counter()
+# Database errors seen by each thread; results computed across an error aren't cached
+_db_errors = threading.local()
+
+
+def db_config():
+    return dict(
         host=os.getenv("DB_HOST"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASS"),
@@ -22,311 +68,1100 @@ def connect_db():
         port=int(os.getenv("DB_PORT", 3306))
     )
 
+
+def get_pool():
+    """Return this process's connection pool, creating it on first use (and again after a fork)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = mariadb.ConnectionPool(
+                pool_name=f"starr_query_{os.getpid()}",
+                pool_size=DB_POOL_SIZE,
+                **db_config()
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def connect_db():
+    """Check a connection out of the pool, waiting up to DB_POOL_TIMEOUT seconds for a free one.
+
+    The connection is pinged before it is handed out and reconnected if the server
+    dropped it while idle. Calling close() on it returns it to the pool.
+
+    With DB_BACKEND=sqlite there is no pool: each checkout opens the snapshot file, which
+    costs about as much as a pool checkout and picks up a replaced snapshot straight away.
+    """
+    if DB_BACKEND == "sqlite":
+        conn = snapshot.connect(SNAPSHOT_PATH, error=mariadb.Error)
+        with _pool_lock:
+            _pool_counters['checkouts'] += 1
+            _pool_counters['in_use'] += 1
+        return conn
+
+    pool = get_pool()
+    deadline = time.monotonic() + DB_POOL_TIMEOUT
+    waited = False
+
+    while True:
+        try:
+            conn = pool.get_connection()
+        except mariadb.PoolError:
+            conn = None
+        if conn is not None:
+            break
+        if time.monotonic() >= deadline:
+            with _pool_lock:
+                _pool_counters['timeouts'] += 1
+            raise mariadb.PoolError(f"No pooled connection available after {DB_POOL_TIMEOUT}s")
+        waited = True
+        time.sleep(0.01)
+
+    try:
+        conn.ping()
+    except mariadb.Error:
+        try:
+            conn.reconnect()
+        except mariadb.Error:
+            # Give the slot back to the pool instead of losing it with the dead connection
+            close_quietly(conn)
+            raise
+        with _pool_lock:
+            _pool_counters['reconnects'] += 1
+
+    with _pool_lock:
+        _pool_counters['checkouts'] += 1
+        _pool_counters['in_use'] += 1
+        if waited:
+            _pool_counters['waits'] += 1
+    return conn
+
+
+def release_db(conn):
+    """Return a connection from connect_db() to the pool (or close the snapshot file)"""
+    with _pool_lock:
+        _pool_counters['in_use'] -= 1
+    close_quietly(conn)
+
+
+def close_quietly(conn):
+    try:
+        conn.close()
+    except mariadb.Error as e:
+        print(f"Error returning connection to pool: {e}")
+
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection for the duration of a with-block; its queries are timed"""
+    started = time.perf_counter()
+    try:
+        conn = connect_db()
+    except mariadb.Error:
+        _db_errors.count = db_error_count() + 1
+        raise
+    finally:
+        observe_connect(time.perf_counter() - started)
+    conn = TimedConnection(conn)
+    try:
+        yield conn
+    except mariadb.Error:
+        _db_errors.count = db_error_count() + 1
+        raise
+    finally:
+        release_db(conn)
+
+
+def db_error_count():
+    return getattr(_db_errors, 'count', 0)
+
+
+def pool_stats():
+    """Occupancy and lifetime counters for this process's connection pool"""
+    pool = _pool if _pool_pid == os.getpid() else None
+    with _pool_lock:
+        stats = {
+            'backend': DB_BACKEND,
+            'pid': os.getpid(),
+            'pool_size': pool.pool_size if pool else DB_POOL_SIZE,
+            'connections': pool.connection_count if pool else 0,
+            'in_use': _pool_counters['in_use'],
+            'checkouts': _pool_counters['checkouts'],
+            'waits': _pool_counters['waits'],
+            'timeouts': _pool_counters['timeouts'],
+            'reconnects': _pool_counters['reconnects'],
+        }
+    if result_cache is not None:
+        stats['result_cache'] = result_cache.stats()
+    return stats
+
+
+## Instrumentation
+# Histograms served at /metrics, summed over the workers writing to METRICS_DIR ("" keeps them per process)
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(STATE_DIR, "metrics"))
+# TIMING_LOG=1 prints one JSON line of timings per request to the Apache log
+TIMING_LOG = os.getenv("TIMING_LOG", "").strip().lower() in ("1", "true", "yes", "on")
+
+# SLOW_QUERY_MS=<ms> logs slower statements with their plans; `python slow_queries.py` reports on them
+SLOW_QUERY_MS = os.getenv("SLOW_QUERY_MS", "").strip()
+slow_query_log = SlowQueryLog(
+    os.getenv("SLOW_QUERY_LOG", DEFAULT_SLOW_QUERY_LOG),
+    float(SLOW_QUERY_MS),
+    explain_every=float(os.getenv("SLOW_QUERY_EXPLAIN_EVERY", 300)),
+    analyze=os.getenv("SLOW_QUERY_ANALYZE", "").strip().lower() in ("1", "true", "yes", "on"),
+) if SLOW_QUERY_MS else None
+
+metrics = MetricsRegistry()
+metrics.share(METRICS_DIR)
+REQUEST_SECONDS = metrics.histogram(
+    'starr_request_seconds', 'Request latency until the response body is sent', ['endpoint', 'method', 'status'])
+DB_CONNECT_SECONDS = metrics.histogram(
+    'starr_db_connect_seconds', 'Time to check out a database connection', ['endpoint'])
+DB_QUERY_SECONDS = metrics.histogram(
+    'starr_db_query_seconds', 'Time executing one query and fetching its rows', ['endpoint'])
+DB_ROWS = metrics.histogram(
+    'starr_db_rows_fetched', 'Rows fetched by one query', ['endpoint'], buckets=ROW_BUCKETS)
+PYTHON_SECONDS = metrics.histogram(
+    'starr_python_seconds', 'Grouping and aggregation time, not counting row fetches', ['endpoint', 'stage'])
+RENDER_SECONDS = metrics.histogram(
+    'starr_render_seconds', 'Template rendering time, not counting row fetches', ['endpoint', 'template'])
+
+# Seconds each thread has spent in the database, so Python stages can leave it out
+_thread_db = threading.local()
+# Start of each template render in progress on a thread, by template name
+_render_starts = threading.local()
+
+
+class RequestTimings:
+    """Totals for one request, shared with any thread that copies its request context"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.totals = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, **amounts):
+        with self._lock:
+            self.totals.update(amounts)
+
+
+def current_endpoint():
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or 'unknown'
+
+
+def request_timings():
+    return request.environ.get('starr_query.timings') if has_request_context() else None
+
+
+def thread_db_seconds():
+    return getattr(_thread_db, 'seconds', 0.0)
+
+
+def add_db_seconds(seconds):
+    _thread_db.seconds = thread_db_seconds() + seconds
+
+
+def observe_connect(seconds):
+    add_db_seconds(seconds)
+    DB_CONNECT_SECONDS.observe(seconds, endpoint=current_endpoint())
+    timings = request_timings()
+    if timings:
+        timings.add(connect_s=seconds, connections=1)
+
+
+def observe_query(seconds, rows):
+    endpoint = current_endpoint()
+    DB_QUERY_SECONDS.observe(seconds, endpoint=endpoint)
+    DB_ROWS.observe(rows, endpoint=endpoint)
+    timings = request_timings()
+    if timings:
+        timings.add(query_s=seconds, queries=1, rows=rows)
+
+
+class TimedCursor:
+    """Cursor proxy timing each query from execute() until its last row is fetched"""
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._connection = connection
+        # [seconds, rows, statement, params] of the query whose rows are being fetched
+        self._pending = None
+
+    def _timed(self, call, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            add_db_seconds(elapsed)
+            if self._pending:
+                self._pending[0] += elapsed
+
+    def _count(self, rows):
+        if self._pending:
+            self._pending[1] += rows
+
+    def finish(self):
+        if self._pending:
+            seconds, rows, statement, params = self._pending
+            self._pending = None
+            observe_query(seconds, rows)
+            if slow_query_log and slow_query_log.is_slow(seconds):
+                self._connection.slow_queries.append((statement, params, seconds, rows, current_endpoint()))
+
+    def execute(self, statement, params=(), *args, **kwargs):
+        self.finish()
+        self._pending = [0.0, 0, statement, params]
+        return self._timed(self._cursor.execute, statement, params, *args, **kwargs)
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is None:
+            self.finish()
+        else:
+            self._count(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._timed(self._cursor.fetchmany, *args, **kwargs)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._count(len(rows))
+        self.finish()
+        return rows
+
+    def __iter__(self):
+        rows = iter(self._cursor)
+        while True:
+            try:
+                row = self._timed(next, rows)
+            except StopIteration:
+                self.finish()
+                return
+            self._count(1)
+            yield row
+
+    def close(self):
+        self.finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Connection proxy handing out TimedCursors; close() records queries left half-fetched"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursors = []
+        # (statement, params, seconds, rows, endpoint) over SLOW_QUERY_MS, logged on close
+        self.slow_queries = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = TimedCursor(self._conn.cursor(*args, **kwargs), self)
+        self._cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        for cursor in self._cursors:
+            cursor.finish()
+        if self.slow_queries:
+            self.log_slow_queries()
+        self._conn.close()
+
+    def log_slow_queries(self):
+        """Log this connection's slow statements, explaining them here before it goes back to the pool"""
+        for cursor in self._cursors:
+            try:
+                cursor.close()
+            except mariadb.Error:
+                pass
+        for statement, params, seconds, rows, endpoint in self.slow_queries:
+            plan = None
+            if slow_query_log.wants_plan(statement):
+                try:
+                    cursor = self._conn.cursor()
+                    plan = explain(cursor, statement, params, snapshot=DB_BACKEND == "sqlite",
+                                   analyze=slow_query_log.analyze)
+                    cursor.close()
+                except (mariadb.Error, ValueError, TypeError) as e:
+                    print(f"Can't explain slow query: {e}")
+            slow_query_log.record(statement, params, seconds, rows, endpoint, plan)
+        self.slow_queries = []
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@contextmanager
+def timed_stage(stage):
+    """Time Python work (also as a decorator), minus database time spent inside it, e.g. iterating a live cursor"""
+    started, db_before = time.perf_counter(), thread_db_seconds()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started - (thread_db_seconds() - db_before)
+        PYTHON_SECONDS.observe(seconds, endpoint=current_endpoint(), stage=stage)
+        timings = request_timings()
+        if timings:
+            timings.add(python_s=seconds)
+
+
+@before_render_template.connect_via(app)
+def start_render_timing(sender, template, context, **extra):
+    if not hasattr(_render_starts, 'by_name'):
+        _render_starts.by_name = {}
+    _render_starts.by_name[template.name] = (time.perf_counter(), thread_db_seconds())
+
+
+@template_rendered.connect_via(app)
+def finish_render_timing(sender, template, context, **extra):
+    # Streamed templates signal this once their last chunk is generated
+    started = getattr(_render_starts, 'by_name', {}).pop(template.name, None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started[0] - (thread_db_seconds() - started[1])
+    RENDER_SECONDS.observe(seconds, endpoint=current_endpoint(), template=template.name)
+    timings = request_timings()
+    if timings:
+        timings.add(render_s=seconds)
+
+
+@app.before_request
+def start_request_timing():
+    request.environ['starr_query.timings'] = RequestTimings()
+
+
+@app.after_request
+def finish_request_timing(response):
+    timings = request_timings()
+    if timings is None:
+        return response
+    endpoint, method, path, status = current_endpoint(), request.method, request.path, response.status_code
+
+    def record():
+        seconds = time.perf_counter() - timings.started
+        REQUEST_SECONDS.observe(seconds, endpoint=endpoint, method=method, status=status)
+        if TIMING_LOG:
+            totals = timings.totals
+            print(json.dumps({
+                'event': 'request_timing', 'endpoint': endpoint, 'method': method, 'path': path,
+                'status': status, 'total_ms': round(seconds * 1000, 2),
+                'connect_ms': round(totals['connect_s'] * 1000, 2), 'connections': totals['connections'],
+                'query_ms': round(totals['query_s'] * 1000, 2), 'queries': totals['queries'],
+                'rows': totals['rows'], 'python_ms': round(totals['python_s'] * 1000, 2),
+                'render_ms': round(totals['render_s'] * 1000, 2),
+            }), flush=True)
+        metrics.maybe_write(METRICS_DIR)
+
+    # Runs once a streamed body has been sent, not when the view returns
+    response.call_on_close(record)
+    return response
+
+## Concurrent queries
+_query_executor = None
+_query_executor_pid = None
+_query_executor_lock = threading.Lock()
+# Set on query threads, whose own run_concurrently() calls run in turn
+_query_thread = threading.local()
+
+
+def query_executor():
+    """This process's query threads, started on first use (and again after a fork)"""
+    global _query_executor, _query_executor_pid
+    with _query_executor_lock:
+        if _query_executor is None or _query_executor_pid != os.getpid():
+            _query_executor = ThreadPoolExecutor(max_workers=QUERY_THREADS, thread_name_prefix="query")
+            _query_executor_pid = os.getpid()
+        return _query_executor
+
+
+def on_query_thread(call):
+    """call wrapped to run on a query thread, with a copy of the current request context if there is one"""
+    if has_request_context():
+        call = copy_current_request_context(call)
+
+    def run():
+        _query_thread.active = True
+        errors = db_error_count()
+        try:
+            return call()
+        finally:
+            _query_thread.active = False
+            run.db_errors = db_error_count() - errors
+    return run
+
+
+def run_concurrently(*calls):
+    """Run independent zero-argument calls at the same time and return their results in order.
+
+    The first runs on the calling thread and the others on the query threads, each
+    borrowing its own pooled connection, so the wait is the slowest call rather than
+    the sum. Called from a query thread, the calls run in turn instead, as waiting on
+    the executor from inside it could deadlock. Exceptions are re-raised here, and
+    database errors the query threads swallowed count towards db_error_count() here.
+    """
+    if len(calls) < 2 or QUERY_THREADS < 1 or getattr(_query_thread, 'active', False):
+        return [call() for call in calls]
+
+    executor = query_executor()
+    runs = [on_query_thread(call) for call in calls[1:]]
+    futures = [executor.submit(run) for run in runs]
+    try:
+        results = [calls[0]()]
+        results.extend(future.result() for future in futures)
+    finally:
+        wait(futures)
+        _db_errors.count = db_error_count() + sum(getattr(run, 'db_errors', 0) for run in runs)
+    return results
+
+
+## Data version
+# table_upload.py bumps Data_version after every successful load; workers re-read it
+# at most once per DATA_VERSION_TTL seconds and drop anything cached for an older version.
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", 30))
+
+_data_version = {'version': None, 'loaded_at': None, 'checked_at': None}
+_version_cache = {}
+_version_lock = threading.Lock()
+
+
+def current_data_version():
+    """Return the dataset version recorded by table_upload.py, or None if it can't be read"""
+    with _version_lock:
+        checked_at = _data_version['checked_at']
+        if checked_at is not None and time.monotonic() - checked_at < DATA_VERSION_TTL:
+            return _data_version['version']
+
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version, loaded_at FROM Data_version WHERE id = 1")
+            row = cursor.fetchone()
+    except mariadb.Error as e:
+        print(f"Error reading data version: {e}")
+        row = None
+
+    with _version_lock:
+        _data_version['version'], _data_version['loaded_at'] = row if row else (None, None)
+        _data_version['checked_at'] = time.monotonic()
+        return _data_version['version']
+
+
+def data_version_stamp():
+    """(version, load time as an aware UTC datetime or None) of the current dataset"""
+    version = current_data_version()
+    with _version_lock:
+        loaded_at = _data_version['loaded_at']
+    if isinstance(loaded_at, str):
+        # SQLite snapshots hand back the timestamp as text
+        try:
+            loaded_at = datetime.fromisoformat(loaded_at)
+        except ValueError:
+            loaded_at = None
+    if loaded_at is not None and loaded_at.tzinfo is None:
+        loaded_at = loaded_at.replace(tzinfo=timezone.utc)
+    return version, loaded_at
+
+
+def cached_for_data_version(key, loader):
+    """Return loader()'s result, reusing it until the dataset version changes.
+
+    A database without a Data_version table reports None, which is cached like any
+    other version; the next table_upload.py run creates the marker and invalidates it.
+    """
+    version = current_data_version()
+    with _version_lock:
+        entry = _version_cache.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+    value = loader()
+    with _version_lock:
+        _version_cache[key] = (version, value)
+    return value
+
+
+## Shared result cache
+# Search results shared by all worker processes on the host; RESULT_CACHE_MB=0 turns it off.
+# The file holds pickles, so its directory is created private to the app's user (see result_cache.py)
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(STATE_DIR, "results.sqlite"))
+RESULT_CACHE_MB = float(os.getenv("RESULT_CACHE_MB", 64))
+
+result_cache = ResultCache(RESULT_CACHE_PATH, int(RESULT_CACHE_MB * 1024 * 1024)) if RESULT_CACHE_MB > 0 else None
+
+
+def result_cache_key(name, params, args, kwargs):
+    """Key for a search function's call; a region typed in any accepted form maps to the same key"""
+    params = dict(params)
+    if 'chr' in params and 'enhancer_name' in params:
+        region = parse_region_input(params['chr'], params['start'], params['end'], params['enhancer_name'])
+        if region[0]:
+            params.update(chr=None, start=None, end=None, enhancer_name=None, region=list(region))
+    text = json.dumps([name, params, args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def cached_result(function):
+    """Serve function(params, ...) from the shared result cache while the dataset version holds.
+
+    Without a Data_version marker nothing could invalidate an entry, so nothing is
+    cached, and results computed while a database error was swallowed aren't stored.
+    """
+    @functools.wraps(function)
+    def wrapper(params, *args, **kwargs):
+        version = current_data_version() if result_cache is not None else None
+        if version is None:
+            return function(params, *args, **kwargs)
+
+        key = result_cache_key(function.__name__, params, args, kwargs)
+        value = result_cache.get(key, version)
+        if value is not MISS:
+            return value
+
+        errors = db_error_count()
+        value = function(params, *args, **kwargs)
+        if db_error_count() == errors:
+            result_cache.put(key, version, value)
+        return value
+
+    return wrapper
+
+
 ## Get filter options:
 def get_filter_options():
-    """Fetch unique activity classes, conditions, time clusters, immune processes and broad immune roles from database"""
+    """Fetch unique activity classes, conditions, time clusters, immune processes and broad immune roles.
+
+    Served from memory until table_upload.py records a new data version.
+    """
     try:
-        conn = connect_db()
+        return cached_for_data_version('filter_options', load_filter_options)
+
+    except mariadb.Error as e:
+        print(f"Error fetching filter options: {e}")
+        return {key: [] for key in FILTER_OPTION_QUERIES}
+
+
+FILTER_OPTION_QUERIES = {
+    'conditions':
+        "SELECT DISTINCT exp_condition FROM Enhancers WHERE exp_condition IS NOT NULL ORDER BY exp_condition;",
+    'activity_classes':
+        "SELECT DISTINCT activity_class FROM Activity_class_info WHERE activity_class IS NOT NULL ORDER BY activity_class;",
+    'accessibilities':
+        "SELECT DISTINCT accessibility FROM Activity_class_info WHERE accessibility IS NOT NULL ORDER BY accessibility;",
+    'time_clusters':
+        "SELECT DISTINCT time_cluster FROM Genes WHERE time_cluster IS NOT NULL ORDER BY time_cluster;",
+    'immune_processes':
+        "SELECT DISTINCT immune_process FROM Genes WHERE immune_process IS NOT NULL ORDER BY immune_process;",
+    'broad_immune_roles':
+        "SELECT DISTINCT broad_immune_role FROM Activity_class_info WHERE broad_immune_role IS NOT NULL ORDER BY broad_immune_role;",
+    'time_clusters_tab3':
+        "SELECT DISTINCT time_cluster FROM Activity_class_info WHERE time_cluster IS NOT NULL ORDER BY time_cluster;",
+}
+
+
+def distinct_values(query):
+    with db_connection() as conn:
         cursor = conn.cursor()
+        cursor.execute(query)
+        return [row[0] for row in cursor.fetchall()]
 
-        # Get unique conditions
-        cursor.execute(
-            "SELECT DISTINCT exp_condition FROM Enhancers WHERE exp_condition IS NOT NULL ORDER BY exp_condition;")
-        conditions = [row[0] for row in cursor.fetchall()]
 
-        # Get unique activity classes
-        cursor.execute(
-            "SELECT DISTINCT activity_class FROM Activity_class_info WHERE activity_class IS NOT NULL ORDER BY activity_class;")
-        activity_classes = [row[0] for row in cursor.fetchall()]
+def load_filter_options():
+    """Run the SELECT DISTINCT queries behind the filter dropdowns, side by side"""
+    values = run_concurrently(*[functools.partial(distinct_values, query) for query in FILTER_OPTION_QUERIES.values()])
+    return dict(zip(FILTER_OPTION_QUERIES, values))
 
-        # Get unique accessibility
-        cursor.execute(
-            "SELECT DISTINCT accessibility FROM Activity_class_info WHERE accessibility IS NOT NULL ORDER BY accessibility;")
-        accessibilities = [row[0] for row in cursor.fetchall()]
+## Enhancer overlap index
+def load_enhancer_index():
+    """Build the overlap index from every enhancer's coordinates"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT eid, chromosome, start, end FROM Enhancers")
+        index = EnhancerIndex(cursor)
+    print(f"Built enhancer index: {len(index)} enhancers on {len(index.chromosomes())} chromosomes")
+    return index
 
-        # Get unique time clusters
-        cursor.execute("SELECT DISTINCT time_cluster FROM Genes WHERE time_cluster IS NOT NULL ORDER BY time_cluster;")
-        time_clusters = [row[0] for row in cursor.fetchall()]
 
-        # Get unique immune processes
-        cursor.execute(
-            "SELECT DISTINCT immune_process FROM Genes WHERE immune_process IS NOT NULL ORDER BY immune_process;")
-        immune_processes = [row[0] for row in cursor.fetchall()]
+def get_enhancer_index():
+    return cached_for_data_version('enhancer_index', load_enhancer_index)
 
-        # Get unique broad immune roles
-        cursor.execute(
-            "SELECT DISTINCT broad_immune_role FROM Activity_class_info WHERE broad_immune_role IS NOT NULL ORDER BY broad_immune_role;")
-        broad_immune_roles = [row[0] for row in cursor.fetchall()]
 
-        # Get unique time_clusters for tab 3
-        cursor.execute(
-            "SELECT DISTINCT time_cluster FROM Activity_class_info WHERE time_cluster IS NOT NULL ORDER BY time_cluster;")
-        time_clusters_tab3 = [row[0] for row in cursor.fetchall()]
+## Gene autocomplete index
+def load_gene_index():
+    """Build the typeahead index from every gene symbol and FlyBase id"""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT symbol, geneid FROM Genes")
+        index = GeneAutocompleteIndex(cursor)
+    print(f"Built gene autocomplete index: {len(index)} genes")
+    return index
 
-        conn.close()
-        filters = {
-            'conditions': conditions,
-            'activity_classes': activity_classes,
-            'accessibilities': accessibilities,
-            'time_clusters': time_clusters,
-            'immune_processes': immune_processes,
-            'broad_immune_roles': broad_immune_roles,
-            'time_clusters_tab3': time_clusters_tab3
-        }
 
-        return filters
+def get_gene_index():
+    return cached_for_data_version('gene_index', load_gene_index)
 
+
+def warm_caches():
+    """Build per-worker indexes up front so the first requests don't pay for them"""
+    try:
+        get_filter_options()
+        get_enhancer_index()
+        get_gene_index()
     except mariadb.Error as e:
-        print(f"Error fetching filter options: {e}")
-        return {
-            'conditions': [],
-            'activity_classes': [],
-            'accessibilities': [],
-            'time_clusters': [],
-            'immune_processes': [],
-            'broad_immune_roles': [],
-            'time_clusters_tab3': []
-        }
+        print(f"Error warming caches: {e}")
+
 
 ## Tab 1
-def associations_by_region(chr=None, start=None, end=None, enhancer_name=None,
-                           activity_score_min=0, exp_condition=None,
-                           time_cluster=None, immune_process=None):
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
+REGION_COLUMNS = """
+    SELECT e.name           AS enhancer_id,
+           e.en_length      AS en_length,
+           a.accessibility  AS accessibility,
+           e.chromosome     AS chromosome,
+           e.start          AS estart,
+           e.end            AS eend,
+           a.exp_condition  AS exp_condition,
+           a.activity       AS act_score,
+           g.symbol         AS gene_symbol,
+           g.geneid         AS gene_id,
+           g.tpm_ctrl       AS tpm_ctrl,
+           g.tpm_20e        AS tpm_20e,
+           g.tpm_imd        AS tpm_imd,
+           g.immune_process AS immune_process,
+           g.time_cluster   AS time_cluster
+"""
+
+REGION_FROM = """
+    FROM Enhancers e
+    JOIN Associations a ON e.eid = a.eid
+    JOIN Genes g ON a.gid = g.gid
+    WHERE a.activity >= %s
+"""
+
+# Conditions sort in their ENUM order on both backends; the snapshot stores them as text
+CONDITION_RANK = "CASE a.exp_condition WHEN 'Control' THEN 1 WHEN '20E' THEN 2 WHEN 'IMD' THEN 3 END"
+CONDITION_ORDER = {'Control': 1, '20E': 2, 'IMD': 3}
+
+REGION_ORDER = f" ORDER BY e.name, {CONDITION_RANK}, g.symbol"
+
+# The enhancer index can trail a reseed by up to DATA_VERSION_TTL, so eids looked up in it are
+# always queried together with the overlap they were found for; an eid that names another
+# enhancer in the new tables then matches nothing instead of the wrong rows
+OVERLAP_CONDITION = " AND e.chromosome = %s AND e.start <= %s AND e.end >= %s"
+
+
+def overlaps(row, chromosome, start, end):
+    """True if a REGION_COLUMNS row's enhancer overlaps chromosome:start-end"""
+    return (str(row[3] or '').strip().upper() == str(chromosome).strip().upper()
+            and row[4] is not None and row[5] is not None and row[4] <= end and row[5] >= start)
+
+
+# Enhancer ids per IN (...) list when a batch of regions is fetched
+REGION_BATCH_CHUNK = 1000
+MAX_BATCH_REGIONS = int(os.getenv("MAX_BATCH_REGIONS", 20000))
+
+
+def add_association_filters(query, params, exp_condition=None, time_cluster=None, immune_process=None):
+    """Append the optional condition/gene filters shared by the Tab 1 and Tab 2 queries"""
+    if exp_condition:
+        query += " AND a.exp_condition = %s"
+        params.append(exp_condition)
+
+    if time_cluster:
+        query += " AND g.time_cluster = %s"
+        params.append(time_cluster)
+
+    if immune_process:
+        query += " AND g.immune_process = %s"
+        params.append(immune_process)
+
+    return query
+
+
+class Gene:
+    __slots__ = ('gene_symbol', 'gene_id', 'accessibility', 'tpm_ctrl', 'tpm_imd', 'tpm_20e',
+                 'immune_process', 'time_cluster')
+
+    def __init__(self, gene_symbol, gene_id, accessibility, tpm_ctrl, tpm_imd, tpm_20e,
+                 immune_process, time_cluster):
+        self.gene_symbol = gene_symbol
+        self.gene_id = gene_id
+        self.accessibility = accessibility
+        self.tpm_ctrl = tpm_ctrl
+        self.tpm_imd = tpm_imd
+        self.tpm_20e = tpm_20e
+        self.immune_process = immune_process
+        self.time_cluster = time_cluster
+
+
+class Condition:
+    __slots__ = ('exp_condition', 'activity', 'genes', '_seen')
+
+    def __init__(self, exp_condition, activity):
+        self.exp_condition = exp_condition
+        self.activity = activity
+        self.genes = []
+        self._seen = set()
+
+
+class Enhancer:
+    __slots__ = ('enhancer_id', 'en_length', 'chromosome', 'window_start', 'window_end', 'conditions')
+
+    def __init__(self, enhancer_id, en_length, chromosome, window_start, window_end):
+        self.enhancer_id = enhancer_id
+        self.en_length = en_length
+        self.chromosome = chromosome
+        self.window_start = window_start
+        self.window_end = window_end
+        self.conditions = []
+
+
+@timed_stage('group_region_rows')
+def group_region_rows(rows):
+    """Group flat Tab 1 rows (in REGION_COLUMNS order) into Enhancer -> Condition -> Gene records.
+
+    One pass over rows, which may be a live cursor. Rows should arrive ordered by enhancer
+    name (as REGION_ORDER does), so each enhancer is finished before the next begins and the
+    final sort by name is linear. Duplicate genes within a condition are dropped with a set.
+    """
+    enhancers = []
+    by_name = {}
+    enhancer = None
+    conditions = {}
+
+    for row in rows:
+        enhancer_id, en_length, accessibility, chrom, estart, eend, exp_condition, act_score = row[:8]
+        gene_values = row[8:]
+
+        if enhancer is None or enhancer.enhancer_id != enhancer_id:
+            enhancer = by_name.get(enhancer_id)
+            if enhancer is None:
+                enhancer = Enhancer(enhancer_id, en_length, chrom, max(0, estart - 5000), eend + 5000)
+                by_name[enhancer_id] = enhancer
+                enhancers.append(enhancer)
+            conditions = {c.exp_condition: c for c in enhancer.conditions}
+
+        condition = conditions.get(exp_condition)
+        if condition is None:
+            condition = conditions[exp_condition] = Condition(exp_condition, act_score)
+            enhancer.conditions.append(condition)
+
+        gene_key = (accessibility,) + gene_values
+        if gene_key not in condition._seen:
+            condition._seen.add(gene_key)
+            gene_symbol, gene_id, tpm_ctrl, tpm_20e, tpm_imd, immune_process, time_cluster = gene_values
+            condition.genes.append(Gene(gene_symbol, gene_id, accessibility, tpm_ctrl, tpm_imd, tpm_20e,
+                                        immune_process, time_cluster))
+
+    # Conditions are listed by name, as before (at most three per enhancer)
+    for enhancer in enhancers:
+        enhancer.conditions.sort(key=lambda c: c.exp_condition or '')
+        for condition in enhancer.conditions:
+            condition._seen = None
+
+    enhancers.sort(key=lambda e: e.enhancer_id)
+    return enhancers
+
+
+def region_query(chr=None, start=None, end=None, enhancer_name=None,
+                 activity_score_min=0, exp_condition=None,
+                 time_cluster=None, immune_process=None, columns=REGION_COLUMNS):
+    """Build the Tab 1 query, without ORDER BY, as (query, params); None when nothing can match"""
+    # Reuse the same flexible parser as Tab 3
+    parsed_chr, parsed_start, parsed_end = parse_region_input(
+        chr_value=chr,
+        start_value=start,
+        end_value=end,
+        enhancer_name=enhancer_name
+    )
 
-        query = """
-            SELECT e.name           AS enhancer_id,
-                   e.en_length      AS en_length,
-                   a.accessibility  AS accessibility,
-                   e.chromosome     AS chromosome,
-                   e.start          AS estart,
-                   e.end            AS eend,
-                   a.exp_condition  AS exp_condition,
-                   a.activity       AS act_score,
-                   g.symbol         AS gene_symbol,
-                   g.geneid         AS gene_id,
-                   g.tpm_ctrl       AS tpm_ctrl,
-                   g.tpm_20e        AS tpm_20e,
-                   g.tpm_imd        AS tpm_imd,
-                   g.immune_process AS immune_process,
-                   g.time_cluster   AS time_cluster
-            FROM Enhancers e
-            JOIN Associations a ON e.eid = a.eid
-            JOIN Genes g ON a.gid = g.gid
-            WHERE a.activity >= %s
-        """
-
-        params = [activity_score_min]
-
-        # Reuse the same flexible parser as Tab 3
-        parsed_chr, parsed_start, parsed_end = parse_region_input(
-            chr_value=chr,
-            start_value=start,
-            end_value=end,
-            enhancer_name=enhancer_name
-        )
+    query = columns + REGION_FROM
+    params = [activity_score_min]
 
-        # If input is a region, use overlap logic
-        if parsed_chr and parsed_start is not None and parsed_end is not None:
-            query += """
-                AND UPPER(e.chromosome) = UPPER(%s)
-                AND NOT (e.end < %s OR e.start > %s)
-            """
-            params.extend([parsed_chr, parsed_start, parsed_end])
+    # If input is a region, resolve it to enhancer ids in memory so the SQL only joins the hits
+    if parsed_chr and parsed_start is not None and parsed_end is not None:
+        region_eids = get_enhancer_index().overlapping(parsed_chr, parsed_start, parsed_end)
+        if not region_eids:
+            return None
+        query += f" AND e.eid IN ({', '.join(['%s'] * len(region_eids))})" + OVERLAP_CONDITION
+        params.extend(region_eids)
+        params.extend([parsed_chr, parsed_end, parsed_start])
 
-        # Otherwise, if text was entered, treat it as exact enhancer name
-        elif enhancer_name:
-            query += " AND LOWER(TRIM(e.name)) = LOWER(TRIM(%s))"
-            params.append(enhancer_name)
+    # Otherwise, if text was entered, treat it as exact enhancer name
+    elif enhancer_name:
+        # Names compare case-insensitively by column collation, so the name index is used
+        query += " AND e.name = %s"
+        params.append(str(enhancer_name).strip())
 
-        else:
-            conn.close()
-            return [], {}
+    else:
+        return None
 
-        if exp_condition:
-            query += " AND a.exp_condition = %s"
-            params.append(exp_condition)
+    query = add_association_filters(query, params, exp_condition, time_cluster, immune_process)
+    return query, params
 
-        if time_cluster:
-            query += " AND g.time_cluster = %s"
-            params.append(time_cluster)
 
-        if immune_process:
-            query += " AND g.immune_process = %s"
-            params.append(immune_process)
+def associations_by_region(chr=None, start=None, end=None, enhancer_name=None,
+                           activity_score_min=0, exp_condition=None,
+                           time_cluster=None, immune_process=None):
+    try:
+        built = region_query(chr, start, end, enhancer_name, activity_score_min,
+                             exp_condition, time_cluster, immune_process)
+        if built is None:
+            return []
+        query, params = built
 
-        query += " ORDER BY e.name, a.exp_condition, g.symbol"
+        with db_connection() as conn:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(query + REGION_ORDER, params)
+            return group_region_rows(cursor)
 
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+    except mariadb.Error as e:
+        print(f"Database error: {e}")
+        return []
 
-        seen = set()
-        unique_rows = []
-        for row in rows:
-            if row not in seen:
-                seen.add(row)
-                unique_rows.append(row)
 
-        enhancer_map = {}
+def parse_region_lines(lines, zero_based=False):
+    """Parse BED or tab/space-separated "chrom start end [name]" lines for a batch region search.
 
-        Enhancer = namedtuple(
-            'Enhancer',
-            ['enhancer_id', 'en_length', 'chromosome', 'window_start', 'window_end', 'conditions']
-        )
-        Condition = namedtuple(
-            'Condition',
-            ['exp_condition', 'activity', 'genes']
-        )
-        Gene = namedtuple(
-            'Gene',
-            ['gene_symbol', 'gene_id', 'accessibility', 'tpm_ctrl', 'tpm_imd', 'tpm_20e', 'immune_process', 'time_cluster']
-        )
+    BED starts are 0-based and converted to the 1-based coordinates used everywhere else.
+    Blank, comment, track, browser and header lines are skipped; a leading "chr" is dropped.
 
-        for row in unique_rows:
-            (
-                enhancer_id, en_length, accessibility,
-                chrom, estart, eend,
-                exp_condition_val, act_score, gene_symbol, gene_id,
-                tpm_ctrl, tpm_20e, tpm_imd, immune_process_val, time_cluster_val
-            ) = row
-
-            window_start = max(0, estart - 5000)
-            window_end = eend + 5000
-
-            if enhancer_id not in enhancer_map:
-                enhancer_map[enhancer_id] = {
-                    'enhancer_id': enhancer_id,
-                    'en_length': en_length,
-                    'chromosome': chrom,
-                    'window_start': window_start,
-                    'window_end': window_end,
-                    'conditions': {}
-                }
-
-            if exp_condition_val not in enhancer_map[enhancer_id]['conditions']:
-                enhancer_map[enhancer_id]['conditions'][exp_condition_val] = {
-                    'exp_condition': exp_condition_val,
-                    'activity': act_score,
-                    'genes': []
-                }
-
-            gene_obj = Gene(
-                gene_symbol=gene_symbol,
-                gene_id=gene_id,
-                accessibility=accessibility,
-                tpm_ctrl=tpm_ctrl,
-                tpm_imd=tpm_imd,
-                tpm_20e=tpm_20e,
-                immune_process=immune_process_val,
-                time_cluster=time_cluster_val
-            )
+    Returns:
+      (regions, errors) where regions are (label, chromosome, start, end) tuples and
+      errors are (line_number, message) pairs
+    """
+    regions = []
+    errors = []
+
+    for line_number, line in enumerate(lines, start=1):
+        text = line.strip()
+        if not text or text.startswith(('#', 'track', 'browser')):
+            continue
+
+        parts = re.split(r'[\t,]+|\s+', text)
+        if len(parts) < 3:
+            errors.append((line_number, "expected chromosome, start and end"))
+            continue
+
+        chrom, start, end = parts[0].upper(), parts[1], parts[2]
+        if chrom.startswith('CHR'):
+            chrom = chrom[3:]
+        try:
+            start, end = int(start), int(end)
+        except ValueError:
+            # A header row is only expected before the first region
+            if not regions and not errors:
+                continue
+            errors.append((line_number, "start and end must be integers"))
+            continue
 
-            if gene_obj not in enhancer_map[enhancer_id]['conditions'][exp_condition_val]['genes']:
-                enhancer_map[enhancer_id]['conditions'][exp_condition_val]['genes'].append(gene_obj)
+        if zero_based:
+            start += 1
+        if start > end:
+            errors.append((line_number, "start is after end"))
+            continue
 
-        enhancers_details = []
-        for enhancer_id in sorted(enhancer_map.keys()):
-            enhancer_info = enhancer_map[enhancer_id]
+        label = parts[3] if len(parts) > 3 and parts[3] else f"{chrom}:{start}-{end}"
+        regions.append((label, chrom, start, end))
 
-            conditions_list = []
-            for condition_name in sorted(enhancer_info['conditions'].keys()):
-                condition_info = enhancer_info['conditions'][condition_name]
-                c_tup = Condition(
-                    exp_condition=condition_info['exp_condition'],
-                    activity=condition_info['activity'],
-                    genes=condition_info['genes']
-                )
-                conditions_list.append(c_tup)
-
-            e_tup = Enhancer(
-                enhancer_id=enhancer_info['enhancer_id'],
-                en_length=enhancer_info['en_length'],
-                chromosome=enhancer_info['chromosome'],
-                window_start=enhancer_info['window_start'],
-                window_end=enhancer_info['window_end'],
-                conditions=conditions_list
-            )
-            enhancers_details.append(e_tup)
+    return regions, errors
 
-        condition_counts = Counter()
-        for enhancer in enhancers_details:
-            for condition in enhancer.conditions:
-                if condition.exp_condition:
-                    condition_counts[condition.exp_condition] += 1
 
-        conn.close()
-        return enhancers_details, dict(condition_counts)
+def associations_by_regions(regions, activity_score_min=0, exp_condition=None,
+                            time_cluster=None, immune_process=None):
+    """Batch version of associations_by_region for (label, chromosome, start, end) regions.
+
+    All regions are resolved against the enhancer index in one sweep and the associations
+    of every hit enhancer are fetched together, instead of one full query per region.
+
+    Returns:
+      a list of (region, enhancers) pairs in input order
+    """
+    try:
+        hits = get_enhancer_index().overlapping_many([region[1:] for region in regions])
+        all_eids = sorted({eid for eids in hits for eid in eids})
+
+        rows_by_eid = {}
+        if all_eids:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                for i in range(0, len(all_eids), REGION_BATCH_CHUNK):
+                    chunk = all_eids[i:i + REGION_BATCH_CHUNK]
+                    query = REGION_COLUMNS + ", e.eid AS eid" + REGION_FROM
+                    query += f" AND e.eid IN ({', '.join(['%s'] * len(chunk))})"
+                    params = [activity_score_min] + chunk
+                    query = add_association_filters(query, params, exp_condition, time_cluster, immune_process)
+
+                    cursor.execute(query, params)
+                    for row in cursor.fetchall():
+                        rows_by_eid.setdefault(row[-1], []).append(row[:-1])
+
+        results = []
+        for region, eids in zip(regions, hits):
+            rows = [row for eid in eids for row in rows_by_eid.get(eid, ()) if overlaps(row, *region[1:])]
+            rows.sort(key=lambda row: (row[0], CONDITION_ORDER.get(row[6], 0), row[8] or ''))
+            results.append((region, group_region_rows(rows)))
+        return results
 
     except mariadb.Error as e:
         print(f"Database error: {e}")
-        return [], {}
+        return [(region, []) for region in regions]
+
 
 ## Tab 2
+GENE_COLUMNS = """
+    SELECT DISTINCT
+        e.name AS enhancer_id,
+        e.en_length AS en_length,
+        a.accessibility as accessibility,
+        a.activity AS act_score,
+        a.exp_condition AS exp_condition,
+        g.symbol AS gene_symbol,
+        g.geneid AS gene_id,
+        g.tpm_ctrl AS tpm_ctrl,
+        g.tpm_imd AS tpm_imd,
+        g.tpm_20e AS tpm_20e,
+        e.chromosome AS chromosome,
+        e.start AS start,
+        e.end AS end,
+        g.time_cluster AS time_cluster,
+        g.immune_process AS immune_process
+"""
+
+GENE_FROM = """
+    FROM Genes g
+    JOIN Associations a ON g.gid = a.gid
+    JOIN Enhancers e ON a.eid = e.eid
+    WHERE a.activity >= %s
+"""
+
+GENE_ORDER = f" ORDER BY e.name, {CONDITION_RANK}"
+
+MAX_GENE_LIST = int(os.getenv("MAX_GENE_LIST", 5000))
+
+
+def symbol_query(symbol=None, geneid=None, activity_score=500, exp_condition=None,
+                 time_cluster=None, immune_process=None, columns=GENE_COLUMNS):
+    """Build the Tab 2 query, without ORDER BY, as (query, params); None without a gene"""
+    query = columns + GENE_FROM
+    params = [activity_score]
+
+    if symbol:
+        query += " AND g.symbol = %s"
+        params.append(symbol)
+    elif geneid:
+        query += " AND g.geneid = %s"
+        params.append(geneid)
+    else:
+        return None
+
+    query = add_association_filters(query, params, exp_condition, time_cluster, immune_process)
+    return query, params
+
+
 def associations_by_symbol(symbol=None, geneid=None, activity_score=500, exp_condition=None,
                           time_cluster=None, immune_process=None):
+    built = symbol_query(symbol, geneid, activity_score, exp_condition, time_cluster, immune_process)
+    if built is None:
+        return []
+    query, params = built
+
     try:
-        conn = connect_db()
-        cursor = conn.cursor(dictionary=True)
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query + GENE_ORDER, params)
+            result = cursor.fetchall()
 
-        query = """
-        SELECT DISTINCT
-            e.name AS enhancer_id,
-            e.en_length AS en_length,
-            a.accessibility as accessibility,
-            a.activity AS act_score,
-            a.exp_condition AS exp_condition,
-            g.symbol AS gene_symbol,
-            g.geneid AS gene_id,
-            g.tpm_ctrl AS tpm_ctrl,
-            g.tpm_imd AS tpm_imd,
-            g.tpm_20e AS tpm_20e,
-            e.chromosome AS chromosome,
-            e.start AS start,
-            e.end AS end,
-            g.time_cluster AS time_cluster,
-            g.immune_process AS immune_process
-        FROM Genes g
-        JOIN Associations a ON g.gid = a.gid
-        JOIN Enhancers e ON a.eid = e.eid
-        WHERE a.activity >= %s
-        """
-
-        params = [activity_score]
-
-        if symbol:
-            query += " AND g.symbol = %s"
-            params.append(symbol)
-        elif geneid:
-            query += " AND g.geneid = %s"
-            params.append(geneid)
-        else:
-            return []
+            return result
 
-        if exp_condition:
-            query += " AND a.exp_condition = %s"
-            params.append(exp_condition)
+    except mariadb.Error as e:
+        print(f"Error connecting/querying database: {e}")
+        return []
 
-        if time_cluster:
-            query += " AND g.time_cluster = %s"
-            params.append(time_cluster)
 
-        if immune_process:
-            query += " AND g.immune_process = %s"
-            params.append(immune_process)
+def parse_gene_list(text):
+    """Split a pasted or uploaded gene list on whitespace, commas or semicolons, keeping first occurrences"""
+    names = []
+    seen = set()
+    for name in re.split(r'[\s,;]+', text or ''):
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
 
-        query += " ORDER BY e.name, a.exp_condition"
 
-        cursor.execute(query, params)
-        result = cursor.fetchall()
+def resolve_gene_list(names):
+    """Match a mixed list of symbols and FBgn ids against Genes in one query.
 
-        conn.close()
-        return result
+    Returns:
+      (genes, unmatched) where genes are dicts with gid, gene_symbol and gene_id ordered
+      by gid, and unmatched are the input names that matched no gene
+    """
+    if not names:
+        return [], []
+
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        placeholders = ', '.join(['%s'] * len(names))
+        cursor.execute(
+            f"""
+            SELECT gid, symbol AS gene_symbol, geneid AS gene_id
+            FROM Genes
+            WHERE symbol IN ({placeholders}) OR geneid IN ({placeholders})
+            ORDER BY gid
+            """,
+            names + names
+        )
+        genes = cursor.fetchall()
+
+    matched = set()
+    for gene in genes:
+        for key in (gene['gene_symbol'], gene['gene_id']):
+            if key:
+                matched.add(key.lower())
+    unmatched = [name for name in names if name.lower() not in matched]
+    return genes, unmatched
+
+
+def iter_gene_list_associations(genes, activity_score=500, exp_condition=None,
+                                time_cluster=None, immune_process=None):
+    """Yield (gene, enhancer rows) for each resolved gene, in gid order, from a single query.
+
+    Rows are grouped straight off the cursor, so callers can stream each gene as soon
+    as its rows are complete. Genes without matching enhancers yield an empty list.
+    """
+    if not genes:
+        return
+
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+
+            gids = [gene['gid'] for gene in genes]
+            query = GENE_COLUMNS + ", g.gid AS gid" + GENE_FROM
+            query += f" AND g.gid IN ({', '.join(['%s'] * len(gids))})"
+            params = [activity_score] + gids
+            query = add_association_filters(query, params, exp_condition, time_cluster, immune_process)
+            query += f" ORDER BY g.gid, e.name, {CONDITION_RANK}"
+            cursor.execute(query, params)
+
+            groups = groupby(cursor, key=itemgetter('gid'))
+            pending = next(groups, None)
+            for gene in genes:
+                if pending is not None and pending[0] == gene['gid']:
+                    yield gene, list(pending[1])
+                    pending = next(groups, None)
+                else:
+                    yield gene, []
 
     except mariadb.Error as e:
-        print(f"Error connecting/querying database: {e}")
-        return []
+        print(f"Error streaming gene list associations: {e}")
 
 
 ## Tab 3
@@ -366,81 +1201,71 @@ def parse_region_input(chr_value=None, start_value=None, end_value=None, enhance
 
     return None, None, None
 
-def search_by_activity_class(chr=None, start=None, end=None, enhancer_name=None,
-                             activity_class=None, accessibility=None):
-    """Search enhancers by genomic region and/or activity class and accessibility"""
-    try:
-        conn = connect_db()
-        cursor = conn.cursor()
+ACTIVITY_CLASS_COLUMNS = ['enhancer_id', 'enhancer_name', 'activity_class', 'accessibility',
+                          'gene_id', 'gene_symbol']
+
+ACTIVITY_CLASS_SELECT = """
+            SELECT ac.ac_eid         AS enhancer_id,
+                   ac.enhancer_name  AS enhancer_name,
+                   ac.activity_class AS activity_class,
+                   ac.accessibility  AS accessibility,
+                   ac.geneid         AS gene_id,
+                   ac.gene_symbol    AS gene_symbol
+"""
+
+ACTIVITY_CLASS_FROM = """
+            FROM Activity_class_info AS ac
+            WHERE 1 = 1
+            """
 
-        query = """
-                SELECT ac.ac_eid         AS enhancer_id,
-                       ac.enhancer_name  AS enhancer_name,
-                       ac.activity_class AS activity_class,
-                       ac.accessibility  AS accessibility,
-                       ac.geneid         AS gene_id,
-                       ac.gene_symbol    AS gene_symbol
-                FROM Activity_class_info AS ac
-                WHERE 1 = 1
-                """
-
-        params = []
-
-        parsed_chr, parsed_start, parsed_end = parse_region_input(
-            chr_value=chr,
-            start_value=start,
-            end_value=end,
-            enhancer_name=enhancer_name
-        )
+ACTIVITY_CLASS_ORDER = " ORDER BY ac.enhancer_name, ac.geneid"
 
-        # Region search
-        if parsed_chr and parsed_start is not None and parsed_end is not None:
-            # First filter by chromosome only in SQL, case-insensitive
-            query += " AND UPPER(ac.enhancer_name) LIKE %s"
-            params.append(f"{parsed_chr}:%")
 
-        # If user entered text but not a valid region, fall back to exact enhancer-name match
-        elif enhancer_name:
-            query += " AND LOWER(TRIM(ac.enhancer_name)) = LOWER(TRIM(%s))"
-            params.append(enhancer_name)
+def activity_class_query(chr=None, start=None, end=None, enhancer_name=None,
+                         activity_class=None, accessibility=None, columns=ACTIVITY_CLASS_SELECT):
+    """Build the Tab 3 query, without ORDER BY, as (query, params)"""
+    query = columns + ACTIVITY_CLASS_FROM
 
-        if activity_class:
-            query += " AND ac.activity_class = %s"
-            params.append(activity_class)
+    params = []
 
-        if accessibility:
-            query += " AND ac.accessibility = %s"
-            params.append(accessibility)
+    parsed_chr, parsed_start, parsed_end = parse_region_input(
+        chr_value=chr,
+        start_value=start,
+        end_value=end,
+        enhancer_name=enhancer_name
+    )
 
-        query += " ORDER BY ac.enhancer_name, ac.geneid"
+    # Region search: enhancers contained in the region, via the location index
+    if parsed_chr and parsed_start is not None and parsed_end is not None:
+        query += " AND ac.chromosome = %s AND ac.start >= %s AND ac.end <= %s"
+        params.extend([parsed_chr, parsed_start, parsed_end])
 
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+    # If user entered text but not a valid region, fall back to exact enhancer-name match
+    elif enhancer_name:
+        query += " AND ac.enhancer_name = %s"
+        params.append(str(enhancer_name).strip())
 
-        # Apply coordinate filtering in Python
-        if parsed_chr and parsed_start is not None and parsed_end is not None:
-            filtered_rows = []
-            for row in rows:
-                enhancer_name_val = row[1]  # enhancer_name
+    if activity_class:
+        query += " AND ac.activity_class = %s"
+        params.append(activity_class)
 
-                if enhancer_name_val and ':' in enhancer_name_val:
-                    try:
-                        chrom_part, coord_part = enhancer_name_val.strip().upper().split(':', 1)
-                        enh_start_str, enh_end_str = coord_part.split('-', 1)
+    if accessibility:
+        query += " AND ac.accessibility = %s"
+        params.append(accessibility)
 
-                        enh_start = int(enh_start_str)
-                        enh_end = int(enh_end_str)
+    return query, params
 
-                        # Requirement:
-                        # enhancer_start >= query_start
-                        # enhancer_end <= query_end
-                        if chrom_part == parsed_chr and enh_start >= parsed_start and enh_end <= parsed_end:
-                            filtered_rows.append(row)
 
-                    except (ValueError, IndexError):
-                        continue
+def search_by_activity_class(chr=None, start=None, end=None, enhancer_name=None,
+                             activity_class=None, accessibility=None):
+    """Search enhancers by genomic region and/or activity class and accessibility"""
+    try:
+        query, params = activity_class_query(chr, start, end, enhancer_name, activity_class, accessibility)
 
-            rows = filtered_rows
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query + ACTIVITY_CLASS_ORDER, params)
+            rows = cursor.fetchall()
 
         # Remove duplicates while preserving order
         seen = set()
@@ -450,18 +1275,414 @@ def search_by_activity_class(chr=None, start=None, end=None, enhancer_name=None,
                 seen.add(row)
                 unique_rows.append(row)
 
-        columns = ['enhancer_id', 'enhancer_name', 'activity_class', 'accessibility',
-                   'gene_id', 'gene_symbol']
+        result_dicts = [dict(zip(ACTIVITY_CLASS_COLUMNS, row)) for row in unique_rows]
 
-        result_dicts = [dict(zip(columns, row)) for row in unique_rows]
-
-        conn.close()
         return result_dicts
 
     except mariadb.Error as e:
         print(f"Database error: {e}")
         return []
-    
+
+
+## Result pages
+# Enhancers per page in the Tab 1 and Tab 3 tables, rows per page in Tab 2
+RESULTS_PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", 100))
+
+# Keyset orderings as (expression, alias) pairs. Each extends the page's display ordering
+# with primary-key columns so the key is unique and a page boundary never drops or repeats rows.
+# Conditions compare by CONDITION_RANK, matching how the display orderings sort them.
+ASSOCIATION_KEY = [('e.name', 'enhancer_id'), (CONDITION_RANK, 'condition_rank'),
+                   ('a.eid', 'eid'), ('a.gid', 'gid')]
+ACTIVITY_CLASS_KEY = [('ac.enhancer_name', 'enhancer_name'), ("COALESCE(ac.geneid, '')", 'gene_sort'),
+                      ('ac.ac_eid', 'enhancer_id')]
+
+
+def key_columns(key, columns):
+    """Select list extended with the key aliases it does not already return"""
+    extra = [f"{expression} AS {alias}" for expression, alias in key
+             if not re.search(rf"\bAS\s+{alias}\b", columns, re.IGNORECASE)]
+    return columns.rstrip() + (",\n           " + ",\n           ".join(extra) if extra else "") + "\n"
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token, size):
+    """The size key values in a page cursor; raises ValueError for anything the server did not hand out"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (UnicodeError, binascii.Error, json.JSONDecodeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Malformed cursor")
+    return values
+
+
+def fetch_keyset_page(built, key, after=None, limit=RESULTS_PAGE_SIZE):
+    """Run a (query, params) pair built with key_columns, one page at a time.
+
+    Returns (rows, next_cursor): up to limit dict rows strictly after the key values in
+    `after`, and the cursor for the following page, or None on the last page.
+    """
+    query, params = built
+    params = list(params)
+    if after is not None:
+        expressions = ", ".join(expression for expression, _ in key)
+        query += f" AND ({expressions}) > ({', '.join(['%s'] * len(key))})"
+        params.extend(after)
+    query += " ORDER BY " + ", ".join(alias for _, alias in key) + " LIMIT %s"
+    params.append(limit + 1)
+
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][alias] for _, alias in key])
+    return rows, next_cursor
+
+
+def enhancer_name_page(build, name_column, after=None, limit=RESULTS_PAGE_SIZE):
+    """The next limit enhancer names matched by a query builder, and the cursor after them.
+
+    build(columns) returns a (query, params) pair or None, like region_query. Paging by name
+    keeps every row of an enhancer on the same page, so rowspan groups are never split.
+    """
+    built = build(f"SELECT DISTINCT {name_column} AS page_name")
+    if built is None:
+        return [], None
+    query, params = built
+    if after is not None:
+        query += f" AND {name_column} > %s"
+        params.append(after[0])
+    query += " ORDER BY page_name LIMIT %s"
+    params.append(limit + 1)
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        names = [row[0] for row in cursor.fetchall()]
+
+    next_cursor = encode_cursor([names[limit - 1]]) if len(names) > limit else None
+    return names[:limit], next_cursor
+
+
+def name_filter(name_column, names):
+    return f" AND {name_column} IN ({', '.join(['%s'] * len(names))})"
+
+
+@cached_result
+def region_page(params, after=None, limit=RESULTS_PAGE_SIZE):
+    """Grouped Tab 1 results for one page of enhancers, and the cursor for the next page"""
+    try:
+        names, next_cursor = enhancer_name_page(
+            lambda columns: region_query(**params, columns=columns), 'e.name', after, limit
+        )
+        if not names:
+            return [], None
+
+        query, query_params = region_query(**params)
+        query += name_filter('e.name', names)
+
+        with db_connection() as conn:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(query + REGION_ORDER, query_params + names)
+            enhancers = group_region_rows(cursor)
+
+        return enhancers, next_cursor
+
+    except mariadb.Error as e:
+        print(f"Database error: {e}")
+        return [], None
+
+
+def bucket(value, size):
+    """Lower edge of the histogram bucket holding value"""
+    if value is None:
+        return None
+    return int(value // size * size)
+
+
+def add_counts(counts, rows):
+    """Add (key, count) rows into the counts dict; SUM() may hand back Decimals"""
+    for key, count in rows:
+        counts[key] = counts.get(key, 0) + int(count)
+    return counts
+
+
+REGION_CONDITION_COUNTS = "SELECT a.exp_condition AS exp_condition, COUNT(DISTINCT e.name) AS enhancers"
+REGION_NAME_LENGTHS = "SELECT e.name AS enhancer_id, MIN(e.en_length) AS en_length"
+
+
+def has_default_association_filters(params):
+    return not (params['activity_score_min'] or params['exp_condition']
+                or params['time_cluster'] or params['immune_process'])
+
+
+def binned_region_counts(params):
+    """Tab 1 chart counts for the summary bins a plain region search covers completely.
+
+    Returns (condition counts, length buckets, edges), or None when the search must be
+    aggregated in full. edges is (eids of the overlapping enhancers that start outside
+    those bins, chromosome, start, end, first covered bin, end of the last covered bin).
+    """
+    if not has_default_association_filters(params):
+        return None
+    chrom, start, end = parse_region_input(params['chr'], params['start'], params['end'], params['enhancer_name'])
+    covered = chrom and covered_bins(start, end)
+    if not covered:
+        return None
+    first, last = covered
+
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT exp_condition, SUM(enhancers) FROM Region_bin_conditions
+                WHERE chromosome = %s AND bin_start BETWEEN %s AND %s GROUP BY exp_condition
+            """, (chrom, first, last))
+            conditions = add_counts({}, cursor.fetchall())
+            cursor.execute("""
+                SELECT length_bucket, SUM(enhancers) FROM Region_bin_lengths
+                WHERE chromosome = %s AND bin_start BETWEEN %s AND %s GROUP BY length_bucket
+            """, (chrom, first, last))
+            buckets = add_counts({}, cursor.fetchall())
+    except mariadb.Error as e:
+        print(f"Chart summaries unavailable, aggregating live: {e}")
+        return None
+
+    edge_eids = [eid for enhancer_start, eid in get_enhancer_index().overlapping_starts(chrom, start, end)
+                 if not first <= enhancer_start < last + BIN_SIZE]
+    return conditions, buckets, (edge_eids, chrom, start, end, first, last + BIN_SIZE)
+
+
+def count_region_charts(build, conditions, buckets):
+    """Aggregate a Tab 1 result's condition counts and length buckets live, adding them into the dicts"""
+    by_condition = build(REGION_CONDITION_COUNTS)
+    if by_condition is None:
+        return
+    lengths = build(REGION_NAME_LENGTHS)
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(by_condition[0] + " GROUP BY a.exp_condition", by_condition[1])
+        add_counts(conditions, cursor.fetchall())
+        cursor.execute(lengths[0] + " GROUP BY e.name", lengths[1])
+        add_counts(buckets, ((bucket(length, LENGTH_BUCKET), 1) for _, length in cursor.fetchall()))
+
+
+def region_edge_query(edges, columns):
+    """region_query with the default filters over the edge enhancers from binned_region_counts"""
+    eids, chrom, start, end, covered_start, covered_end = edges
+    query = (columns + REGION_FROM + f" AND e.eid IN ({', '.join(['%s'] * len(eids))})" + OVERLAP_CONDITION
+             + " AND (e.start < %s OR e.start >= %s)")
+    return query, [0] + list(eids) + [chrom, end, start, covered_start, covered_end]
+
+
+@cached_result
+def region_summary(params):
+    """Enhancer total and chart data for a whole Tab 1 result.
+
+    Region searches with the default filters add up the precomputed bins they cover,
+    so only the enhancers in the partial bins at either end are aggregated here.
+    """
+    conditions, buckets = {}, {}
+    try:
+        binned = binned_region_counts(params)
+        if binned is None:
+            count_region_charts(lambda columns: region_query(**params, columns=columns), conditions, buckets)
+        else:
+            conditions, buckets, edges = binned
+            if edges[0]:
+                count_region_charts(lambda columns: region_edge_query(edges, columns), conditions, buckets)
+
+    except mariadb.Error as e:
+        print(f"Database error: {e}")
+        conditions, buckets = {}, {}
+
+    return {
+        'total': sum(buckets.values()),
+        'condition_counts': {condition: count for condition, count in conditions.items() if condition and count},
+        'length_histogram': sorted([edge, count] for edge, count in buckets.items() if edge is not None),
+    }
+
+
+@cached_result
+def gene_page(params, after=None, limit=RESULTS_PAGE_SIZE):
+    """One page of Tab 2 rows in (enhancer, condition) order, and the cursor for the next page"""
+    try:
+        built = symbol_query(**params, columns=key_columns(ASSOCIATION_KEY, GENE_COLUMNS))
+        if built is None:
+            return [], None
+        return fetch_keyset_page(built, ASSOCIATION_KEY, after, limit)
+
+    except mariadb.Error as e:
+        print(f"Error connecting/querying database: {e}")
+        return [], None
+
+
+@cached_result
+def gene_summary(params):
+    """Row total and pre-aggregated chart data for a whole Tab 2 result"""
+    summary = {'total': 0, 'score_histogram': [], 'condition_counts': {},
+               'accessibility_counts': {}, 'stats': None}
+    try:
+        built = symbol_query(
+            **params,
+            columns="SELECT a.activity AS act_score, a.exp_condition AS exp_condition, a.accessibility AS accessibility"
+        )
+        if built is None:
+            return summary
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(*built)
+            rows = cursor.fetchall()
+
+    except mariadb.Error as e:
+        print(f"Error connecting/querying database: {e}")
+        return summary
+
+    with timed_stage('gene_summary'):
+        scores = [float(score) for score, _, _ in rows if score is not None]
+        summary['total'] = len(rows)
+        summary['score_histogram'] = sorted(
+            [edge, count] for edge, count in Counter(bucket(score, SCORE_BUCKET) for score in scores).items()
+        )
+        summary['condition_counts'] = dict(Counter(str(c).strip() for _, c, _ in rows if c and str(c).strip()))
+        summary['accessibility_counts'] = dict(Counter(str(a or '').strip() or 'Unknown' for _, _, a in rows))
+        if scores:
+            summary['stats'] = {
+                'count': len(scores),
+                'mean': statistics.fmean(scores),
+                'median': statistics.median(scores),
+                'max': max(scores),
+            }
+    return summary
+
+
+@cached_result
+def activity_class_page(params, after=None, limit=RESULTS_PAGE_SIZE):
+    """Tab 3 rows for one page of enhancers, and the cursor for the next page"""
+    try:
+        names, next_cursor = enhancer_name_page(
+            lambda columns: activity_class_query(**params, columns=columns), 'ac.enhancer_name', after, limit
+        )
+        if not names:
+            return [], None
+
+        query, query_params = activity_class_query(**params)
+        query += name_filter('ac.enhancer_name', names)
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query + ACTIVITY_CLASS_ORDER, query_params + names)
+            rows = cursor.fetchall()
+
+        return [dict(zip(ACTIVITY_CLASS_COLUMNS, row)) for row in rows], next_cursor
+
+    except mariadb.Error as e:
+        print(f"Database error: {e}")
+        return [], None
+
+
+ACTIVITY_CLASS_COUNTS = "SELECT ac.activity_class AS activity_class, ac.accessibility AS accessibility, COUNT(*) AS n"
+
+
+def binned_activity_class_counts(params):
+    """Tab 3 (activity_class, accessibility, n) rows from the summary bins.
+
+    Returns (rows, live query for the rest of the result or None), or None when the
+    search must be counted in full. Without a region every bin counts; with one, the
+    run of bins the region wholly contains (down to their longest enhancer) counts.
+    """
+    chrom, start, end = parse_region_input(params['chr'], params['start'], params['end'], params['enhancer_name'])
+    if not chrom and params['enhancer_name']:
+        return None
+
+    where, where_params = [], []
+    for column in ('activity_class', 'accessibility'):
+        if params[column]:
+            where.append(f"{column} = %s")
+            where_params.append(params[column])
+
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            if not chrom:
+                cursor.execute(
+                    "SELECT activity_class, accessibility, SUM(n) FROM Activity_class_bins"
+                    + (" WHERE " + " AND ".join(where) if where else "")
+                    + " GROUP BY activity_class, accessibility",
+                    where_params
+                )
+                return cursor.fetchall(), None
+
+            covered = covered_bins(start, end)
+            if not covered:
+                return None
+            first, last = covered
+            cursor.execute(
+                "SELECT bin_start, activity_class, accessibility, n, max_end FROM Activity_class_bins"
+                " WHERE chromosome = %s AND bin_start BETWEEN %s AND %s"
+                + "".join(" AND " + condition for condition in where)
+                + " ORDER BY bin_start",
+                [chrom, first, last] + where_params
+            )
+            bins = cursor.fetchall()
+    except mariadb.Error as e:
+        print(f"Chart summaries unavailable, aggregating live: {e}")
+        return None
+
+    # Stop at the first bin holding an enhancer that runs past the region
+    stop = last + BIN_SIZE
+    for bin_start, rows in groupby(bins, itemgetter(0)):
+        if any(max_end is not None and max_end > end for *_, max_end in rows):
+            stop = bin_start
+            break
+    if stop == first:
+        return None
+
+    query, query_params = activity_class_query(**params, columns=ACTIVITY_CLASS_COUNTS)
+    query += " AND NOT (ac.start >= %s AND ac.start < %s)"
+    counted = [(activity_class, accessibility, n)
+               for bin_start, activity_class, accessibility, n, _ in bins if bin_start < stop]
+    return counted, (query, query_params + [first, stop])
+
+
+@cached_result
+def activity_class_summary(params):
+    """Row total and per-class/per-accessibility counts for a whole Tab 3 result"""
+    summary = {'total': 0, 'activity_class': {}, 'accessibility': {}}
+    try:
+        binned = binned_activity_class_counts(params)
+        if binned is None:
+            rows, live = [], activity_class_query(**params, columns=ACTIVITY_CLASS_COUNTS)
+        else:
+            rows, live = binned
+
+        if live is not None:
+            query, query_params = live
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query + " GROUP BY ac.activity_class, ac.accessibility", query_params)
+                rows = list(rows) + cursor.fetchall()
+
+        for activity_class, accessibility, count in rows:
+            summary['total'] += int(count)
+            for field, value in (('activity_class', activity_class), ('accessibility', accessibility)):
+                key = value or 'Unknown'
+                summary[field][key] = summary[field].get(key, 0) + int(count)
+        return summary
+
+    except mariadb.Error as e:
+        print(f"Database error: {e}")
+        return summary
+
 
 ## Tab 0
 @app.route('/')
@@ -469,135 +1690,712 @@ def index():
     filter_options = get_filter_options()
     return render_template('template.html', filter_options=filter_options, request=request)
 
-## Tab 1
-@app.route('/submit_region', methods=['POST'])
-def find_gene():
-    chr = request.form.get('chr', '').strip() or None
-    start_str = request.form.get('start', '').strip()
-    end_str = request.form.get('end', '').strip()
-    enhancer_name = request.form.get('enhancer_name', '').strip() or None
-    activity_score_min = float(request.form.get("activity_score_min", 0))
-    exp_condition = request.form.get("condition", "").strip() or None
-    time_cluster = request.form.get("time_cluster", "").strip() or None
-    immune_process = request.form.get("immune_process", "").strip() or None
+## Request parameters
+def region_params(source):
+    """Tab 1 search parameters from a submitted form or a query string"""
+    start_str = source.get('start', '').strip()
+    end_str = source.get('end', '').strip()
+    return dict(
+        chr=source.get('chr', '').strip() or None,
+        start=int(start_str) if start_str else None,
+        end=int(end_str) if end_str else None,
+        enhancer_name=source.get('enhancer_name', '').strip() or None,
+        activity_score_min=float(source.get("activity_score_min") or 0),
+        exp_condition=source.get("condition", "").strip() or None,
+        time_cluster=source.get("time_cluster", "").strip() or None,
+        immune_process=source.get("immune_process", "").strip() or None,
+    )
+
 
-    start = int(start_str) if start_str else None
-    end = int(end_str) if end_str else None
+def gene_params(source):
+    """Tab 2 search parameters from a submitted form or a query string"""
+    return dict(
+        symbol=source.get("symbol", "").strip() or None,
+        geneid=source.get("geneid", "").strip() or None,
+        activity_score=float(source.get("activity_score") or 500),
+        exp_condition=source.get("condition", "").strip() or None,
+        time_cluster=source.get("time_cluster", "").strip() or None,
+        immune_process=source.get("immune_process", "").strip() or None,
+    )
 
-    has_coordinates = chr and start is not None and end is not None
-    has_enhancer_name = enhancer_name is not None
 
-    filter_options = get_filter_options()
+def activity_class_params(source):
+    """Tab 3 search parameters from a submitted form or a query string"""
+    start_str = source.get('start', '').strip()
+    end_str = source.get('end', '').strip()
+    return dict(
+        chr=source.get('chr', '').strip() or None,
+        start=int(start_str) if start_str else None,
+        end=int(end_str) if end_str else None,
+        enhancer_name=source.get('enhancer_name', '').strip() or None,
+        activity_class=source.get("activity_class", "").strip() or None,
+        accessibility=source.get("accessibility", "").strip() or None,
+    )
+
+
+def has_region_input(params):
+    has_coordinates = params['chr'] and params['start'] is not None and params['end'] is not None
+    return bool(has_coordinates or params['enhancer_name'])
+
+
+def page_request(size):
+    """Cursor from a table's "load more" request, and the search fields to send with the next one"""
+    token = request.values.get('after', '').strip()
+    after = decode_cursor(token, size) if token else None
+    return after, urlencode([(k, v) for k, v in request.values.items(multi=True) if k != 'after'])
+
+
+def page_rows(template, next_cursor, **context):
+    """Table rows for a "load more" request; the following page's cursor travels in a header"""
+    return render_template(template, **context), {'X-Next-Cursor': next_cursor or ''}
+
+
+## Cacheable GET searches
+# Seconds browsers and proxies may reuse a GET search before revalidating it
+SEARCH_MAX_AGE = int(os.getenv("SEARCH_MAX_AGE", 60))
+
+# Newest of the code and templates, so a deploy changes the validators as well as a reseed
+APP_MTIME = datetime.fromtimestamp(int(max(
+    [os.path.getmtime(__file__)]
+    + [entry.stat().st_mtime for entry in os.scandir(os.path.join(BASE_DIR, 'templates')) if entry.is_file()]
+)), tz=timezone.utc)
+
+# (params key, query string field, default) per search, in the search form's field names
+REGION_FIELDS = [
+    ('chr', 'chr', None), ('start', 'start', None), ('end', 'end', None),
+    ('enhancer_name', 'enhancer_name', None), ('activity_score_min', 'activity_score_min', 0),
+    ('exp_condition', 'condition', None), ('time_cluster', 'time_cluster', None),
+    ('immune_process', 'immune_process', None),
+]
+GENE_FIELDS = [
+    ('symbol', 'symbol', None), ('geneid', 'geneid', None), ('activity_score', 'activity_score', 500),
+    ('exp_condition', 'condition', None), ('time_cluster', 'time_cluster', None),
+    ('immune_process', 'immune_process', None),
+]
+ACTIVITY_CLASS_FIELDS = [
+    ('chr', 'chr', None), ('start', 'start', None), ('end', 'end', None),
+    ('enhancer_name', 'enhancer_name', None), ('activity_class', 'activity_class', None),
+    ('accessibility', 'accessibility', None),
+]
+
+
+def canonical_query(params, fields):
+    """One query string per distinct search: defaults and blanks dropped, fields sorted,
+    and a region typed into the name box spelled out as chr/start/end"""
+    params = dict(params)
+    if 'enhancer_name' in params:
+        chrom, start, end = parse_region_input(params['chr'], params['start'], params['end'], params['enhancer_name'])
+        if chrom:
+            params.update(chr=chrom, start=start, end=end, enhancer_name=None)
+
+    pairs = []
+    for key, field, default in fields:
+        value = params[key]
+        if value is None or value == default:
+            continue
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        pairs.append((field, str(value)))
+    return urlencode(sorted(pairs))
+
+
+def cacheable_search(parse, fields):
+    """Let a POST search route also answer GET with a canonical, cacheable URL.
+
+    A GET is redirected to its canonical query string, then validated against an
+    ETag and Last-Modified taken from the dataset version: a client or proxy
+    already holding the current copy gets a 304 before any query runs. The redirect
+    is a 302, as browsers keep a 301 for good, and only a 200 is marked cacheable;
+    an error answer, or a page rendered after a database error was swallowed into an
+    empty result, is sent with no-store.
+    """
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper():
+            if request.method != 'GET':
+                return view()
+
+            try:
+                canonical = canonical_query(parse(request.args), fields)
+            except ValueError:
+                abort(400, "Invalid search parameters")
+            if request.query_string.decode('utf-8') != canonical:
+                return redirect(f"{request.path}?{canonical}", code=302)
+
+            version, loaded_at = data_version_stamp()
+            if version is None:
+                return view()
+            etag = f"{version}-{int(APP_MTIME.timestamp())}"
+            last_modified = max(loaded_at, APP_MTIME) if loaded_at else APP_MTIME
+
+            if request.if_none_match:
+                fresh = request.if_none_match.contains(etag)
+            else:
+                fresh = request.if_modified_since is not None and last_modified <= request.if_modified_since
+            errors = db_error_count()
+            response = make_response('', 304) if fresh else make_response(view())
+            if response.status_code not in (200, 304) or db_error_count() != errors:
+                response.cache_control.no_store = True
+                return response
+
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.public = True
+            response.cache_control.max_age = SEARCH_MAX_AGE
+            return response
+
+        return wrapper
+    return decorate
 
-    if not (has_coordinates or has_enhancer_name):
+
+## Tab 1
+@app.route('/submit_region', methods=['GET', 'POST'])
+@cacheable_search(region_params, REGION_FIELDS)
+def find_gene():
+    params = region_params(request.values)
+
+    if not has_region_input(params):
         return render_template(
             'tab_1.html',
             enhancers=[],
-            condition_counts={},
-            filter_options=filter_options,
+            summary={},
+            filter_options=get_filter_options(),
             error_message="Please provide either coordinates (chromosome, start, end) OR an enhancer name."
         )
 
-    enhancers, condition_counts = associations_by_region(
-        chr, start, end, enhancer_name,
-        activity_score_min, exp_condition,
-        time_cluster, immune_process
+    _, page_query = page_request(1)
+    # The summary runs alongside the page and is dropped if the page is empty
+    filter_options, (enhancers, next_cursor), summary = run_concurrently(
+        get_filter_options, lambda: region_page(params), lambda: region_summary(params)
     )
 
     return render_template(
         'tab_1.html',
         enhancers=enhancers,
-        condition_counts=condition_counts,
+        summary=summary if enhancers else {},
+        next_cursor=next_cursor,
+        page_query=page_query,
         filter_options=filter_options
     )
 
 
+@app.route('/submit_region/page', methods=['POST'])
+def find_gene_page():
+    """Further Tab 1 table rows, a page of enhancers at a time"""
+    try:
+        after, _ = page_request(1)
+        params = region_params(request.form)
+    except ValueError as e:
+        return str(e), 400
+
+    enhancers, next_cursor = region_page(params, after)
+    return page_rows('region_rows.html', next_cursor, enhancers=enhancers)
+
+
+@app.route('/submit_region_batch', methods=['POST'])
+def find_genes_batch():
+    """Tab 1 batch mode: one uploaded BED/TSV (or pasted list) of regions resolved in a single pass"""
+    params = region_params(request.form)
+
+    upload = request.files.get('regions_file')
+    if upload and upload.filename:
+        text = upload.read().decode('utf-8', errors='replace')
+        zero_based = upload.filename.lower().endswith('.bed')
+    else:
+        text = request.form.get('regions_text', '')
+        zero_based = request.form.get('zero_based') == 'on'
+
+    regions, errors = parse_region_lines(text.splitlines(), zero_based=zero_based)
+
+    error_message = ""
+    results = []
+    if not regions:
+        error_message = "Please upload a BED/TSV file or paste regions as: chromosome, start, end."
+    elif len(regions) > MAX_BATCH_REGIONS:
+        error_message = f"Please submit at most {MAX_BATCH_REGIONS} regions per batch ({len(regions)} given)."
+    else:
+        results = associations_by_regions(
+            regions, params['activity_score_min'], params['exp_condition'],
+            params['time_cluster'], params['immune_process']
+        )
+
+    return render_template(
+        'tab_1_batch.html',
+        results=[(region, enhancers) for region, enhancers in results if enhancers],
+        region_count=len(regions),
+        parse_errors=errors,
+        error_message=error_message
+    )
+
+
 ## Tab 2
-@app.route('/submit_gene', methods=['POST'])
+@app.route('/submit_gene', methods=['GET', 'POST'])
+@cacheable_search(gene_params, GENE_FIELDS)
 def find_enhancer():
-    symbol    = request.form.get("symbol","").strip()
-    geneid    = request.form.get("geneid","").strip()
-    activity_score = float(request.form.get("activity_score", 500))
-    exp_condition = request.form.get("condition","").strip() or None
-    time_cluster = request.form.get("time_cluster", "").strip() or None
-    immune_process = request.form.get("immune_process", "").strip() or None
-
-    has_gene   = bool(symbol or geneid)
+    params = gene_params(request.values)
 
-    filter_options = get_filter_options()
+    has_gene = bool(params['symbol'] or params['geneid'])
 
     if not (has_gene):
         return render_template(
             'tab_2.html',
             enhancers=[],
-            filter_options=filter_options,
+            summary={},
+            filter_options=get_filter_options(),
             error_message=(
               "Please specify either a gene (symbol or gene_id) "
             )
         )
 
-
-    gene_enhancers = associations_by_symbol(symbol or None, geneid or None, activity_score,
-                                           exp_condition, time_cluster, immune_process) if has_gene else []
+    _, page_query = page_request(len(ASSOCIATION_KEY))
+    filter_options, (gene_enhancers, next_cursor), summary = run_concurrently(
+        get_filter_options, lambda: gene_page(params), lambda: gene_summary(params)
+    )
 
     return render_template(
         'tab_2.html',
         enhancers=gene_enhancers,
+        summary=summary if gene_enhancers else {},
+        next_cursor=next_cursor,
+        page_query=page_query,
         filter_options=filter_options,
         error_message=""
     )
 
 
-## Tab 3
-@app.route('/activity_class_search', methods=['POST'])
-def activity_class_search():
-    # Get genomic region parameters
-    chr = request.form.get('chr', '').strip() or None
-    start_str = request.form.get('start', '').strip() or None
-    end_str = request.form.get('end', '').strip() or None
-    enhancer_name = request.form.get('enhancer_name', '').strip() or None
+@app.route('/submit_gene/page', methods=['POST'])
+def find_enhancer_page():
+    """Further Tab 2 table rows"""
+    try:
+        after, _ = page_request(len(ASSOCIATION_KEY))
+        params = gene_params(request.form)
+    except ValueError as e:
+        return str(e), 400
 
-    # Get activity parameters
-    activity_class = request.form.get("activity_class", "").strip() or None
-    accessibility = request.form.get("accessibility", "").strip() or None
+    gene_enhancers, next_cursor = gene_page(params, after)
+    return page_rows('gene_rows.html', next_cursor, enhancers=gene_enhancers)
 
-    # Convert start/end to integers if provided
-    start = int(start_str) if start_str else None
-    end = int(end_str) if end_str else None
 
-    filter_options = get_filter_options()
+def gene_list_from_request():
+    """Gene names from an uploaded gene_file, a pasted gene_list, or a JSON {"genes": [...]} body"""
+    upload = request.files.get('gene_file')
+    if upload and upload.filename:
+        return parse_gene_list(upload.read().decode('utf-8', errors='replace'))
+
+    payload = request.get_json(silent=True) if request.is_json else None
+    if payload and isinstance(payload.get('genes'), list):
+        return parse_gene_list(' '.join(str(name) for name in payload['genes']))
+
+    return parse_gene_list(request.form.get('gene_list', ''))
+
+
+def gene_list_filters():
+    source = request.get_json(silent=True) if request.is_json else request.form
+    source = source or {}
+    return dict(
+        activity_score=float(source.get("activity_score", 0) or 0),
+        exp_condition=str(source.get("condition") or "").strip() or None,
+        time_cluster=str(source.get("time_cluster") or "").strip() or None,
+        immune_process=str(source.get("immune_process") or "").strip() or None,
+    )
+
+
+@app.route('/submit_gene_list', methods=['POST'])
+def find_enhancers_for_gene_list():
+    """Tab 2 bulk mode: a pasted or uploaded list of symbols/FBgn ids, streamed back gene by gene"""
+    names = gene_list_from_request()
+    filters = gene_list_filters()
+
+    if not names:
+        return render_template('tab_2_list.html', error_message="Please paste or upload a list of gene symbols or gene IDs.")
+    if len(names) > MAX_GENE_LIST:
+        return render_template(
+            'tab_2_list.html',
+            error_message=f"Please submit at most {MAX_GENE_LIST} genes per list ({len(names)} given)."
+        )
+
+    try:
+        genes, unmatched = resolve_gene_list(names)
+    except mariadb.Error as e:
+        print(f"Error resolving gene list: {e}")
+        return render_template('tab_2_list.html', error_message="Gene lookup failed. Please try again.")
+
+    return Response(stream_with_context(stream_template(
+        'tab_2_list.html',
+        requested=len(names),
+        matched=len(genes),
+        unmatched=unmatched,
+        groups=iter_gene_list_associations(genes, **filters),
+        error_message=""
+    )))
+
+
+@app.route('/api/gene_list', methods=['POST'])
+def api_gene_list():
+    """Bulk gene lookup as newline-delimited JSON: a summary line, then one line per matched gene"""
+    names = gene_list_from_request()
+    filters = gene_list_filters()
+
+    if not names:
+        return jsonify({'error': 'No gene symbols or gene IDs given'}), 400
+    if len(names) > MAX_GENE_LIST:
+        return jsonify({'error': f'At most {MAX_GENE_LIST} genes per request'}), 400
+
+    try:
+        genes, unmatched = resolve_gene_list(names)
+    except mariadb.Error as e:
+        print(f"Error resolving gene list: {e}")
+        return jsonify({'error': 'Gene lookup failed'}), 500
+
+    def generate():
+        yield json.dumps({'requested': len(names), 'matched': len(genes), 'unmatched': unmatched}) + "\n"
+        for gene, rows in iter_gene_list_associations(genes, **filters):
+            for row in rows:
+                del row['gid']
+            yield json.dumps({
+                'gene_symbol': gene['gene_symbol'],
+                'gene_id': gene['gene_id'],
+                'enhancers': rows
+            }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+## Tab 3
+@app.route('/activity_class_search', methods=['GET', 'POST'])
+@cacheable_search(activity_class_params, ACTIVITY_CLASS_FIELDS)
+def activity_class_search():
+    params = activity_class_params(request.values)
 
     enhancers = []
+    summary = {}
+    next_cursor = None
     error_message = ""
 
     # Check if at least one search criterion is provided
-    has_coordinates = chr and start is not None and end is not None
-    has_enhancer_name = enhancer_name is not None
-    has_activity_filters = activity_class or accessibility
+    has_activity_filters = params['activity_class'] or params['accessibility']
 
-    if not (has_coordinates or has_enhancer_name or has_activity_filters):
+    if not (has_region_input(params) or has_activity_filters):
+        filter_options = get_filter_options()
         error_message = "Please provide either genomic coordinates, enhancer name, or select at least one activity filter"
     else:
-        enhancers = search_by_activity_class(
-            chr=chr,
-            start=start,
-            end=end,
-            enhancer_name=enhancer_name,
-            activity_class=activity_class,
-            accessibility=accessibility
+        filter_options, (enhancers, next_cursor), summary = run_concurrently(
+            get_filter_options, lambda: activity_class_page(params), lambda: activity_class_summary(params)
         )
 
         if not enhancers:
+            summary = {}
             error_message = "No enhancers found matching your criteria"
 
+    _, page_query = page_request(1)
+
     return render_template(
         'tab_3.html',
         enhancers=enhancers,
+        summary=summary,
+        next_cursor=next_cursor,
+        page_query=page_query,
         filter_options=filter_options,
         error_message=error_message
     )
 
 
+@app.route('/activity_class_search/page', methods=['POST'])
+def activity_class_search_page():
+    """Further Tab 3 table rows, a page of enhancers at a time"""
+    try:
+        after, _ = page_request(1)
+        params = activity_class_params(request.form)
+    except ValueError as e:
+        return str(e), 400
+
+    enhancers, next_cursor = activity_class_page(params, after)
+    return page_rows('activity_class_rows.html', next_cursor, enhancers=enhancers)
+
+
+## Downloads
+REGION_EXPORT_HEADER = ['Enhancer ID', 'Enhancer Length', 'Chromosome', 'Window Start', 'Window End',
+                        'Experimental Condition', 'Activity Score', 'Accessibility', 'Gene Symbol', 'Gene ID',
+                        'TPM Control', 'TPM 20E', 'TPM IMD', 'Immune Process', 'Time Cluster']
+
+GENE_EXPORT_HEADER = ['Enhancer Name', 'Enhancer Length', 'Chromosome', 'Start', 'End', 'Accessibility',
+                      'Activity Score', 'Condition', 'Gene Symbol', 'Gene ID']
+
+ACTIVITY_CLASS_EXPORT_HEADER = ['Enhancer Name', 'Activity Class', 'Accessibility', 'Gene Symbol', 'Gene ID']
+
+
+def region_export_row(row):
+    (
+        enhancer_id, en_length, accessibility,
+        chrom, estart, eend,
+        exp_condition, act_score, gene_symbol, gene_id,
+        tpm_ctrl, tpm_20e, tpm_imd, immune_process, time_cluster
+    ) = row
+    return (enhancer_id, en_length, chrom, max(0, estart - 5000), eend + 5000,
+            exp_condition, act_score, accessibility, gene_symbol, gene_id,
+            tpm_ctrl, tpm_20e, tpm_imd, immune_process, time_cluster)
+
+
+def gene_export_row(row):
+    (
+        enhancer_id, en_length, accessibility, act_score, exp_condition,
+        gene_symbol, gene_id, tpm_ctrl, tpm_imd, tpm_20e,
+        chrom, estart, eend, time_cluster, immune_process
+    ) = row
+    return (enhancer_id, en_length, chrom, estart, eend, accessibility,
+            act_score, exp_condition, gene_symbol, gene_id)
+
+
+def activity_class_export_row(row):
+    _, enhancer_name, activity_class, accessibility, gene_id, gene_symbol = row
+    return (enhancer_name, activity_class, accessibility, gene_symbol, gene_id)
+
+
+def iter_export_rows(query, params, to_row):
+    """Stream export rows off an unbuffered cursor, skipping rows already sent"""
+    with db_connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query, params)
+        # Duplicates needn't be adjacent in the search's display order
+        seen = set()
+        for row in cursor:
+            if row not in seen:
+                seen.add(row)
+                yield to_row(row)
+
+
+@app.route('/export/<mode>.<fmt>', methods=['GET'])
+def export_results(mode, fmt):
+    """Stream a search's full result set as CSV, TSV or XLSX; takes the search form's fields as query parameters"""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}'"}), 404
+
+    try:
+        if mode == 'region':
+            params = region_params(request.args)
+            built = region_query(**params)
+            header, order, to_row = REGION_EXPORT_HEADER, REGION_ORDER, region_export_row
+            name = params['enhancer_name'] or f"{params['chr'] or 'All'}_Region"
+            prefix = f"Enhancers_{name}_{params['exp_condition'] or 'All'}"
+        elif mode == 'gene':
+            params = gene_params(request.args)
+            built = symbol_query(**params)
+            header, order, to_row = GENE_EXPORT_HEADER, GENE_ORDER, gene_export_row
+            prefix = f"Gene_{params['symbol'] or params['geneid'] or 'Gene'}_Enhancers_{params['exp_condition'] or 'All'}"
+        elif mode == 'activity_class':
+            params = activity_class_params(request.args)
+            built = activity_class_query(**params)
+            header, order, to_row = ACTIVITY_CLASS_EXPORT_HEADER, ACTIVITY_CLASS_ORDER, activity_class_export_row
+            prefix = f"ActivityClass_{params['activity_class'] or 'All'}_{params['accessibility'] or 'All'}"
+        else:
+            return jsonify({'error': f"Unknown export '{mode}'"}), 404
+    except ValueError:
+        return jsonify({'error': 'start, end and activity scores must be numbers'}), 400
+    except mariadb.Error as e:
+        print(f"Database error: {e}")
+        return jsonify({'error': 'Export failed'}), 500
+
+    rows = iter_export_rows(built[0] + order, built[1], to_row) if built else iter(())
+    filename = re.sub(r'[^A-Za-z0-9_.+-]+', '_', f"{prefix}_{date.today().isoformat()}") + f".{fmt}"
+
+    return Response(
+        stream_with_context(stream_export(fmt, header, rows)),
+        content_type=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+## JSON API
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+def api_page(key, build, hidden=()):
+    """Shared body of the paged JSON search endpoints"""
+    try:
+        limit = int(request.args.get('limit') or API_PAGE_SIZE)
+        if not 1 <= limit <= API_MAX_PAGE_SIZE:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': f'limit must be between 1 and {API_MAX_PAGE_SIZE}'}), 400
+
+    token = request.args.get('cursor', '').strip()
+    try:
+        after = decode_cursor(token, len(key)) if token else None
+        built = build()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if built is None:
+        return jsonify({'results': [], 'next_cursor': None, 'limit': limit})
+
+    try:
+        rows, next_cursor = fetch_keyset_page(built, key, after, limit)
+    except mariadb.Error as e:
+        print(f"Database error: {e}")
+        return jsonify({'error': 'Query failed'}), 500
+
+    for row in rows:
+        for alias in hidden:
+            row.pop(alias, None)
+    return jsonify({'results': rows, 'next_cursor': next_cursor, 'limit': limit})
+
+
+@app.route('/api/region', methods=['GET'])
+def api_region():
+    """Tab 1 associations as flat JSON rows, paged by ?cursor= in (enhancer, condition) order"""
+    def build():
+        params = region_params(request.args)
+        if not has_region_input(params):
+            raise ValueError("Give chr, start and end, or enhancer_name")
+        return region_query(**params, columns=key_columns(ASSOCIATION_KEY, REGION_COLUMNS))
+
+    return api_page(ASSOCIATION_KEY, build, hidden=('condition_rank', 'eid', 'gid'))
+
+
+@app.route('/api/gene', methods=['GET'])
+def api_gene():
+    """Tab 2 enhancers for one gene as JSON rows, paged by ?cursor= in (enhancer, condition) order"""
+    def build():
+        params = gene_params(request.args)
+        if not (params['symbol'] or params['geneid']):
+            raise ValueError("Give symbol or geneid")
+        return symbol_query(**params, columns=key_columns(ASSOCIATION_KEY, GENE_COLUMNS))
+
+    return api_page(ASSOCIATION_KEY, build, hidden=('condition_rank', 'eid', 'gid'))
+
+
+@app.route('/api/activity_class', methods=['GET'])
+def api_activity_class():
+    """Tab 3 activity class rows as JSON, paged by ?cursor= in (enhancer, gene) order"""
+    def build():
+        params = activity_class_params(request.args)
+        if not (has_region_input(params) or params['activity_class'] or params['accessibility']):
+            raise ValueError("Give a region, enhancer_name, activity_class or accessibility")
+        return activity_class_query(**params, columns=key_columns(ACTIVITY_CLASS_KEY, ACTIVITY_CLASS_SELECT))
+
+    return api_page(ACTIVITY_CLASS_KEY, build, hidden=('gene_sort',))
+
+
+## Density tiles
+# Bins per tile request by default (about one per pixel of an overview track), and at most
+TILE_BINS = 1000
+TILE_MAX_BINS = 5000
+
+TILE_FIELDS = [
+    ('chr', 'chr', None), ('start', 'start', None), ('end', 'end', None), ('bins', 'bins', TILE_BINS),
+    ('exp_condition', 'condition', None), ('activity_class', 'activity_class', None),
+]
+
+
+def tile_params(source):
+    """Density tile parameters from a query string"""
+    start_str = source.get('start', '').strip()
+    end_str = source.get('end', '').strip()
+    return dict(
+        chr=source.get('chr', '').strip().upper() or None,
+        start=int(start_str) if start_str else None,
+        end=int(end_str) if end_str else None,
+        bins=int(source.get('bins') or TILE_BINS),
+        exp_condition=source.get('condition', '').strip() or None,
+        activity_class=source.get('activity_class', '').strip() or None,
+    )
+
+
+def tile_params_error(params):
+    if not params['chr']:
+        return "Give chr"
+    if (params['start'] is None) != (params['end'] is None):
+        return "Give both start and end, or neither for the whole chromosome"
+    if params['start'] is not None and not 0 <= params['start'] <= params['end']:
+        return "start must be at least 0 and at most end"
+    if not 1 <= params['bins'] <= TILE_MAX_BINS:
+        return f"bins must be between 1 and {TILE_MAX_BINS}"
+    return None
+
+
+def add_tile_counts(counts, key, enhancers, associations):
+    if key:
+        entry = counts.setdefault(key, {'enhancers': 0, 'associations': 0})
+        entry['enhancers'] += enhancers
+        entry['associations'] += associations
+
+
+@cached_result
+def density_tiles(params):
+    """Non-empty density bins over the requested region at the finest size that fits in params['bins'].
+
+    Only Density_tiles is read, however large the region. Without start and end the
+    whole chromosome is covered. Returns None on a database error.
+    """
+    chromosome, start, end = params['chr'], params['start'], params['end']
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            if start is None:
+                cursor.execute("SELECT MAX(bin_start) FROM Density_tiles WHERE bin_size = %s AND chromosome = %s",
+                               (TILE_SIZES[-1], chromosome))
+                last = cursor.fetchone()[0]
+                start, end = 0, (last or 0) + TILE_SIZES[-1] - 1
+
+            size = tile_size(start, end, params['bins'])
+            query = """
+                SELECT bin_start, exp_condition, activity_class, enhancers, associations
+                FROM Density_tiles
+                WHERE bin_size = %s AND chromosome = %s AND bin_start BETWEEN %s AND %s
+            """
+            query_params = [size, chromosome, start // size * size, end]
+            if params['exp_condition']:
+                query += " AND exp_condition = %s"
+                query_params.append(params['exp_condition'])
+            if params['activity_class']:
+                query += " AND activity_class = %s"
+                query_params.append(params['activity_class'])
+            cursor.execute(query + " ORDER BY bin_start", query_params)
+            rows = cursor.fetchall()
+
+    except mariadb.Error as e:
+        print(f"Database error: {e}")
+        return None
+
+    bins = []
+    for bin_start, bin_rows in groupby(rows, key=itemgetter(0)):
+        tile = {'start': bin_start, 'enhancers': 0, 'associations': 0, 'conditions': {}, 'activity_classes': {}}
+        for _, condition, activity_class, enhancers, associations in bin_rows:
+            tile['enhancers'] += enhancers
+            tile['associations'] += associations
+            add_tile_counts(tile['conditions'], condition, enhancers, associations)
+            add_tile_counts(tile['activity_classes'], activity_class, enhancers, associations)
+        bins.append(tile)
+    return {'chromosome': chromosome, 'start': start, 'end': end, 'bin_size': size, 'bins': bins}
+
+
+@app.route('/api/tiles', methods=['GET'])
+@cacheable_search(tile_params, TILE_FIELDS)
+def api_tiles():
+    """Enhancer and association density over a region, from the precomputed tiles"""
+    params = tile_params(request.args)
+    error = tile_params_error(params)
+    if error:
+        return jsonify({'error': error}), 400
+
+    tiles = density_tiles(params)
+    if tiles is None:
+        return jsonify({'error': 'Query failed'}), 500
+    return jsonify(tiles)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms for Prometheus to scrape"""
+    return Response(metrics.render(METRICS_DIR), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/pool_stats', methods=['GET'])
+def pool_status():
+    """Connection pool occupancy for the worker process that served the request"""
+    return jsonify(pool_stats())
+
+
 @app.route('/autocomplete_gene', methods=['GET'])
 def autocomplete_gene():
     """Autocomplete endpoint for gene symbols"""
@@ -607,34 +2405,18 @@ def autocomplete_gene():
         return jsonify([])
 
     try:
-        conn = connect_db()
-        cursor = conn.cursor()
-
-        # Search for gene symbols that start with or contain the query
-        sql = """
-              SELECT DISTINCT symbol, geneid
-              FROM Genes
-              WHERE LOWER(symbol) LIKE %s
-                 OR LOWER(geneid) LIKE %s
-              ORDER BY symbol LIMIT 20 \
-              """
-
-        search_pattern = f"%{query}%"
-        cursor.execute(sql, (search_pattern, search_pattern))
-        results = cursor.fetchall()
+        # Exact and prefix matches rank ahead of matches inside the symbol or gene id
+        results = get_gene_index().search(query, limit=20)
 
         # Format results for autocomplete
         suggestions = []
-        for row in results:
-            symbol, geneid = row
-            if symbol:
-                suggestions.append({
-                    'label': f"{symbol} ({geneid})",
-                    'value': symbol,
-                    'geneid': geneid
-                })
+        for symbol, geneid in results:
+            suggestions.append({
+                'label': f"{symbol} ({geneid})",
+                'value': symbol,
+                'geneid': geneid
+            })
 
-        conn.close()
         return jsonify(suggestions)
 
     except mariadb.Error as e:
@@ -0,0 +1,184 @@
+"""Synthetic processed_data/ CSVs for benchmarking, at a multiple of the real dataset's size.
+
+Enhancers and genes are spread over the Drosophila (dm6) chromosome arms in proportion
+to their length. Every enhancer is measured in one to three treatments and linked to
+genes near it, with the real data's fan-out of about three genes per enhancer and
+treatment. A given scale and seed always produce the same files.
+
+    python benchmarks/generate_data.py --scale 10 --out benchmarks/data/x10
+"""
+
+import argparse
+import bisect
+import csv
+import random
+from pathlib import Path
+
+# dm6 arm lengths
+CHROMOSOME_ARMS = {
+    "2L": 23_513_712, "2R": 25_286_936, "3L": 28_110_227, "3R": 32_079_331,
+    "X": 23_542_271, "4": 1_348_131, "Y": 3_667_352,
+}
+
+# Size of the real dataset (data_extract.ipynb), i.e. scale 1
+ENHANCERS = 8_204
+GENES = 10_412
+# Share of enhancers that also appear in the activity class table, and their genes each
+TAB3_ENHANCER_SHARE = 0.52
+TAB3_GENES_PER_ENHANCER = (1, 4)
+
+TREATMENTS = ["Control", "20E", "IMD"]
+# Enhancers measured in one, two or all three treatments
+TREATMENT_COUNT_WEIGHTS = [0.55, 0.30, 0.15]
+# Genes linked per enhancer and treatment, searched for within this distance
+FAN_OUT_WEIGHTS = {1: 0.20, 2: 0.22, 3: 0.20, 4: 0.15, 5: 0.10, 6: 0.07, 8: 0.04, 12: 0.02}
+NEIGHBOURHOOD = 50_000
+
+ACCESSIBILITY = ["Always open", "Always closed", "HKSM closed", "HKSM opened"]
+ACTIVITY_CLASSES = ["Control", "20E", "HKSM", "Control + 20E", "Control + HKSM", "HKSM + 20E", "Constitutive"]
+GENE_TIME_CLUSTERS = ["early_C2", "mid_C3", "late_C1", "late_C4"]
+TAB3_TIME_CLUSTERS = ["Early", "Mid", "Late", "Midlate"]
+IMMUNE_PROCESSES = ["Toll", "IMD", "JAK/STAT", "JNK", "Melanization", "Phagocytosis"]
+IMMUNE_ROLES = ["Signaling", "Recognition", "Other", "Effector", "Effector (AMP)", "Anti-viral", "Effector (ROS)"]
+TRANSCRIPTION_FACTORS = ["crp_3", "EcR_usp_3", "Eip74EF_3", "gcm_3", "Hnf4_3", "kay_Jra_3", "Rel_3",
+                         "slp2_fork_3", "SREBP_3", "srp_SANGER_3", "Trl_3", "XBP1_3", "xrp1_3"]
+SYMBOL_PREFIXES = ["CG", "CG", "CG", "CR", "lncRNA:CR", "Cec", "Dpt", "Drs", "Att", "Rel", "Tep", "PGRP-"]
+
+ENHANCER_HEADER = ["Enhancer", "Chromosome", "Start", "End", "Length", "Treatment", "TF_counts", "TBS"]
+GENES_HEADER = ["GeneID", "Chromosome", "Start", "End", "GeneName", "Immune Process", "Time_cluster",
+                "Length", "tpm_ctrl", "tpm_20e", "tpm_imd"]
+ASSOCIATIONS_HEADER = ["Enhancer", "Gene", "coSTARR LogFC HKSMvs20E", "coSTARR LogFC 20EvsControl",
+                       "2021 LogFC IMDvsCTRL", "Treatment", "new_act_score", "Accessibility"]
+TAB3_HEADER = ["Enhancer", "Activity class", "Accessibility", "Gene", "Distance to enhancer",
+               "Time Cluster", "Broad Immune Role"]
+
+
+def random_positions(rng, count):
+    """count (chromosome, position) pairs spread over the arms by length, sorted"""
+    total = sum(CHROMOSOME_ARMS.values())
+    positions = []
+    for chromosome, length in CHROMOSOME_ARMS.items():
+        n = round(count * length / total)
+        positions.extend((chromosome, rng.randrange(1, length)) for _ in range(n))
+    positions.sort()
+    return positions
+
+
+def make_genes(rng, count):
+    """Gene rows, and per chromosome the sorted (start, geneid) list for neighbour lookups"""
+    genes = []
+    by_chromosome = {}
+    for i, (chromosome, start) in enumerate(random_positions(rng, count), 1):
+        length = max(200, int(rng.lognormvariate(7.8, 1.1)))
+        end = min(start + length, CHROMOSOME_ARMS[chromosome])
+        geneid = f"FBgn{i:07d}"
+        symbol = f"{rng.choice(SYMBOL_PREFIXES)}{rng.randrange(1, 50_000)}"
+        immune_process = rng.choice(IMMUNE_PROCESSES) if rng.random() < 0.08 else ""
+        time_cluster = rng.choice(GENE_TIME_CLUSTERS) if rng.random() < 0.25 else ""
+        tpm = [round(rng.lognormvariate(1.5, 2.0), 3) for _ in range(3)]
+        genes.append([geneid, chromosome, start, end, symbol, immune_process, time_cluster, end - start] + tpm)
+        by_chromosome.setdefault(chromosome, []).append((start, geneid))
+    return genes, by_chromosome
+
+
+def nearby_genes(rng, genes_on_chromosome, position, count):
+    """Up to count distinct geneids starting within NEIGHBOURHOOD of position"""
+    lo = bisect.bisect_left(genes_on_chromosome, (position - NEIGHBOURHOOD, ""))
+    hi = bisect.bisect_right(genes_on_chromosome, (position + NEIGHBOURHOOD, "~"))
+    candidates = genes_on_chromosome[lo:hi]
+    if not candidates:
+        return []
+    return [geneid for _, geneid in rng.sample(candidates, min(count, len(candidates)))]
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def generate(out_dir, scale=1, seed=0):
+    """Write the four CSVs for scale into out_dir; returns their row counts by file name"""
+    rng = random.Random(f"{seed}-{scale}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    genes, genes_by_chromosome = make_genes(rng, int(GENES * scale))
+    counts = {"genes.csv": write_csv(out_dir / "genes.csv", GENES_HEADER, genes)}
+    gene_starts = {geneid: (chromosome, start) for geneid, chromosome, start, *_ in genes}
+    del genes
+
+    fan_out = list(FAN_OUT_WEIGHTS)
+    fan_out_weights = list(FAN_OUT_WEIGHTS.values())
+    enhancers = []
+    names = set()
+    for chromosome, start in random_positions(rng, int(ENHANCERS * scale)):
+        length = max(150, min(5000, int(rng.lognormvariate(6.6, 0.5))))
+        end = min(start + length, CHROMOSOME_ARMS[chromosome])
+        name = f"{chromosome}:{start}-{end}"
+        # Names identify enhancers, so a repeated start at large scales is skipped
+        if name not in names:
+            names.add(name)
+            enhancers.append((name, chromosome, start, end))
+    del names
+
+    def enhancer_rows():
+        for name, chromosome, start, end in enhancers:
+            tf_counts = "; ".join(f"{tf}: {rng.randint(1, 4)}"
+                                  for tf in rng.sample(TRANSCRIPTION_FACTORS, rng.randint(0, 4)))
+            tbs = rng.randint(0, 12)
+            for treatment in treatments[name]:
+                yield [name, chromosome, start, end, end - start, treatment, tf_counts, tbs]
+
+    def association_rows():
+        for name, chromosome, start, end in enhancers:
+            accessibility = rng.choice(ACCESSIBILITY)
+            for treatment in treatments[name]:
+                k = rng.choices(fan_out, fan_out_weights)[0]
+                for geneid in nearby_genes(rng, genes_by_chromosome.get(chromosome, []), start, k):
+                    activity = round(min(2000.0, rng.lognormvariate(6.2, 0.8)), 5)
+                    logfc = [round(rng.gauss(0, 1.2), 5) for _ in range(3)]
+                    yield [name, geneid] + logfc + [treatment, activity, accessibility]
+
+    def tab3_rows():
+        for name, chromosome, start, end in enhancers:
+            if rng.random() >= TAB3_ENHANCER_SHARE:
+                continue
+            activity_class = rng.choice(ACTIVITY_CLASSES)
+            accessibility = rng.choice(ACCESSIBILITY)
+            k = rng.randint(*TAB3_GENES_PER_ENHANCER)
+            for geneid in nearby_genes(rng, genes_by_chromosome.get(chromosome, []), start, k):
+                distance = abs(gene_starts[geneid][1] - start)
+                time_cluster = rng.choice(TAB3_TIME_CLUSTERS) if rng.random() < 0.3 else ""
+                role = rng.choice(IMMUNE_ROLES) if rng.random() < 0.2 else ""
+                yield [name, activity_class, accessibility, geneid, distance, time_cluster, role]
+
+    treatments = {
+        name: rng.sample(TREATMENTS, rng.choices([1, 2, 3], TREATMENT_COUNT_WEIGHTS)[0])
+        for name, *_ in enhancers
+    }
+    counts["enhancer.csv"] = write_csv(out_dir / "enhancer.csv", ENHANCER_HEADER, enhancer_rows())
+    counts["associations.csv"] = write_csv(out_dir / "associations.csv", ASSOCIATIONS_HEADER, association_rows())
+    counts["tab3_data.csv"] = write_csv(out_dir / "tab3_data.csv", TAB3_HEADER, tab3_rows())
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic benchmark CSVs")
+    parser.add_argument("--scale", type=float, default=1, help="multiple of the real dataset's size (default 1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="directory for the four CSV files")
+    args = parser.parse_args()
+
+    counts = generate(args.out, args.scale, args.seed)
+    for file_name, count in counts.items():
+        print(f"{file_name}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Time the loader, each search mode and template rendering on generated datasets.
+
+For each scale the CSVs are generated once into the work directory (and reused while
+the scale and seed stay the same), loaded with table_upload.py, and every case is timed
+in a fresh process against the loaded database. The run is then compared with a stored
+baseline, so a change to a query can be checked before it ships:
+
+    python benchmarks/run_benchmarks.py --scales 1 10 100 --save-baseline   # record
+    python benchmarks/run_benchmarks.py --scales 1 10                       # compare
+
+By default each scale is loaded into a SQLite snapshot and served with DB_BACKEND=sqlite.
+With --backend mariadb, table_upload.py reseeds the database configured in .env, so point
+that at a local benchmark database first.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCHMARKS_DIR.parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from generate_data import generate
+
+DEFAULT_BASELINE = BENCHMARKS_DIR / "baseline.json"
+DEFAULT_WORK_DIR = BENCHMARKS_DIR / "data"
+
+REGION_WIDTHS = {"region_10kb": 10_000, "region_100kb": 100_000, "region_1mb": 1_000_000}
+# Different inputs per case; each is timed --repeat times after one untimed warm-up
+INPUTS_PER_CASE = 10
+# Timing differences below this many milliseconds are noise, whatever the ratio
+MIN_DELTA_MS = 1.0
+
+
+## Measuring (runs in a child process per scale)
+def timed(function, repeat):
+    """Milliseconds of each of repeat calls, after one warm-up call, and the warm-up's result"""
+    result = function()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - started) * 1000)
+    return times, result
+
+
+def sample_inputs(app, seed):
+    """Region centres and gene symbols picked from the loaded data"""
+    rng = random.Random(seed)
+    with app.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT chromosome, start FROM Enhancers WHERE chromosome IS NOT NULL ORDER BY eid")
+        enhancers = cursor.fetchall()
+        cursor.execute("""
+            SELECT DISTINCT g.symbol FROM Genes g JOIN Associations a ON a.gid = g.gid
+            WHERE g.symbol IS NOT NULL ORDER BY g.symbol
+        """)
+        symbols = [row[0] for row in cursor.fetchall()]
+    return (
+        rng.sample(enhancers, min(INPUTS_PER_CASE, len(enhancers))),
+        rng.sample(symbols, min(INPUTS_PER_CASE, len(symbols))),
+    )
+
+
+def measure(scale, seed, repeat):
+    """Time every case against the database the environment points at"""
+    sys.path.insert(0, str(REPO_DIR))
+    import app
+    from flask import render_template
+
+    centres, symbols = sample_inputs(app, seed)
+    rng = random.Random(seed)
+    cases = {}
+
+    def run_case(name, calls):
+        times, results = [], 0
+        for call in calls:
+            call_times, result = timed(call, repeat)
+            times.extend(call_times)
+            results += len(result) if result is not None else 0
+        times.sort()
+        cases[name] = {
+            "median_ms": statistics.median(times),
+            "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+            "results": results,
+        }
+
+    def region(centre, width):
+        chromosome, start = centre
+        return chromosome, max(0, start - width // 2), start + width // 2
+
+    for name, width in REGION_WIDTHS.items():
+        run_case(name, [
+            lambda r=region(c, width): app.associations_by_region(*r, activity_score_min=0)
+            for c in centres
+        ])
+    run_case("symbol", [lambda s=s: app.associations_by_symbol(symbol=s, activity_score=0) for s in symbols])
+    run_case("activity_class_region", [
+        lambda r=region(c, 1_000_000): app.search_by_activity_class(*r) for c in centres
+    ])
+    run_case("activity_class_filter", [
+        lambda c=c, a=a: app.search_by_activity_class(activity_class=c, accessibility=a)
+        for c, a in [("Constitutive", "Always open"), ("Control + 20E", None), (None, "HKSM opened")]
+    ])
+    run_case("tiles_1mb", [
+        lambda r=region(c, 1_000_000): app.density_tiles(
+            app.tile_params({"chr": r[0], "start": str(r[1]), "end": str(r[2])}))["bins"]
+        for c in centres
+    ])
+    run_case("tiles_chromosome", [
+        lambda c=c: app.density_tiles(app.tile_params({"chr": c[0]}))["bins"] for c in centres
+    ])
+
+    client = app.app.test_client()
+    prefixes = [s[:rng.randint(2, 4)] for s in symbols]
+    run_case("autocomplete", [
+        lambda p=p: client.get("/autocomplete_gene", query_string={"term": p}).get_json() for p in prefixes
+    ])
+
+    # Whole requests, rendering included; results count the ones answered with 200
+    def get(path, **params):
+        def call():
+            response = client.get(path, query_string=params, follow_redirects=True)
+            return [response.status_code] if response.status_code == 200 else []
+        return call
+
+    run_case("endpoint_region", [
+        get("/submit_region", chr=r[0], start=r[1], end=r[2]) for r in (region(c, 1_000_000) for c in centres)
+    ])
+    run_case("endpoint_gene", [get("/submit_gene", symbol=s, activity_score=0) for s in symbols])
+    run_case("endpoint_activity_class", [
+        get("/activity_class_search", chr=r[0], start=r[1], end=r[2]) for r in (region(c, 1_000_000) for c in centres)
+    ])
+
+    # Rendering alone, from results fetched beforehand
+    def render(template, path, context):
+        def call():
+            with app.app.test_request_context(path):
+                return [render_template(template, **context)]
+        return call
+
+    filter_options = app.get_filter_options()
+    renders = {"render_tab_1": [], "render_tab_2": [], "render_tab_3": []}
+    for centre, symbol in zip(centres, symbols):
+        chromosome, start, end = region(centre, 1_000_000)
+        params = app.region_params({"chr": chromosome, "start": str(start), "end": str(end)})
+        enhancers, next_cursor = app.region_page(params)
+        renders["render_tab_1"].append(render("tab_1.html", "/submit_region", dict(
+            enhancers=enhancers, summary=app.region_summary(params), next_cursor=next_cursor,
+            page_query="", filter_options=filter_options)))
+
+        params = app.gene_params({"symbol": symbol, "activity_score": "0"})
+        enhancers, next_cursor = app.gene_page(params)
+        renders["render_tab_2"].append(render("tab_2.html", "/submit_gene", dict(
+            enhancers=enhancers, summary=app.gene_summary(params), next_cursor=next_cursor,
+            page_query="", filter_options=filter_options, error_message="")))
+
+        params = app.activity_class_params({"chr": chromosome, "start": str(start), "end": str(end)})
+        enhancers, next_cursor = app.activity_class_page(params)
+        renders["render_tab_3"].append(render("tab_3.html", "/activity_class_search", dict(
+            enhancers=enhancers, summary=app.activity_class_summary(params) if enhancers else {},
+            next_cursor=next_cursor, page_query="", filter_options=filter_options, error_message="")))
+    for name, calls in renders.items():
+        run_case(name, calls)
+
+    return cases
+
+
+## Running
+def load(data_dir, backend, snapshot_path, bulk):
+    """Load data_dir with table_upload.py; returns the seconds it took"""
+    env = dict(os.environ, DATA_DIR=str(data_dir))
+    command = [sys.executable, str(REPO_DIR / "table_upload.py")]
+    if backend == "sqlite":
+        command += ["--snapshot", str(snapshot_path)]
+    elif bulk:
+        command.append("--bulk")
+
+    started = time.perf_counter()
+    completed = subprocess.run(command, env=env, cwd=REPO_DIR, capture_output=True, text=True)
+    seconds = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"table_upload.py failed:\n{completed.stdout}\n{completed.stderr}")
+    return seconds
+
+
+def run_scale(scale, args):
+    data_dir = Path(args.work_dir) / f"x{scale:g}-seed{args.seed}"
+    if not (data_dir / "tab3_data.csv").exists():
+        print(f"Generating {scale:g}x dataset in {data_dir}...")
+        generate(data_dir, scale, args.seed)
+    rows = {}
+    for file_name in ["enhancer.csv", "genes.csv", "associations.csv", "tab3_data.csv"]:
+        with open(data_dir / file_name, encoding="utf-8") as f:
+            rows[file_name] = sum(1 for _ in f) - 1
+
+    snapshot_path = data_dir / "snapshot.sqlite"
+    print(f"Loading {scale:g}x dataset ({rows['associations.csv']} associations)...")
+    load_s = load(data_dir, args.backend, snapshot_path, args.bulk)
+
+    print(f"Timing queries on the {scale:g}x dataset...")
+    env = dict(os.environ, DB_BACKEND=args.backend, SNAPSHOT_PATH=str(snapshot_path),
+               RESULT_CACHE_MB="0", METRICS_DIR="")
+    command = [sys.executable, __file__, "--measure", "--scales", f"{scale:g}",
+               "--seed", str(args.seed), "--repeat", str(args.repeat)]
+    completed = subprocess.run(command, env=env, cwd=REPO_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Timing the {scale:g}x dataset failed:\n{completed.stdout}\n{completed.stderr}")
+    cases = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    return {"rows": rows, "load_s": load_s, "cases": cases}
+
+
+def compare(results, baseline, tolerance):
+    """Print each case against the baseline; returns the number of regressions"""
+    regressions = 0
+    for scale, current in results["scales"].items():
+        before = baseline["scales"].get(scale)
+        print(f"\n{scale}x dataset")
+        if before is None:
+            print("  (not in baseline)")
+            continue
+        if before["rows"] != current["rows"]:
+            print("  Dataset differs from the baseline's; timings are not comparable")
+            regressions += 1
+            continue
+
+        entries = [("load", before["load_s"] * 1000, current["load_s"] * 1000, None, None)]
+        for name, case in current["cases"].items():
+            old = before["cases"].get(name)
+            if old:
+                entries.append((name, old["median_ms"], case["median_ms"], old["results"], case["results"]))
+
+        for name, old_ms, new_ms, old_results, new_results in entries:
+            ratio = new_ms / old_ms if old_ms else float("inf")
+            note = ""
+            if old_results != new_results:
+                note = f"RESULTS CHANGED ({old_results} -> {new_results})"
+                regressions += 1
+            elif ratio > 1 + tolerance and new_ms - old_ms > MIN_DELTA_MS:
+                note = "SLOWER"
+                regressions += 1
+            elif ratio < 1 / (1 + tolerance) and old_ms - new_ms > MIN_DELTA_MS:
+                note = "faster"
+            print(f"  {name:<26} {old_ms:>10.2f} ms -> {new_ms:>10.2f} ms  {ratio:>6.2f}x  {note}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the loader and the search modes")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100],
+                        help="dataset sizes as multiples of the real data (default 1 10 100)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per input (default 5)")
+    parser.add_argument("--backend", choices=["sqlite", "mariadb"], default="sqlite")
+    parser.add_argument("--bulk", action="store_true", help="load MariaDB with table_upload.py --bulk")
+    parser.add_argument("--work-dir", default=str(DEFAULT_WORK_DIR), help="where generated datasets are kept")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown allowed before a case counts as a regression (default 0.25)")
+    parser.add_argument("--output", help="also write this run's results to a JSON file")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.scales[0], args.seed, args.repeat)))
+        return
+
+    results = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.node(),
+            "backend": args.backend,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "scales": {f"{scale:g}": run_scale(scale, args) for scale in args.scales},
+    }
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not Path(args.baseline).exists():
+        print(json.dumps(results, indent=2))
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to store one")
+        return
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    if baseline["meta"].get("backend") != args.backend:
+        print(f"Baseline was measured on {baseline['meta'].get('backend')}, this run on {args.backend}")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{regressions} regression(s) against the baseline")
+        sys.exit(1)
+    print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""In-memory typeahead index over gene symbols and FlyBase gene ids.
+
+Prefix lookups bisect sorted lowercase keys; anything else falls back to a
+bigram index whose posting lists are intersected and then checked with a
+plain substring test.
+"""
+
+from bisect import bisect_left
+
+NGRAM = 2
+
+
+def ngrams(text, n=NGRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class GeneAutocompleteIndex:
+    """Ranks exact matches first, then symbol prefixes, geneid prefixes and finally infix hits"""
+
+    def __init__(self, rows):
+        """rows: iterable of (symbol, geneid); genes without a symbol are not suggested"""
+        self._entries = sorted(
+            {(symbol, geneid) for symbol, geneid in rows if symbol},
+            key=lambda entry: (entry[0].lower(), entry[1] or '')
+        )
+
+        self._symbol_keys = []
+        self._geneid_keys = []
+        grams = {}
+        for i, (symbol, geneid) in enumerate(self._entries):
+            keys = [symbol.lower()]
+            self._symbol_keys.append((keys[0], i))
+            if geneid:
+                keys.append(geneid.lower())
+                self._geneid_keys.append((keys[1], i))
+            for key in keys:
+                for gram in ngrams(key):
+                    postings = grams.setdefault(gram, [])
+                    if not postings or postings[-1] != i:
+                        postings.append(i)
+
+        self._symbol_keys.sort()
+        self._geneid_keys.sort()
+        self._grams = grams
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _prefix_hits(keys, term):
+        pos = bisect_left(keys, (term,))
+        while pos < len(keys) and keys[pos][0].startswith(term):
+            yield keys[pos]
+            pos += 1
+
+    def _infix_hits(self, term):
+        postings = [self._grams.get(gram) for gram in ngrams(term)]
+        if not postings or any(p is None for p in postings):
+            return []
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        hits = []
+        for i in sorted(candidates):
+            symbol, geneid = self._entries[i]
+            if term in symbol.lower() or (geneid and term in geneid.lower()):
+                hits.append(i)
+        return hits
+
+    def search(self, term, limit=20):
+        """Return up to limit (symbol, geneid) pairs containing term in either field"""
+        term = term.strip().lower()
+        if not term:
+            return []
+
+        ranked = []
+        seen = set()
+
+        def add(i):
+            if i not in seen and len(ranked) < limit:
+                seen.add(i)
+                ranked.append(i)
+
+        # Exact keys sort first among their prefix hits, so they lead each prefix scan
+        for keys in (self._symbol_keys, self._geneid_keys):
+            for key, i in self._prefix_hits(keys, term):
+                if key != term:
+                    break
+                add(i)
+        for keys in (self._symbol_keys, self._geneid_keys):
+            for _, i in self._prefix_hits(keys, term):
+                if len(ranked) >= limit:
+                    break
+                add(i)
+        if len(ranked) < limit:
+            for i in self._infix_hits(term):
+                add(i)
+
+        return [self._entries[i] for i in ranked]
@@ -0,0 +1,227 @@
+"""Latency histograms in the Prometheus text format, for the /metrics endpoint.
+
+Each worker process keeps its histograms in memory and writes them to a shared
+directory at most every few seconds. render() adds up the files of every process on
+the host, so a scrape sees the whole server whichever worker answers it. Prometheus
+expects counters never to go down, so the file of an exited worker is added into
+RETIRED_FILE and then removed, rather than dropped. The directory is created private
+to the app's user, and one owned by anyone else is not read or written.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+
+from result_cache import check_owned, ensure_private_dir
+
+# Seconds, from a 1 ms lookup to a 30 s export
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+# Summed histograms of the workers that have exited
+RETIRED_FILE = "retired.json"
+
+
+class Histogram:
+    """Bucketed observations per combination of label values"""
+
+    def __init__(self, name, help, labels, buckets, lock):
+        self.name = name
+        self.help = help
+        self.labels = list(labels)
+        self.buckets = list(buckets)
+        self._lock = lock
+        # label values -> [count per bucket..., count above the last bucket, sum]
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._file = f"{os.getpid()}-{int(time.time())}.json"
+        self._written = 0.0
+
+    def share(self, directory):
+        """Also save the last few seconds of observations when the worker exits"""
+        if directory:
+            atexit.register(self.write, directory)
+
+    def histogram(self, name, help, labels, buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(name, help, labels, buckets, self._lock)
+        self.histograms[name] = histogram
+        return histogram
+
+    def snapshot(self):
+        """This process's histograms as JSON-friendly data"""
+        with self._lock:
+            return {
+                name: {'buckets': h.buckets, 'series': [[list(key), list(values)] for key, values in h.series.items()]}
+                for name, h in self.histograms.items()
+            }
+
+    def write(self, directory):
+        """Save this process's snapshot for the other workers' render()"""
+        try:
+            ensure_private_dir(directory)
+            path = os.path.join(directory, self._file)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print(f"Can't write metrics to {directory}: {e}")
+
+    def maybe_write(self, directory, interval=5):
+        """write() unless this process wrote less than interval seconds ago"""
+        now = time.monotonic()
+        if not directory or now - self._written < interval:
+            return
+        self._written = now
+        self.write(directory)
+
+    def collect(self, directory=None):
+        """Summed series of every process writing to directory, this one's taken live"""
+        totals = {name: {} for name in self.histograms}
+        snapshots = [self.snapshot()]
+        if directory and self._readable(directory):
+            self.retire_exited(directory)
+            for file_name in os.listdir(directory):
+                if file_name == self._file or not file_name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(directory, file_name)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+
+        for data in snapshots:
+            for name, histogram in self.histograms.items():
+                entry = data.get(name)
+                # Skip files from a deploy whose buckets differed
+                if not entry or entry['buckets'] != histogram.buckets:
+                    continue
+                for key, values in entry['series']:
+                    series = totals[name].setdefault(tuple(key), [0] * len(values))
+                    for i, value in enumerate(values):
+                        series[i] += value
+        return totals
+
+    def render(self, directory=None):
+        """All histograms in the Prometheus text exposition format"""
+        totals = self.collect(directory)
+        lines = []
+        for name, histogram in self.histograms.items():
+            lines.append(f"# HELP {name} {histogram.help}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, values in sorted(totals[name].items()):
+                labels = [f'{label}="{escape(value)}"' for label, value in zip(histogram.labels, key)]
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ['+Inf'], values[:-1]):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else repr(float(bound))
+                    bucket_labels = ','.join(labels + [f'le="{le}"'])
+                    lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+                joined = '{' + ','.join(labels) + '}' if labels else ''
+                lines.append(f"{name}_sum{joined} {values[-1]}")
+                lines.append(f"{name}_count{joined} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _readable(directory):
+        try:
+            check_owned(directory)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"Not reading metrics from {directory}: {e}")
+            return False
+        return True
+
+    def retire_exited(self, directory):
+        """Add the files of exited workers into RETIRED_FILE and remove them.
+
+        Runs under a lock on the directory, so two workers scraped at once don't
+        both add the same file.
+        """
+        exited = [name for name in os.listdir(directory) if exited_worker(name)]
+        if not exited:
+            return
+        try:
+            with open(os.path.join(directory, ".lock"), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                retired_path = os.path.join(directory, RETIRED_FILE)
+                retired = read_snapshot(retired_path) or {}
+                for file_name in exited:
+                    path = os.path.join(directory, file_name)
+                    data = read_snapshot(path)
+                    if data is not None:
+                        add_snapshot(retired, data)
+                with open(retired_path + '.tmp', 'w') as f:
+                    json.dump(retired, f)
+                os.replace(retired_path + '.tmp', retired_path)
+                for file_name in exited:
+                    try:
+                        os.remove(os.path.join(directory, file_name))
+                    except FileNotFoundError:
+                        pass
+        except OSError as e:
+            print(f"Can't retire metrics files in {directory}: {e}")
+
+
+def exited_worker(file_name):
+    """Whether file_name is a worker's "<pid>-<start>.json" and that process is gone"""
+    pid, _, rest = file_name.partition('-')
+    if not (pid.isdigit() and rest.endswith('.json')):
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def read_snapshot(path):
+    """A snapshot written by MetricsRegistry.write, or None if it's gone or unreadable"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def add_snapshot(total, data):
+    """Add snapshot data into total; a histogram whose buckets changed restarts from data"""
+    for name, entry in data.items():
+        current = total.get(name)
+        if current is None or current['buckets'] != entry['buckets']:
+            total[name] = {'buckets': entry['buckets'], 'series': [list(item) for item in entry['series']]}
+            continue
+        series = {tuple(key): values for key, values in current['series']}
+        for key, values in entry['series']:
+            summed = series.setdefault(tuple(key), [0] * len(values))
+            for i, value in enumerate(values):
+                summed[i] += value
+        current['series'] = [[list(key), values] for key, values in series.items()]
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
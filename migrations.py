@@ -0,0 +1,205 @@
+"""Versioned schema changes on top of create_tables() and the snapshot schema.
+
+table_upload.py applies every migration to each new generation of tables before it
+is swapped in, and records the versions in Schema_migrations. A database whose live
+tables predate a migration is brought up to date in place:
+
+    python migrations.py            # apply the pending migrations to the live MariaDB tables
+    python migrations.py --status   # list applied and pending versions
+    python migrations.py --check    # EXPLAIN the search queries, exit 1 if one scans a whole table
+
+--check runs against the backend app.py is configured for (DB_BACKEND, SNAPSHOT_PATH).
+Every statement can run twice without harm, so a migration interrupted halfway is
+simply applied again.
+"""
+
+import argparse
+import sys
+
+# Searched names compare case-insensitively through the column collation rather than
+# LOWER() in the query, which would keep the index on them from being used
+CASE_INSENSITIVE = "CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci"
+
+# Version, name, MariaDB statements, SQLite snapshot statements; {suffix} is the generation
+MIGRATIONS = [
+    (1, "case-insensitive collation on searched names", [
+        f"ALTER TABLE Enhancers{{suffix}} MODIFY name VARCHAR(30) {CASE_INSENSITIVE}",
+        f"ALTER TABLE Genes{{suffix}} MODIFY geneid VARCHAR(20) {CASE_INSENSITIVE}, "
+        f"MODIFY symbol VARCHAR(50) {CASE_INSENSITIVE}",
+        f"ALTER TABLE Activity_class_info{{suffix}} MODIFY enhancer_name VARCHAR(30) {CASE_INSENSITIVE}, "
+        f"MODIFY geneid VARCHAR(30) {CASE_INSENSITIVE}, MODIFY gene_symbol VARCHAR(30) {CASE_INSENSITIVE}",
+    ], [
+        # The snapshot schema declares these columns COLLATE NOCASE already
+    ]),
+    (2, "covering indexes for the search filters", [
+        "CREATE INDEX IF NOT EXISTS idx_genes_symbol ON Genes{suffix} (symbol)",
+        "CREATE INDEX IF NOT EXISTS idx_associations_gene ON Associations{suffix} (gid, exp_condition, activity)",
+        "CREATE INDEX IF NOT EXISTS idx_ac_class ON Activity_class_info{suffix} "
+        "(activity_class, enhancer_name, geneid, accessibility)",
+        "CREATE INDEX IF NOT EXISTS idx_ac_accessibility ON Activity_class_info{suffix} "
+        "(accessibility, enhancer_name, geneid)",
+        "CREATE INDEX IF NOT EXISTS idx_ac_enhancer_name ON Activity_class_info{suffix} (enhancer_name, geneid)",
+    ], [
+        "CREATE INDEX IF NOT EXISTS idx_genes_symbol ON Genes (symbol)",
+        "CREATE INDEX IF NOT EXISTS idx_associations_gene ON Associations (gid, exp_condition, activity)",
+        # Superseded by idx_associations_gene, which starts with gid
+        "DROP INDEX IF EXISTS associations_gid",
+        "CREATE INDEX IF NOT EXISTS idx_ac_class ON Activity_class_info "
+        "(activity_class, enhancer_name, geneid, accessibility)",
+        "CREATE INDEX IF NOT EXISTS idx_ac_accessibility ON Activity_class_info "
+        "(accessibility, enhancer_name, geneid)",
+        "CREATE INDEX IF NOT EXISTS idx_ac_enhancer_name ON Activity_class_info (enhancer_name, geneid)",
+    ]),
+]
+
+
+def create_migrations_table(cur, snapshot=False):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS Schema_migrations (
+            version INTEGER NOT NULL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ){"" if snapshot else " ENGINE=InnoDB"}
+    """)
+
+
+def run_migration(cur, migration, snapshot=False, suffix=""):
+    version, name, statements, snapshot_statements = migration
+    for statement in snapshot_statements if snapshot else statements:
+        cur.execute(statement.format(suffix=suffix))
+
+
+def migrate_tables(cur, snapshot=False, suffix=""):
+    """Apply every migration to a freshly created generation of tables"""
+    for migration in MIGRATIONS:
+        run_migration(cur, migration, snapshot, suffix)
+
+
+def record_migrations(cur, snapshot=False, versions=None):
+    """Mark versions (default: all) as applied to the live tables"""
+    create_migrations_table(cur, snapshot)
+    insert = "INSERT OR IGNORE" if snapshot else "INSERT IGNORE"
+    for version, name, *_ in MIGRATIONS:
+        if versions is None or version in versions:
+            cur.execute(f"{insert} INTO Schema_migrations (version, name) VALUES (?, ?)", (version, name))
+
+
+def applied_versions(cur, snapshot=False):
+    create_migrations_table(cur, snapshot)
+    cur.execute("SELECT version FROM Schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def apply_pending(cur, snapshot=False):
+    """Apply the migrations the live tables don't have yet, in order; returns their versions"""
+    done = applied_versions(cur, snapshot)
+    applied = []
+    for migration in MIGRATIONS:
+        version, name = migration[:2]
+        if version in done:
+            continue
+        print(f"Applying migration {version}: {name}...")
+        run_migration(cur, migration, snapshot)
+        record_migrations(cur, snapshot, versions={version})
+        applied.append(version)
+    return applied
+
+
+def forget_migrations(cur):
+    """Clear Schema_migrations, e.g. after a rollback swapped in tables of unknown version"""
+    create_migrations_table(cur)
+    cur.execute("DELETE FROM Schema_migrations")
+
+
+# Plan checks: (description, query builder in app.py, its arguments, ORDER BY constant)
+PLAN_CHECKS = [
+    ("Tab 1 by enhancer name", "region_query", dict(enhancer_name="{enhancer}"), "REGION_ORDER"),
+    ("Tab 1 by enhancer name and condition", "region_query",
+     dict(enhancer_name="{enhancer}", exp_condition="IMD"), "REGION_ORDER"),
+    ("Tab 2 by symbol", "symbol_query", dict(symbol="{symbol}", activity_score=0), "GENE_ORDER"),
+    ("Tab 2 by gene id and condition", "symbol_query",
+     dict(geneid="{geneid}", activity_score=0, exp_condition="Control"), "GENE_ORDER"),
+    ("Tab 3 by enhancer name", "activity_class_query", dict(enhancer_name="{enhancer}"), "ACTIVITY_CLASS_ORDER"),
+    ("Tab 3 by region", "activity_class_query",
+     dict(chr="{chromosome}", start="{start}", end="{end}"), "ACTIVITY_CLASS_ORDER"),
+    ("Tab 3 by activity class", "activity_class_query",
+     dict(activity_class="Constitutive"), "ACTIVITY_CLASS_ORDER"),
+    ("Tab 3 by activity class and accessibility", "activity_class_query",
+     dict(activity_class="Constitutive", accessibility="Always open"), "ACTIVITY_CLASS_ORDER"),
+    ("Tab 3 by accessibility", "activity_class_query",
+     dict(accessibility="Always open"), "ACTIVITY_CLASS_ORDER"),
+]
+
+
+def sample_values(cursor):
+    """Values to plan the checks with; the enhancer name is made up, as real ones parse as regions"""
+    cursor.execute("SELECT symbol, geneid FROM Genes WHERE symbol IS NOT NULL ORDER BY gid LIMIT 1")
+    symbol, geneid = cursor.fetchone() or ("", "")
+    cursor.execute("SELECT chromosome, start, end FROM Activity_class_info ORDER BY ac_eid LIMIT 1")
+    chromosome, start, end = cursor.fetchone() or ("2L", 0, 0)
+    return dict(enhancer="plan_check_enhancer", symbol=symbol, geneid=geneid,
+                chromosome=chromosome, start=start, end=end)
+
+
+def plan_scans(app, cursor, check, values):
+    """Tables a PLAN_CHECKS entry's query reads from end to end, filled in with sample_values()"""
+    from slow_queries import explain, full_scans
+
+    description, builder, arguments, order = check
+    kwargs = {key: value.format(**values) if isinstance(value, str) else value
+              for key, value in arguments.items()}
+    query, params = getattr(app, builder)(**kwargs)
+    return full_scans(explain(cursor, query + getattr(app, order), params, snapshot=app.DB_BACKEND == "sqlite"))
+
+
+def check_plans():
+    """EXPLAIN every PLAN_CHECKS query on app.py's backend; returns the checks that scan a whole table"""
+    import app
+
+    failures = []
+    with app.db_connection() as conn:
+        cursor = conn.cursor()
+        values = sample_values(cursor)
+        for check in PLAN_CHECKS:
+            description = check[0]
+            scans = plan_scans(app, cursor, check, values)
+            print(f"{'FULL SCAN of ' + ', '.join(scans) if scans else 'indexed':<24} {description}")
+            if scans:
+                failures.append(description)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply or check the STARR query schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check", action="store_true",
+                        help="EXPLAIN the search queries and exit 1 if any reads a whole table")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = check_plans()
+        if failures:
+            print(f"\n{len(failures)} of {len(PLAN_CHECKS)} search queries scan a whole table")
+            sys.exit(1)
+        return
+
+    from table_upload import connect_db
+
+    conn = connect_db()
+    cur = conn.cursor()
+    try:
+        if args.status:
+            done = applied_versions(cur)
+            for version, name, *_ in MIGRATIONS:
+                print(f"{version:>3} {'applied' if version in done else 'pending':<8} {name}")
+            return
+        applied = apply_pending(cur)
+        conn.commit()
+        print(f"Applied migrations {', '.join(map(str, applied))}." if applied else "Schema is up to date.")
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
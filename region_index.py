@@ -0,0 +1,92 @@
+"""In-memory overlap index over enhancer coordinates.
+
+Each chromosome keeps its enhancers sorted by start together with a running
+maximum of their ends. An overlap query bisects the start array for the last
+enhancer that starts before the query ends, bisects the running max-end array
+for the first enhancer that could still reach the query start, and scans only
+the slice in between.
+"""
+
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+
+class EnhancerIndex:
+    """Answers "which enhancers overlap chr:start-end" without touching the database"""
+
+    def __init__(self, rows):
+        """rows: iterable of (eid, chromosome, start, end); rows missing coordinates are ignored"""
+        by_chromosome = {}
+        for eid, chromosome, start, end in rows:
+            if chromosome is None or start is None or end is None:
+                continue
+            by_chromosome.setdefault(str(chromosome).strip().upper(), []).append((start, end, eid))
+
+        self._chromosomes = {}
+        self._size = 0
+        for chromosome, intervals in by_chromosome.items():
+            intervals.sort()
+            starts = [start for start, _, _ in intervals]
+            ends = [end for _, end, _ in intervals]
+            eids = [eid for _, _, eid in intervals]
+            max_ends = list(accumulate(ends, max))
+            self._chromosomes[chromosome] = (starts, ends, max_ends, eids)
+            self._size += len(intervals)
+
+    def __len__(self):
+        return self._size
+
+    def chromosomes(self):
+        return sorted(self._chromosomes)
+
+    def overlapping(self, chromosome, start, end):
+        """Return eids of enhancers with start <= end and end >= start, ordered by enhancer start.
+
+        Runs in O(log n + k) for enhancers of similar length; the scanned slice can only
+        grow past the k hits by enhancers shorter than the longest one ending before start.
+        """
+        return [eid for _, eid in self.overlapping_starts(chromosome, start, end)]
+
+    def overlapping_starts(self, chromosome, start, end):
+        """Like overlapping, as (enhancer start, eid) pairs"""
+        data = self._chromosomes.get(str(chromosome).strip().upper())
+        if data is None or start > end:
+            return []
+
+        starts, ends, max_ends, eids = data
+        hi = bisect_right(starts, end)
+        lo = bisect_left(max_ends, start, 0, hi)
+        return [(starts[i], eids[i]) for i in range(lo, hi) if ends[i] >= start]
+
+    def overlapping_many(self, regions):
+        """Resolve many (chromosome, start, end) regions with one sort-and-sweep pass per chromosome.
+
+        Returns a list of eid lists aligned with regions. Regions and enhancers are both
+        walked in start order, keeping only the enhancers that can still reach the
+        current region, so the cost is O((n + m) log m + k) rather than m separate lookups.
+        """
+        results = [[] for _ in regions]
+        by_chromosome = {}
+        for i, (chromosome, start, end) in enumerate(regions):
+            if chromosome is not None and start is not None and end is not None and start <= end:
+                by_chromosome.setdefault(str(chromosome).strip().upper(), []).append((start, end, i))
+
+        for chromosome, queries in by_chromosome.items():
+            data = self._chromosomes.get(chromosome)
+            if data is None:
+                continue
+            starts, ends, _, eids = data
+            queries.sort()
+
+            active = []
+            next_enhancer = 0
+            for start, end, i in queries:
+                # Admit every enhancer that starts before this region ends
+                while next_enhancer < len(starts) and starts[next_enhancer] <= end:
+                    active.append(next_enhancer)
+                    next_enhancer += 1
+                # Regions arrive in start order, so an enhancer ending before this one starts is done for good
+                active = [j for j in active if ends[j] >= start]
+                results[i] = [eids[j] for j in active if starts[j] <= end]
+
+        return results
@@ -0,0 +1,188 @@
+"""Query-result cache shared by every worker process on the host.
+
+Entries live in one SQLite file in WAL mode, so the mod_wsgi daemon processes read
+each other's results. Every entry is stamped with the dataset version it was computed
+for: a lookup under another version misses, and storing under a new version clears
+the old ones. Values are pickled; once they add up to more than max_bytes, the least
+recently used entries are evicted.
+
+Unpickling runs code, so the file has to live in a directory only the app's user can
+reach: the cache creates it with mode 0700 and stays off (every lookup a miss) when the
+directory or the file belongs to someone else or others can write to it. A hit doesn't
+write to the file; each process notes when it used an entry and saves those times in
+one batch every TOUCH_INTERVAL seconds, when it stores a result or evicts.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+MISS = object()
+
+# Seconds between a process's batched writes of last_used
+TOUCH_INTERVAL = 10
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        version TEXT NOT NULL,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+
+def ensure_private_dir(directory):
+    """Create directory with mode 0700; raise PermissionError unless only this user can write to it"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    check_owned(directory)
+
+
+def check_owned(path):
+    """Raise PermissionError if path belongs to another user or others can write to it"""
+    st = os.lstat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise PermissionError(f"{path} must belong to uid {os.getuid()} and not be writable by others")
+
+
+class ResultCache:
+    """get/put for pickled values under (key, dataset version); errors count as misses"""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._counts = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'errors': 0}
+        self._counts_lock = threading.Lock()
+        # key -> time of this process's last hit not yet saved to last_used
+        self._touched = {}
+        self._touched_at = time.monotonic()
+
+    def _count(self, name, n=1):
+        with self._counts_lock:
+            self._counts[name] += n
+
+    def _connection(self):
+        """This thread's connection, opened again after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            ensure_private_dir(os.path.dirname(os.path.abspath(self.path)))
+            if os.path.lexists(self.path):
+                check_owned(self.path)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key, version):
+        """The value stored for key under version, or MISS"""
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT value FROM entries WHERE key = ? AND version = ?",
+                               (key, str(version))).fetchone()
+            if row is None:
+                self._count('misses')
+                return MISS
+            value = pickle.loads(row[0])
+            self._touch(conn, key)
+        except (OSError, sqlite3.Error, pickle.UnpicklingError, AttributeError, EOFError) as e:
+            print(f"Result cache read failed: {e}")
+            self._count('errors')
+            return MISS
+        self._count('hits')
+        return value
+
+    def put(self, key, version, value):
+        """Store value for key under version, then evict least recently used entries over the size limit"""
+        try:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            print(f"Result cache can't store {key}: {e}")
+            self._count('errors')
+            return
+        if len(blob) > self.max_bytes:
+            return
+
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._save_touches(conn, self._take_touches())
+                conn.execute("DELETE FROM entries WHERE version != ?", (str(version),))
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, version, value, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, str(version), blob, len(blob), time.time())
+                )
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except (OSError, sqlite3.Error) as e:
+            print(f"Result cache write failed: {e}")
+            self._count('errors')
+            return
+        self._count('stores')
+
+    def _touch(self, conn, key):
+        """Note a hit on key; every TOUCH_INTERVAL seconds save the noted times in one transaction"""
+        now = time.monotonic()
+        with self._counts_lock:
+            self._touched[key] = time.time()
+            if now - self._touched_at < TOUCH_INTERVAL:
+                return
+        touched = self._take_touches()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._save_touches(conn, touched)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            # Only the eviction order suffers; the hit itself stands
+            print(f"Result cache couldn't save last_used: {e}")
+
+    def _take_touches(self):
+        with self._counts_lock:
+            touched, self._touched = self._touched, {}
+            self._touched_at = time.monotonic()
+        return touched
+
+    @staticmethod
+    def _save_touches(conn, touched):
+        conn.executemany("UPDATE entries SET last_used = MAX(last_used, ?) WHERE key = ?",
+                         [(used, key) for key, used in touched.items()])
+
+    def _evict(self, conn):
+        excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self._count('evictions', len(victims))
+
+    def stats(self):
+        """This process's hit/miss counters and the shared store's size"""
+        with self._counts_lock:
+            stats = dict(self._counts)
+        try:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            stats.update(entries=entries, bytes=size, max_bytes=self.max_bytes)
+        except (OSError, sqlite3.Error) as e:
+            stats['error'] = str(e)
+        return stats
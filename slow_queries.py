@@ -0,0 +1,180 @@
+"""Opt-in slow-query log with query plans, and a report grouped by query shape.
+
+app.py hands every statement slower than SLOW_QUERY_MS to SlowQueryLog. Each record
+(one JSON line, appended by every worker to the same file) holds the statement, its
+parameters, timing, row count and the endpoint that ran it. The first slow run of a
+shape in each SLOW_QUERY_EXPLAIN_EVERY seconds also carries its plan: MariaDB's
+EXPLAIN FORMAT=JSON (ANALYZE FORMAT=JSON with SLOW_QUERY_ANALYZE=1, which runs the
+statement again) or SQLite's EXPLAIN QUERY PLAN.
+
+The shape is the statement with whitespace collapsed, IN lists folded and numbers
+replaced, so each combination of optional filters is its own shape:
+
+    python slow_queries.py [--log PATH] [--top 20] [--json]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import statistics
+import tempfile
+import threading
+import time
+
+DEFAULT_LOG = os.path.join(tempfile.gettempdir(), "starr_query_slow.jsonl")
+
+IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+WHITESPACE = re.compile(r"\s+")
+
+
+def query_shape(query):
+    """The statement with its variable parts folded, and a short id for it"""
+    shape = WHITESPACE.sub(" ", query).strip()
+    shape = IN_LIST.sub("(%s, ...)", shape)
+    shape = NUMBER.sub("N", shape)
+    return shape, hashlib.sha1(shape.encode("utf-8")).hexdigest()[:10]
+
+
+def explain(cursor, query, params, snapshot=False, analyze=False):
+    """The plan of query as JSON-friendly data, run on cursor"""
+    if snapshot:
+        cursor.execute("EXPLAIN QUERY PLAN " + query, params)
+        return [row[-1] for row in cursor.fetchall()]
+    cursor.execute(("ANALYZE" if analyze else "EXPLAIN") + " FORMAT=JSON " + query, params)
+    return json.loads(cursor.fetchone()[0])
+
+
+def full_scans(plan):
+    """Tables the plan reads from end to end, as a table scan or a scan of a whole index"""
+    if isinstance(plan, list) and all(isinstance(step, str) for step in plan):
+        # SQLite: "SCAN e [USING ... INDEX]" reads everything, "SEARCH e USING INDEX" seeks
+        return sorted({step.split()[1] for step in plan
+                       if step.startswith("SCAN ") and len(step.split()) > 1 and step.split()[1] != "CONSTANT"})
+
+    tables = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get("access_type") in ("ALL", "index") and "table_name" in node:
+                tables.add(node["table_name"])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return sorted(tables)
+
+
+class SlowQueryLog:
+    """Appends slow statements to a JSON-lines file; plans are captured once per shape per interval"""
+
+    def __init__(self, path, threshold_ms, explain_every=300, analyze=False):
+        self.path = path
+        self.threshold = threshold_ms / 1000
+        self.explain_every = explain_every
+        self.analyze = analyze
+        self._explained = {}
+        self._lock = threading.Lock()
+
+    def is_slow(self, seconds):
+        return seconds >= self.threshold
+
+    def wants_plan(self, query):
+        """True for the first slow run of this shape in explain_every seconds"""
+        _, shape_id = query_shape(query)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(shape_id, -self.explain_every) < self.explain_every:
+                return False
+            self._explained[shape_id] = now
+            return True
+
+    def record(self, query, params, seconds, rows, endpoint, plan=None):
+        shape, shape_id = query_shape(query)
+        entry = {
+            "time": time.time(), "shape_id": shape_id, "shape": shape, "query": query,
+            "params": list(params or ()), "ms": round(seconds * 1000, 3), "rows": rows,
+            "endpoint": endpoint, "plan": plan,
+        }
+        line = json.dumps(entry, default=str) + "\n"
+        try:
+            # One write per line in append mode, so workers don't interleave records
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError as e:
+            print(f"Can't write slow query log {self.path}: {e}")
+
+
+def read_log(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def report(entries):
+    """Slow statements grouped by shape, most total time first"""
+    shapes = {}
+    for entry in entries:
+        group = shapes.setdefault(entry["shape_id"], {
+            "shape_id": entry["shape_id"], "shape": entry["shape"], "times": [], "rows": 0,
+            "endpoints": set(), "example_params": entry["params"], "plan": None,
+        })
+        group["times"].append(entry["ms"])
+        group["rows"] += entry["rows"] or 0
+        group["endpoints"].add(entry["endpoint"])
+        if entry.get("plan") is not None:
+            group["plan"] = entry["plan"]
+            group["example_params"] = entry["params"]
+
+    rows = []
+    for group in shapes.values():
+        times = sorted(group.pop("times"))
+        group.update(
+            count=len(times), total_ms=round(sum(times), 3), mean_ms=round(statistics.fmean(times), 3),
+            max_ms=max(times), endpoints=sorted(group["endpoints"]),
+            full_scans=full_scans(group["plan"]) if group["plan"] is not None else None,
+        )
+        rows.append(group)
+    rows.sort(key=lambda group: group["total_ms"], reverse=True)
+    return rows
+
+
+def print_report(rows):
+    for group in rows:
+        scans = group["full_scans"]
+        scan_note = "plan not captured" if scans is None else (
+            f"FULL SCAN of {', '.join(scans)}" if scans else "indexed")
+        print(f"[{group['shape_id']}] {group['count']} slow runs, {group['total_ms']:.1f} ms total, "
+              f"mean {group['mean_ms']:.1f} ms, max {group['max_ms']:.1f} ms - {scan_note}")
+        print(f"  endpoints: {', '.join(str(e) for e in group['endpoints'])}")
+        print(f"  params:    {group['example_params']}")
+        print(f"  {group['shape']}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group the slow query log by query shape")
+    parser.add_argument("--log", default=os.getenv("SLOW_QUERY_LOG", DEFAULT_LOG))
+    parser.add_argument("--top", type=int, default=20, help="shapes to show, by total time (default 20)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print(f"No slow query log at {args.log}")
+        return
+    rows = report(read_log(args.log))[:args.top]
+    if args.json:
+        print(json.dumps(rows, indent=2, default=str))
+    else:
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
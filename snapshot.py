@@ -0,0 +1,97 @@
+"""Read-only SQLite snapshot backend.
+
+`table_upload.py --snapshot PATH` writes the same tables as the MariaDB load into one
+SQLite file. connect() opens that file behind the small part of the mariadb connector
+API app.py relies on (%s placeholders, dictionary and unbuffered cursors, ping/close),
+so every tab can be served from the snapshot by setting DB_BACKEND=sqlite. SQLite
+errors, whether raised by execute or while stepping through the rows, surface as the
+connector's error class, so app.py's `except mariadb.Error` handlers catch them.
+"""
+
+import sqlite3
+from contextlib import contextmanager
+from urllib.parse import quote
+
+
+class SnapshotCursor:
+    """Cursor over a snapshot connection that accepts mariadb-style queries"""
+
+    def __init__(self, cursor, dictionary, error):
+        self._cursor = cursor
+        self._dictionary = dictionary
+        self._error = error
+        self._columns = None
+
+    @contextmanager
+    def _converted(self):
+        try:
+            yield
+        except sqlite3.Error as e:
+            raise self._error(str(e)) from e
+
+    def execute(self, query, params=()):
+        with self._converted():
+            self._cursor.execute(query.replace('%s', '?'), tuple(params))
+        description = self._cursor.description
+        self._columns = [column[0] for column in description] if description else None
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self._columns, row))
+
+    def fetchone(self):
+        with self._converted():
+            return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        with self._converted():
+            rows = self._cursor.fetchmany(self._cursor.arraysize if size is None else size)
+        return [self._row(row) for row in rows]
+
+    def fetchall(self):
+        with self._converted():
+            rows = self._cursor.fetchall()
+        return [self._row(row) for row in rows]
+
+    def __iter__(self):
+        with self._converted():
+            for row in self._cursor:
+                yield self._row(row)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        with self._converted():
+            self._cursor.close()
+
+
+class SnapshotConnection:
+    def __init__(self, conn, error):
+        self._conn = conn
+        self._error = error
+
+    def cursor(self, dictionary=False, buffered=True):
+        # SQLite steps through results lazily either way, so buffered has no effect
+        return SnapshotCursor(self._conn.cursor(), dictionary, self._error)
+
+    def ping(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+def connect(path, error=sqlite3.Error):
+    """Open the snapshot at path read-only; database errors are re-raised as `error`"""
+    try:
+        conn = sqlite3.connect(f"file:{quote(str(path))}?mode=ro", uri=True, check_same_thread=False)
+    except sqlite3.Error as e:
+        raise error(f"Cannot open snapshot {path}: {e}") from e
+    return SnapshotConnection(conn, error)
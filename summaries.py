@@ -0,0 +1,182 @@
+"""Precomputed chart summaries per genome bin.
+
+table_upload.py fills these tables with every load. app.py then answers the Tab 1 and
+Tab 3 charts of a region search by adding up the bins the region covers completely,
+and only aggregates the enhancers in the partly covered bins at either end live.
+Enhancers are binned by start coordinate.
+
+Density_tiles holds genome-wide enhancer and association counts at several bin sizes,
+per condition and activity class, for the zoomable overview served by /api/tiles.
+"""
+
+BIN_SIZE = 100_000
+
+# Density tile bin sizes, finest first; each is a multiple of the one before
+TILE_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+# Histogram bucket widths, matching the charts
+LENGTH_BUCKET = 100
+SCORE_BUCKET = 50
+
+SUMMARY_TABLES = ["Region_bin_conditions", "Region_bin_lengths", "Activity_class_bins", "Density_tiles"]
+
+# Portable between MariaDB and the SQLite snapshot
+SUMMARY_SCHEMA = [
+    """
+    CREATE TABLE Region_bin_conditions{suffix} (
+        chromosome VARCHAR(2) NOT NULL,
+        bin_start INTEGER NOT NULL,
+        exp_condition VARCHAR(10),
+        enhancers INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX region_bin_conditions{suffix}_bin ON Region_bin_conditions{suffix} (chromosome, bin_start)",
+    """
+    CREATE TABLE Region_bin_lengths{suffix} (
+        chromosome VARCHAR(2) NOT NULL,
+        bin_start INTEGER NOT NULL,
+        length_bucket INTEGER,
+        enhancers INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX region_bin_lengths{suffix}_bin ON Region_bin_lengths{suffix} (chromosome, bin_start)",
+    """
+    CREATE TABLE Activity_class_bins{suffix} (
+        chromosome VARCHAR(2),
+        bin_start INTEGER,
+        activity_class VARCHAR(30),
+        accessibility VARCHAR(30),
+        max_end INTEGER,
+        n INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX activity_class_bins{suffix}_bin ON Activity_class_bins{suffix} (chromosome, bin_start)",
+    """
+    CREATE TABLE Density_tiles{suffix} (
+        chromosome VARCHAR(2) NOT NULL,
+        bin_size INTEGER NOT NULL,
+        bin_start INTEGER NOT NULL,
+        exp_condition VARCHAR(10),
+        activity_class VARCHAR(30),
+        enhancers INTEGER NOT NULL,
+        associations INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX density_tiles{suffix}_bin ON Density_tiles{suffix} (bin_size, chromosome, bin_start)",
+]
+
+
+def bucket_sql(column, size, snapshot=False):
+    """SQL rounding an integer column down to a multiple of size"""
+    if snapshot:
+        return f"(CAST({column} / {size} AS INTEGER) * {size})"
+    return f"({column} DIV {size} * {size})"
+
+
+def create_summary_tables(cur, suffix=""):
+    for statement in SUMMARY_SCHEMA:
+        cur.execute(statement.format(suffix=suffix))
+
+
+def build_summaries(cur, snapshot=False, suffix=""):
+    """Refill the summary tables from Enhancers, Associations and Activity_class_info.
+
+    The Tab 1 summaries count what the default search shows (associations with
+    activity >= 0) for enhancers with full coordinates, as the region index does.
+    Tab 3 bins keep their largest end so a region can tell which bins it fully contains.
+    """
+    enhancer_bin = bucket_sql("e.start", BIN_SIZE, snapshot)
+    located = "e.chromosome IS NOT NULL AND e.start IS NOT NULL AND e.end IS NOT NULL"
+
+    for table in SUMMARY_TABLES:
+        cur.execute(f"DELETE FROM {table}{suffix}")
+
+    cur.execute(f"""
+        INSERT INTO Region_bin_conditions{suffix} (chromosome, bin_start, exp_condition, enhancers)
+        SELECT UPPER(TRIM(e.chromosome)), {enhancer_bin}, a.exp_condition, COUNT(DISTINCT e.name)
+        FROM Enhancers{suffix} e
+        JOIN Associations{suffix} a ON e.eid = a.eid
+        JOIN Genes{suffix} g ON a.gid = g.gid
+        WHERE a.activity >= 0 AND {located}
+        GROUP BY UPPER(TRIM(e.chromosome)), {enhancer_bin}, a.exp_condition
+    """)
+
+    cur.execute(f"""
+        INSERT INTO Region_bin_lengths{suffix} (chromosome, bin_start, length_bucket, enhancers)
+        SELECT chromosome, bin_start, {bucket_sql("en_length", LENGTH_BUCKET, snapshot)}, COUNT(*)
+        FROM (
+            SELECT MIN(UPPER(TRIM(e.chromosome))) AS chromosome, MIN({enhancer_bin}) AS bin_start,
+                   MIN(e.en_length) AS en_length
+            FROM Enhancers{suffix} e
+            JOIN Associations{suffix} a ON e.eid = a.eid
+            JOIN Genes{suffix} g ON a.gid = g.gid
+            WHERE a.activity >= 0 AND {located}
+            GROUP BY e.name
+        ) per_enhancer
+        GROUP BY chromosome, bin_start, {bucket_sql("en_length", LENGTH_BUCKET, snapshot)}
+    """)
+
+    ac_bin = bucket_sql("start", BIN_SIZE, snapshot)
+    cur.execute(f"""
+        INSERT INTO Activity_class_bins{suffix} (chromosome, bin_start, activity_class, accessibility, max_end, n)
+        SELECT chromosome, {ac_bin}, activity_class, accessibility, MAX(end), COUNT(*)
+        FROM Activity_class_info{suffix}
+        GROUP BY chromosome, {ac_bin}, activity_class, accessibility
+    """)
+
+    build_density_tiles(cur, snapshot, suffix)
+    print("Rebuilt chart summary tables")
+
+
+def build_density_tiles(cur, snapshot=False, suffix=""):
+    """Fill Density_tiles: the finest bins from the base tables, each coarser size from those.
+
+    enhancers counts Enhancers rows, i.e. an enhancer once per condition it was
+    measured in, and associations all of their gene links. An enhancer's activity
+    class comes from Activity_class_info; enhancers not listed there have none.
+    """
+    finest = TILE_SIZES[0]
+    tile_bin = bucket_sql("e.start", finest, snapshot)
+    cur.execute(f"""
+        INSERT INTO Density_tiles{suffix}
+            (chromosome, bin_size, bin_start, exp_condition, activity_class, enhancers, associations)
+        SELECT UPPER(TRIM(e.chromosome)), {finest}, {tile_bin}, e.exp_condition, ac.activity_class,
+               COUNT(DISTINCT e.eid), COUNT(a.eid)
+        FROM Enhancers{suffix} e
+        LEFT JOIN Associations{suffix} a ON a.eid = e.eid
+        LEFT JOIN (
+            SELECT enhancer_name, MIN(activity_class) AS activity_class
+            FROM Activity_class_info{suffix}
+            GROUP BY enhancer_name
+        ) ac ON ac.enhancer_name = e.name
+        WHERE e.chromosome IS NOT NULL AND e.start IS NOT NULL
+        GROUP BY UPPER(TRIM(e.chromosome)), {tile_bin}, e.exp_condition, ac.activity_class
+    """)
+
+    for size in TILE_SIZES[1:]:
+        cur.execute(f"""
+            INSERT INTO Density_tiles{suffix}
+                (chromosome, bin_size, bin_start, exp_condition, activity_class, enhancers, associations)
+            SELECT chromosome, {size}, {bucket_sql("bin_start", size, snapshot)}, exp_condition, activity_class,
+                   SUM(enhancers), SUM(associations)
+            FROM Density_tiles{suffix}
+            WHERE bin_size = {finest}
+            GROUP BY chromosome, {bucket_sql("bin_start", size, snapshot)}, exp_condition, activity_class
+        """)
+
+
+def covered_bins(start, end):
+    """First and last bin_start of the bins lying wholly inside start..end, or None"""
+    first = -(-start // BIN_SIZE) * BIN_SIZE
+    last = (end + 1) // BIN_SIZE * BIN_SIZE - BIN_SIZE
+    if last < first:
+        return None
+    return first, last
+
+
+def tile_size(start, end, bins):
+    """The finest tile size that shows start..end in at most bins bins, else the coarsest"""
+    for size in TILE_SIZES:
+        if end // size - start // size + 1 <= bins:
+            return size
+    return TILE_SIZES[-1]
@@ -1,14 +1,27 @@
+import argparse
 import csv
+import hashlib
 import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
 
 import mariadb
 from dotenv import load_dotenv
 
+from migrations import apply_pending, forget_migrations, migrate_tables, record_migrations
+from summaries import SUMMARY_TABLES, build_summaries, create_summary_tables
+
 load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent
-DATA_DIR = BASE_DIR / "processed_data"
+# DATA_DIR points the loader at another set of the four CSVs, e.g. a generated benchmark dataset
+DATA_DIR = Path(os.getenv("DATA_DIR", str(BASE_DIR / "processed_data")))
 
 ENHANCER_CSV = DATA_DIR / "enhancer.csv"
 GENES_CSV = DATA_DIR / "genes.csv"
@@ -41,6 +54,18 @@ def to_float(value):
     return float(value)
 
 
+def parse_enhancer_name(name):
+    """Split a "chr:start-end" enhancer name into (chromosome, start, end), or Nones if it doesn't parse"""
+    if not name or ":" not in name:
+        return None, None, None
+    try:
+        chromosome, coords = name.strip().upper().split(":", 1)
+        start, end = coords.split("-", 1)
+        return chromosome, int(start), int(end)
+    except ValueError:
+        return None, None, None
+
+
 def connect_db():
     return mariadb.connect(
         host=os.getenv("DB_HOST"),
@@ -53,35 +78,119 @@ def connect_db():
     )
 
 
-def ensure_files_exist():
+def ensure_files_exist(require_ca=True):
     required = [
         ENHANCER_CSV,
         GENES_CSV,
         ASSOCIATIONS_CSV,
         TAB3_CSV,
-        CA_PATH,
     ]
+    if require_ca:
+        required.append(CA_PATH)
     missing = [str(p) for p in required if not p.exists()]
     if missing:
         raise FileNotFoundError("Missing required files:\n" + "\n".join(missing))
 
 
-def drop_tables(cur):
-    cur.execute("DROP TABLE IF EXISTS Activity_class_info")
-    cur.execute("DROP TABLE IF EXISTS Associations")
-    cur.execute("DROP TABLE IF EXISTS Genes")
-    cur.execute("DROP TABLE IF EXISTS Enhancers")
+TABLES = ["Enhancers", "Genes", "Associations", "Activity_class_info"]
+
+# Everything built from one load, swapped and rolled back together
+GENERATION_TABLES = TABLES + SUMMARY_TABLES
+
+# A reseed builds the *_next generation, swaps it live, and keeps the previous one as *_old
+NEXT = "_next"
+OLD = "_old"
+
+
+def drop_tables(cur, suffix=""):
+    for table in SUMMARY_TABLES:
+        cur.execute(f"DROP TABLE IF EXISTS {table}{suffix}")
+    cur.execute(f"DROP TABLE IF EXISTS Activity_class_info{suffix}")
+    cur.execute(f"DROP TABLE IF EXISTS Associations{suffix}")
+    cur.execute(f"DROP TABLE IF EXISTS Genes{suffix}")
+    cur.execute(f"DROP TABLE IF EXISTS Enhancers{suffix}")
+
+
+# Parsed chunks a reader thread may run ahead of the inserts, bounding loader memory
+READ_AHEAD_CHUNKS = 4
+
+
+def read_ahead(rows, chunk_size, depth=READ_AHEAD_CHUNKS):
+    """Yield lists of up to chunk_size rows, drawn from rows on a background thread.
+
+    Parsing the next chunks overlaps with inserting the current one, and at most
+    depth chunks wait in between. An exception raised while reading is re-raised here.
+    """
+    chunks = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce():
+        try:
+            iterator = iter(rows)
+            while not stop.is_set():
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                put(chunk)
+        except Exception as e:
+            put(e)
+        put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Unblocks the reader if the inserts stopped early
+        stop.set()
+
 
 def insert_in_batches(cur, sql, rows, label, batch_size=200):
-    total = len(rows)
-    for i in range(0, total, batch_size):
-        batch = rows[i:i + batch_size]
+    """executemany rows, an iterable, batch_size at a time; returns the number inserted"""
+    total = 0
+    for batch in read_ahead(rows, batch_size):
         cur.executemany(sql, batch)
-        print(f"{label}: inserted {min(i + batch_size, total)}/{total}")
+        total += len(batch)
+        print(f"{label}: inserted {total}")
+    return total
 
-def create_tables(cur):
-    cur.execute("""
-        CREATE TABLE Enhancers (
+
+# Bulk mode: rows per multi-row INSERT, capped by the 65535 placeholders a statement may have
+BULK_ROWS = int(os.getenv("BULK_ROWS", 5000))
+MAX_PLACEHOLDERS = 65535
+
+
+def insert_multirow(cur, sql, rows, label):
+    """Bulk-mode insert_in_batches: sends one INSERT ... VALUES (...), (...), ... per chunk of rows"""
+    head, row_values = sql.rsplit("VALUES", 1)
+    row_values = row_values.strip()
+    chunk = max(1, min(BULK_ROWS, MAX_PLACEHOLDERS // (row_values.count("?") or 1)))
+
+    total = 0
+    for batch in read_ahead(rows, chunk):
+        cur.execute(head + "VALUES " + ", ".join([row_values] * len(batch)),
+                    [value for row in batch for value in row])
+        total += len(batch)
+        print(f"{label}: inserted {total}")
+    return total
+
+def create_tables(cur, indexes=True, suffix=""):
+    cur.execute(f"""
+        CREATE TABLE Enhancers{suffix} (
             eid INTEGER NOT NULL AUTO_INCREMENT,
             name VARCHAR(30),
             chromosome VARCHAR(2),
@@ -91,13 +200,12 @@ def create_tables(cur):
             exp_condition ENUM('Control','20E','IMD'),
             tf_counts VARCHAR(250),
             tbs INTEGER,
-            PRIMARY KEY (eid),
-            INDEX location (chromosome, start, end)
+            PRIMARY KEY (eid)
         ) ENGINE=InnoDB
     """)
 
-    cur.execute("""
-        CREATE TABLE Genes (
+    cur.execute(f"""
+        CREATE TABLE Genes{suffix} (
             gid INTEGER NOT NULL AUTO_INCREMENT,
             geneid VARCHAR(20),
             chromosome ENUM('3R','3L','2R','2L','X','Y','4'),
@@ -110,13 +218,12 @@ def create_tables(cur):
             tpm_ctrl DOUBLE,
             tpm_20e DOUBLE,
             tpm_imd DOUBLE,
-            PRIMARY KEY (gid),
-            INDEX location (chromosome, start, end)
+            PRIMARY KEY (gid)
         ) ENGINE=InnoDB
     """)
 
-    cur.execute("""
-        CREATE TABLE Associations (
+    cur.execute(f"""
+        CREATE TABLE Associations{suffix} (
             eid INTEGER NOT NULL,
             gid INTEGER NOT NULL,
             imd_vs_20e DOUBLE,
@@ -126,15 +233,15 @@ def create_tables(cur):
             activity DOUBLE,
             accessibility VARCHAR(30),
             PRIMARY KEY (eid, gid, exp_condition),
-            FOREIGN KEY (eid) REFERENCES Enhancers (eid)
+            FOREIGN KEY (eid) REFERENCES Enhancers{suffix} (eid)
                 ON UPDATE CASCADE ON DELETE CASCADE,
-            FOREIGN KEY (gid) REFERENCES Genes (gid)
+            FOREIGN KEY (gid) REFERENCES Genes{suffix} (gid)
                 ON UPDATE CASCADE ON DELETE CASCADE
         ) ENGINE=InnoDB
     """)
 
-    cur.execute("""
-        CREATE TABLE Activity_class_info (
+    cur.execute(f"""
+        CREATE TABLE Activity_class_info{suffix} (
             ac_eid INTEGER NOT NULL AUTO_INCREMENT,
             enhancer_name VARCHAR(30),
             activity_class ENUM(
@@ -157,93 +264,299 @@ def create_tables(cur):
             time_cluster VARCHAR(30),
             broad_immune_role VARCHAR(30),
             gene_symbol VARCHAR(30),
+            chromosome VARCHAR(2),
+            start INTEGER,
+            end INTEGER,
             PRIMARY KEY (ac_eid)
         ) ENGINE=InnoDB
     """)
 
-    cur.execute("CREATE INDEX idx_enhancer_name ON Enhancers(name)")
-    cur.execute("CREATE INDEX idx_geneid ON Genes(geneid)")
-
-
-def load_enhancers(cur):
-    rows = []
-
-    with open(ENHANCER_CSV, newline="", encoding="utf-8") as f:
+    if indexes:
+        for table in SECONDARY_INDEXES:
+            create_indexes(cur, table, suffix)
+        migrate_tables(cur, suffix=suffix)
+
+    create_summary_tables(cur, suffix)
+
+
+# Secondary indexes per table; bulk loads add them after the rows are in
+SECONDARY_INDEXES = {
+    "Enhancers": ["location (chromosome, start, end)", "idx_enhancer_name (name)"],
+    "Genes": ["location (chromosome, start, end)", "idx_geneid (geneid)"],
+    "Activity_class_info": ["location (chromosome, start, end)"],
+}
+
+
+def create_indexes(cur, table, suffix=""):
+    """Add all of a table's secondary indexes in one ALTER, i.e. a single pass over its rows"""
+    cur.execute(f"ALTER TABLE {table}{suffix} "
+                + ", ".join(f"ADD INDEX {index}" for index in SECONDARY_INDEXES[table]))
+
+
+# SQLite version of create_tables for snapshots: ENUMs become CHECK constraints and text
+# columns compare case-insensitively, like the MariaDB default collation
+SNAPSHOT_SCHEMA = """
+    CREATE TABLE Enhancers (
+        eid INTEGER PRIMARY KEY,
+        name TEXT COLLATE NOCASE,
+        chromosome TEXT COLLATE NOCASE,
+        start INTEGER,
+        end INTEGER,
+        en_length INTEGER,
+        exp_condition TEXT CHECK (exp_condition IN ('Control', '20E', 'IMD')),
+        tf_counts TEXT,
+        tbs INTEGER
+    );
+    CREATE INDEX enhancers_location ON Enhancers (chromosome, start, end);
+    CREATE INDEX idx_enhancer_name ON Enhancers (name);
+
+    CREATE TABLE Genes (
+        gid INTEGER PRIMARY KEY,
+        geneid TEXT COLLATE NOCASE,
+        chromosome TEXT CHECK (chromosome IN ('3R', '3L', '2R', '2L', 'X', 'Y', '4')),
+        start INTEGER,
+        end INTEGER,
+        symbol TEXT COLLATE NOCASE,
+        immune_process TEXT COLLATE NOCASE,
+        time_cluster TEXT CHECK (time_cluster IN ('early_C2', 'mid_C3', 'late_C1', 'late_C4')),
+        gene_length INTEGER,
+        tpm_ctrl REAL,
+        tpm_20e REAL,
+        tpm_imd REAL
+    );
+    CREATE INDEX genes_location ON Genes (chromosome, start, end);
+    CREATE INDEX idx_geneid ON Genes (geneid);
+
+    CREATE TABLE Associations (
+        eid INTEGER NOT NULL REFERENCES Enhancers (eid) ON UPDATE CASCADE ON DELETE CASCADE,
+        gid INTEGER NOT NULL REFERENCES Genes (gid) ON UPDATE CASCADE ON DELETE CASCADE,
+        imd_vs_20e REAL,
+        `20e_vs_ctrl` REAL,
+        imd_vs_ctrl REAL,
+        exp_condition TEXT CHECK (exp_condition IN ('Control', '20E', 'IMD')),
+        activity REAL,
+        accessibility TEXT COLLATE NOCASE,
+        PRIMARY KEY (eid, gid, exp_condition)
+    );
+    CREATE INDEX associations_gid ON Associations (gid);
+
+    CREATE TABLE Activity_class_info (
+        ac_eid INTEGER PRIMARY KEY,
+        enhancer_name TEXT COLLATE NOCASE,
+        activity_class TEXT CHECK (activity_class IN (
+            'Control', '20E', 'HKSM', 'Control + 20E', 'Control + HKSM', 'HKSM + 20E', 'Constitutive'
+        )),
+        accessibility TEXT CHECK (accessibility IN (
+            'Always open', 'Always closed', 'HKSM closed', 'HKSM opened'
+        )),
+        geneid TEXT COLLATE NOCASE,
+        dist_to_enh INTEGER,
+        time_cluster TEXT COLLATE NOCASE,
+        broad_immune_role TEXT COLLATE NOCASE,
+        gene_symbol TEXT COLLATE NOCASE,
+        chromosome TEXT COLLATE NOCASE,
+        start INTEGER,
+        end INTEGER
+    );
+    CREATE INDEX activity_class_location ON Activity_class_info (chromosome, start, end);
+
+    CREATE TABLE Data_version (
+        id INTEGER NOT NULL PRIMARY KEY,
+        version INTEGER NOT NULL,
+        loaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
+# Rejected rows listed per file; the rest are only counted
+REJECT_REPORT_LIMIT = 20
+
+
+class Rejects:
+    """Rows of one input file that were dropped while reading it, with their line numbers"""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.rows = []
+
+    def add(self, line, reason):
+        self.rows.append((line, reason))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def report(self):
+        if not self.rows:
+            return
+        print(f"{self.file_name}: rejected {len(self.rows)} rows")
+        for line, reason in self.rows[:REJECT_REPORT_LIMIT]:
+            print(f"  line {line}: {reason}")
+        if len(self.rows) > REJECT_REPORT_LIMIT:
+            print(f"  ... and {len(self.rows) - REJECT_REPORT_LIMIT} more")
+
+
+def parse_csv(path, expected, parse, rejects):
+    """Yield parse(row) for each row of path, one at a time.
+
+    Rows whose parse raises ValueError (a bad number, an unknown enhancer, ...) are
+    recorded in rejects with their line number and skipped.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
 
-        expected = {
-            "Enhancer", "Chromosome", "Start", "End",
-            "Length", "Treatment", "TF_counts", "TBS"
-        }
         missing = expected - set(reader.fieldnames or [])
         if missing:
-            raise ValueError(f"enhancer.csv missing columns: {sorted(missing)}")
+            raise ValueError(f"{path.name} missing columns: {sorted(missing)}")
 
         for row in reader:
-            rows.append((
-                none_if_empty(row["Enhancer"]),
-                none_if_empty(row["Chromosome"]),
-                to_int(row["Start"]),
-                to_int(row["End"]),
-                to_int(row["Length"]),
-                none_if_empty(row["Treatment"]),
-                none_if_empty(row["TF_counts"]),
-                to_int(row["TBS"]),
-            ))
-
-    insert_in_batches(
-        cur,
-        """
-        INSERT INTO Enhancers
-        (name, chromosome, start, end, en_length, exp_condition, tf_counts, tbs)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, rows,
-        label="Enhancers")
+            try:
+                values = parse(row)
+            except ValueError as e:
+                rejects.add(reader.line_num, str(e))
+                continue
+            yield values
+
+
+def read_enhancers(rejects):
+    def parse(row):
+        return (
+            none_if_empty(row["Enhancer"]),
+            none_if_empty(row["Chromosome"]),
+            to_int(row["Start"]),
+            to_int(row["End"]),
+            to_int(row["Length"]),
+            none_if_empty(row["Treatment"]),
+            none_if_empty(row["TF_counts"]),
+            to_int(row["TBS"]),
+        )
+
+    expected = {
+        "Enhancer", "Chromosome", "Start", "End",
+        "Length", "Treatment", "TF_counts", "TBS"
+    }
+    return parse_csv(ENHANCER_CSV, expected, parse, rejects)
+
+
+class StableEids:
+    """Enhancer ids for a new generation, carried over from the one it replaces by (name, condition).
+
+    Workers keep their in-memory enhancer index until they notice the new data version,
+    so an eid must go on naming the same enhancer after the swap. Enhancers new to this
+    load get ids above every id used so far, never one that named another enhancer.
+    """
+
+    def __init__(self, known=(), next_eid=1):
+        self.known = {}
+        for eid, name, exp_condition in known:
+            self.known.setdefault((name, exp_condition), eid)
+        self.next_eid = next_eid
+        self.reused = 0
+
+    def assign(self, rows):
+        """read_enhancers rows with their eid in front"""
+        for row in rows:
+            eid = self.known.pop((row[0], row[5]), None)
+            if eid is None:
+                eid = self.next_eid
+                self.next_eid += 1
+            else:
+                self.reused += 1
+            yield (eid,) + row
+
+
+def live_eids(cur):
+    """StableEids from the live Enhancers; ids of the *_old generation aren't reused either"""
+    tables = existing_tables(cur) | existing_tables(cur, OLD)
+    known = []
+    if "Enhancers" in tables:
+        cur.execute("SELECT eid, name, exp_condition FROM Enhancers")
+        known = cur.fetchall()
+
+    top = 0
+    for table in ("Enhancers", "Enhancers" + OLD):
+        if table in tables:
+            cur.execute(f"SELECT MAX(eid) FROM {table}")
+            top = max(top, cur.fetchone()[0] or 0)
+    # Ids deleted by an incremental load are above MAX(eid) but below the counter
+    cur.execute(
+        "SELECT MAX(auto_increment) FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name IN (?, ?)", ("Enhancers", "Enhancers" + OLD)
+    )
+    top = max(top, (cur.fetchone()[0] or 1) - 1)
+    return StableEids(known, top + 1)
 
-    print(f"Loaded {len(rows)} rows into Enhancers")
 
+def snapshot_eids(path):
+    """StableEids from the snapshot file about to be replaced"""
+    if not Path(path).exists():
+        return StableEids()
+    conn = sqlite3.connect(path)
+    try:
+        known = conn.execute("SELECT eid, name, exp_condition FROM Enhancers").fetchall()
+        top = conn.execute("SELECT MAX(eid) FROM Enhancers").fetchone()[0] or 0
+    except sqlite3.Error:
+        return StableEids()
+    finally:
+        conn.close()
+    return StableEids(known, top + 1)
 
-def load_genes(cur):
-    rows = []
 
-    with open(GENES_CSV, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-
-        expected = {
-            "GeneID", "Chromosome", "Start", "End", "GeneName",
-            "Immune Process", "Time_cluster", "Length",
-            "tpm_ctrl", "tpm_20e", "tpm_imd"
-        }
-        missing = expected - set(reader.fieldnames or [])
-        if missing:
-            raise ValueError(f"genes.csv missing columns: {sorted(missing)}")
+def load_enhancers(cur, insert=insert_in_batches, suffix="", eids=None):
+    rejects = Rejects(ENHANCER_CSV.name)
+    eids = eids or StableEids()
+    count = insert(
+        cur,
+        f"""
+        INSERT INTO Enhancers{suffix}
+        (eid, name, chromosome, start, end, en_length, exp_condition, tf_counts, tbs)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, eids.assign(read_enhancers(rejects)),
+        label="Enhancers")
 
-        for row in reader:
-            rows.append((
-                none_if_empty(row["GeneID"]),
-                none_if_empty(row["Chromosome"]),
-                to_int(row["Start"]),
-                to_int(row["End"]),
-                none_if_empty(row["GeneName"]),
-                none_if_empty(row["Immune Process"]),
-                none_if_empty(row["Time_cluster"]),
-                to_int(row["Length"]),
-                to_float(row["tpm_ctrl"]),
-                to_float(row["tpm_20e"]),
-                to_float(row["tpm_imd"]),
-            ))
-
-    insert_in_batches(
+    print(f"Loaded {count} rows into Enhancers, {eids.reused} keeping their previous ids")
+    rejects.report()
+    return count
+
+
+def read_genes(rejects):
+    def parse(row):
+        return (
+            none_if_empty(row["GeneID"]),
+            none_if_empty(row["Chromosome"]),
+            to_int(row["Start"]),
+            to_int(row["End"]),
+            none_if_empty(row["GeneName"]),
+            none_if_empty(row["Immune Process"]),
+            none_if_empty(row["Time_cluster"]),
+            to_int(row["Length"]),
+            to_float(row["tpm_ctrl"]),
+            to_float(row["tpm_20e"]),
+            to_float(row["tpm_imd"]),
+        )
+
+    expected = {
+        "GeneID", "Chromosome", "Start", "End", "GeneName",
+        "Immune Process", "Time_cluster", "Length",
+        "tpm_ctrl", "tpm_20e", "tpm_imd"
+    }
+    return parse_csv(GENES_CSV, expected, parse, rejects)
+
+
+def load_genes(cur, insert=insert_in_batches, suffix=""):
+    rejects = Rejects(GENES_CSV.name)
+    count = insert(
         cur,
-        """
-        INSERT INTO Genes
+        f"""
+        INSERT INTO Genes{suffix}
         (geneid, chromosome, start, end, symbol, immune_process, time_cluster,
          gene_length, tpm_ctrl, tpm_20e, tpm_imd)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, rows,
+    """, read_genes(rejects),
         label="Genes")
 
-    print(f"Loaded {len(rows)} rows into Genes")
+    print(f"Loaded {count} rows into Genes")
+    rejects.report()
+    return count
 
 
 def build_lookup(cur, query):
@@ -255,148 +568,614 @@ def build_lookup(cur, query):
     return lookup
 
 
-def load_associations(cur):
-    enhancer_lookup = build_lookup(cur, "SELECT eid, name FROM Enhancers")
-    gene_lookup = build_lookup(cur, "SELECT gid, geneid FROM Genes")
+def read_associations(enhancer_lookup, gene_lookup, rejects):
+    """Association rows keyed to eid/gid through the lookups; rows naming an unknown enhancer or gene are rejected"""
+    def parse(row):
+        enhancer_name = none_if_empty(row["Enhancer"])
+        geneid = none_if_empty(row["Gene"])
+
+        eid = enhancer_lookup.get(enhancer_name)
+        if eid is None:
+            raise ValueError(f"enhancer {enhancer_name!r} not found")
+        gid = gene_lookup.get(geneid)
+        if gid is None:
+            raise ValueError(f"gene {geneid!r} not found")
+
+        return (
+            eid,
+            gid,
+            to_float(row["coSTARR LogFC HKSMvs20E"]),
+            to_float(row["coSTARR LogFC 20EvsControl"]),
+            to_float(row["2021 LogFC IMDvsCTRL"]),
+            none_if_empty(row["Treatment"]),
+            to_float(row["new_act_score"]),
+            none_if_empty(row["Accessibility"]),
+        )
+
+    expected = {
+        "Enhancer", "Gene", "coSTARR LogFC HKSMvs20E",
+        "coSTARR LogFC 20EvsControl", "2021 LogFC IMDvsCTRL",
+        "Treatment", "new_act_score", "Accessibility"
+    }
+    return parse_csv(ASSOCIATIONS_CSV, expected, parse, rejects)
+
+
+def load_associations(cur, insert=insert_in_batches, sort=False, suffix=""):
+    enhancer_lookup = build_lookup(cur, f"SELECT eid, name FROM Enhancers{suffix}")
+    gene_lookup = build_lookup(cur, f"SELECT gid, geneid FROM Genes{suffix}")
+    rejects = Rejects(ASSOCIATIONS_CSV.name)
+    rows = read_associations(enhancer_lookup, gene_lookup, rejects)
+
+    if sort:
+        # Primary-key order lets InnoDB append to the clustered index instead of splitting pages.
+        # This is the one step that holds a whole file in memory, so only bulk mode asks for it.
+        rows = sorted(rows, key=lambda row: (row[0], row[1], row[5] or ""))
+
+    count = insert(
+        cur,
+        f"""
+        INSERT INTO Associations{suffix}
+        (eid, gid, imd_vs_20e, `20e_vs_ctrl`, imd_vs_ctrl, exp_condition, activity, accessibility)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows,
+        label="Associations")
 
-    rows = []
-    skipped = 0
+    print(f"Loaded {count} rows into Associations")
+    rejects.report()
+    return count
+
+
+def read_activity_class_info(rejects):
+    def parse(row):
+        enhancer_name = none_if_empty(row["Enhancer"])
+        return (
+            enhancer_name,
+            none_if_empty(row["Activity class"]),
+            none_if_empty(row["Accessibility"]),
+            none_if_empty(row["Gene"]),
+            to_int(row["Distance to enhancer"]),
+            none_if_empty(row["Time Cluster"]),
+            none_if_empty(row["Broad Immune Role"]),
+            *parse_enhancer_name(enhancer_name),
+        )
+
+    expected = {
+        "Enhancer", "Activity class", "Accessibility", "Gene",
+        "Distance to enhancer", "Time Cluster", "Broad Immune Role"
+    }
+    return parse_csv(TAB3_CSV, expected, parse, rejects)
+
+
+def load_activity_class_info(cur, insert=insert_in_batches, suffix=""):
+    # gene_symbol is filled in from Genes afterwards by enrich_activity_class_info
+    rejects = Rejects(TAB3_CSV.name)
+    count = insert(
+        cur,
+        f"""
+        INSERT INTO Activity_class_info{suffix}
+        (enhancer_name, activity_class, accessibility, geneid,
+         dist_to_enh, time_cluster, broad_immune_role,
+         chromosome, start, end)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, read_activity_class_info(rejects),
+        label="Activity_class_info")
 
-    with open(ASSOCIATIONS_CSV, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    print(f"Loaded {count} rows into Activity_class_info")
+    rejects.report()
+    return count
+
+
+def enrich_activity_class_info(cur, snapshot=False, suffix=""):
+    if snapshot:
+        # SQLite has no multi-table UPDATE
+        cur.execute("""
+            UPDATE Activity_class_info
+            SET gene_symbol = (SELECT g.symbol FROM Genes g WHERE g.geneid = Activity_class_info.geneid)
+        """)
+    else:
+        # LEFT JOIN so an incremental load also clears symbols of genes that were removed
+        cur.execute(f"""
+            UPDATE Activity_class_info{suffix} ac
+            LEFT JOIN Genes{suffix} g ON ac.geneid = g.geneid
+            SET ac.gene_symbol = g.symbol
+        """)
+    print("Updated Activity_class_info.gene_symbol from Genes.symbol")
 
-        expected = {
-            "Enhancer", "Gene", "coSTARR LogFC HKSMvs20E",
-            "coSTARR LogFC 20EvsControl", "2021 LogFC IMDvsCTRL",
-            "Treatment", "new_act_score", "Accessibility"
-        }
-        missing = expected - set(reader.fieldnames or [])
-        if missing:
-            raise ValueError(f"associations.csv missing columns: {sorted(missing)}")
 
-        for row in reader:
-            enhancer_name = none_if_empty(row["Enhancer"])
-            geneid = none_if_empty(row["Gene"])
+def bump_data_version(cur):
+    """Record a new dataset version so running app workers refresh their caches"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Data_version (
+            id TINYINT NOT NULL,
+            version INTEGER NOT NULL,
+            loaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id)
+        ) ENGINE=InnoDB
+    """)
+    cur.execute("""
+        INSERT INTO Data_version (id, version, loaded_at) VALUES (1, 1, CURRENT_TIMESTAMP)
+        ON DUPLICATE KEY UPDATE version = version + 1, loaded_at = CURRENT_TIMESTAMP
+    """)
+    cur.execute("SELECT version FROM Data_version WHERE id = 1")
+    print(f"Data version is now {cur.fetchone()[0]}")
 
-            eid = enhancer_lookup.get(enhancer_name)
-            gid = gene_lookup.get(geneid)
 
-            if eid is None or gid is None:
-                skipped += 1
-                continue
+def verify_counts(cur, suffix=""):
+    """Print each table's row count; raise if any of them came out empty"""
+    empty = []
+    for table in TABLES:
+        cur.execute(f"SELECT COUNT(*) FROM {table}{suffix}")
+        count = cur.fetchone()[0]
+        print(f"{table}{suffix}: {count}")
+        if not count:
+            empty.append(table + suffix)
+    if empty:
+        raise ValueError(f"Refusing to continue with empty tables: {', '.join(empty)}")
+
+
+def existing_tables(cur, suffix=""):
+    cur.execute(
+        "SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name IN ("
+        + ", ".join(["?"] * len(GENERATION_TABLES)) + ")",
+        [table + suffix for table in GENERATION_TABLES]
+    )
+    return {row[0] for row in cur.fetchall()}
+
+
+def swap_in_next_tables(cur):
+    """Make the *_next tables live in one atomic RENAME TABLE, keeping the live ones as *_old.
+
+    Readers see either the old or the new generation, never a missing or half-filled
+    table. The generation that was *_old before is dropped first.
+    """
+    drop_tables(cur, OLD)
+    live = existing_tables(cur)
+    renames = []
+    for table in GENERATION_TABLES:
+        if table in live:
+            renames.append(f"{table} TO {table}{OLD}")
+        renames.append(f"{table}{NEXT} TO {table}")
+    cur.execute("RENAME TABLE " + ", ".join(renames))
+    print(f"Swapped in new tables; previous generation kept as *{OLD}")
+
+
+def rollback_to_old_tables(cur):
+    """Swap the *_old generation back in, in one atomic RENAME TABLE; the current one becomes *_old"""
+    old = existing_tables(cur, OLD)
+    missing = [table + OLD for table in GENERATION_TABLES if table + OLD not in old]
+    if missing:
+        raise ValueError(f"Nothing to roll back to, missing: {', '.join(missing)}")
+    drop_tables(cur, NEXT)
+    renames = []
+    for table in GENERATION_TABLES:
+        renames += [f"{table} TO {table}{NEXT}", f"{table}{OLD} TO {table}", f"{table}{NEXT} TO {table}{OLD}"]
+    cur.execute("RENAME TABLE " + ", ".join(renames))
+    print(f"Rolled back to the previous tables; the replaced ones are now *{OLD}")
 
-            rows.append((
-                eid,
-                gid,
-                to_float(row["coSTARR LogFC HKSMvs20E"]),
-                to_float(row["coSTARR LogFC 20EvsControl"]),
-                to_float(row["2021 LogFC IMDvsCTRL"]),
-                none_if_empty(row["Treatment"]),
-                to_float(row["new_act_score"]),
-                none_if_empty(row["Accessibility"]),
-            ))
-
-    insert_in_batches(
-        cur,
-        """
-        INSERT INTO Associations
-        (eid, gid, imd_vs_20e, 20e_vs_ctrl, imd_vs_ctrl, exp_condition, activity, accessibility)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, rows,
-        label="Associations")
 
-    print(f"Loaded {len(rows)} rows into Associations")
-    if skipped:
-        print(f"Skipped {skipped} association rows because enhancer or gene was not found")
+def load_tables(cur, snapshot=False, suffix="", eids=None):
+    print("Loading Enhancers...")
+    timed_load("Enhancers", load_enhancers, cur, suffix=suffix, eids=eids)
 
+    print("Loading Genes...")
+    timed_load("Genes", load_genes, cur, suffix=suffix)
 
-def load_activity_class_info(cur):
-    rows = []
+    print("Loading Associations...")
+    timed_load("Associations", load_associations, cur, suffix=suffix)
 
-    with open(TAB3_CSV, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    print("Loading Activity_class_info...")
+    timed_load("Activity_class_info", load_activity_class_info, cur, suffix=suffix)
 
-        expected = {
-            "Enhancer", "Activity class", "Accessibility", "Gene",
-            "Distance to enhancer", "Time Cluster", "Broad Immune Role"
-        }
-        missing = expected - set(reader.fieldnames or [])
-        if missing:
-            raise ValueError(f"tab3_data.csv missing columns: {sorted(missing)}")
+    print("Enriching Activity_class_info...")
+    enrich_activity_class_info(cur, snapshot=snapshot, suffix=suffix)
+
+    print("Building chart summaries...")
+    build_summaries(cur, snapshot=snapshot, suffix=suffix)
 
-        for row in reader:
-            rows.append((
-                none_if_empty(row["Enhancer"]),
-                none_if_empty(row["Activity class"]),
-                none_if_empty(row["Accessibility"]),
-                none_if_empty(row["Gene"]),
-                to_int(row["Distance to enhancer"]),
-                none_if_empty(row["Time Cluster"]),
-                none_if_empty(row["Broad Immune Role"]),
-                None,
-            ))
-
-    insert_in_batches(
-        cur,
-        """
-        INSERT INTO Activity_class_info
-        (enhancer_name, activity_class, accessibility, geneid,
-         dist_to_enh, time_cluster, broad_immune_role, gene_symbol)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, rows,
-        label="Activity_class_info")
 
-    print(f"Loaded {len(rows)} rows into Activity_class_info")
+def timed_load(label, load, *args, **kwargs):
+    """Run one table's loader and report its throughput"""
+    started = time.perf_counter()
+    count = load(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+    print(f"{label}: {count} rows in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
+    return count
 
 
-def enrich_activity_class_info(cur):
+def bulk_cursor(conn):
+    """Cursor on a session that skips foreign key and secondary unique checks while loading"""
+    cur = conn.cursor()
+    cur.execute("SET SESSION foreign_key_checks = 0")
+    cur.execute("SET SESSION unique_checks = 0")
+    return cur
+
+
+def on_own_connection(work):
+    """Run work(cur) on a fresh bulk-mode connection and commit it, for the parallel phases
+    and reads that mustn't leave a read view open on the main connection"""
+    conn = connect_db()
+    cur = bulk_cursor(conn)
+    try:
+        result = work(cur)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def run_parallel(jobs):
+    """Run independent (cur -> result) jobs concurrently, one connection each"""
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = [pool.submit(on_own_connection, job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def check_association_references(cur, suffix=""):
+    """Validate the foreign keys skipped during a bulk load"""
+    cur.execute(f"""
+        SELECT COUNT(*)
+        FROM Associations{suffix} a
+        LEFT JOIN Enhancers{suffix} e ON a.eid = e.eid
+        LEFT JOIN Genes{suffix} g ON a.gid = g.gid
+        WHERE e.eid IS NULL OR g.gid IS NULL
+    """)
+    orphans = cur.fetchone()[0]
+    if orphans:
+        raise ValueError(f"{orphans} Associations rows reference a missing enhancer or gene")
+
+
+def bulk_load_tables(conn, cur, suffix="", eids=None):
+    """Bulk counterpart of load_tables for a MariaDB reseed.
+
+    Enhancers, Genes and Activity_class_info have no dependencies on each other, so
+    they load concurrently over separate connections with multi-row INSERTs and no
+    secondary indexes. Their indexes are then built in parallel, one ALTER per table,
+    before Associations (which needs the committed enhancer and gene ids) is loaded in
+    primary-key order. Foreign keys are checked once at the end instead of per row.
+    """
+    started = time.perf_counter()
+
+    print("Loading Enhancers, Genes and Activity_class_info in parallel...")
+    run_parallel([
+        lambda c: timed_load("Enhancers", load_enhancers, c, insert=insert_multirow, suffix=suffix, eids=eids),
+        lambda c: timed_load("Genes", load_genes, c, insert=insert_multirow, suffix=suffix),
+        lambda c: timed_load("Activity_class_info", load_activity_class_info, c,
+                             insert=insert_multirow, suffix=suffix),
+    ])
+
+    print("Building secondary indexes...")
+    run_parallel([lambda c, table=table: create_indexes(c, table, suffix) for table in SECONDARY_INDEXES])
+
+    print("Loading Associations...")
+    timed_load("Associations", load_associations, cur, insert=insert_multirow, sort=True, suffix=suffix)
+    check_association_references(cur, suffix)
+
+    print("Applying schema migrations...")
+    migrate_tables(cur, suffix=suffix)
+
+    print("Enriching Activity_class_info...")
+    enrich_activity_class_info(cur, suffix=suffix)
+
+    print("Building chart summaries...")
+    build_summaries(cur, suffix=suffix)
+
+    print(f"Bulk load finished in {time.perf_counter() - started:.1f}s")
+
+
+# Incremental reloads: Load_manifest records the sha256 of each input file as last loaded,
+# so only files whose hash changed are re-read and diffed against the live tables
+
+INPUT_FILES = [ENHANCER_CSV, GENES_CSV, ASSOCIATIONS_CSV, TAB3_CSV]
+
+# Columns compared per table: (id columns, data columns, natural key positions in the data columns)
+DIFF_COLUMNS = {
+    "Enhancers": (
+        ["eid"],
+        ["name", "chromosome", "start", "end", "en_length", "exp_condition", "tf_counts", "tbs"],
+        [0],
+    ),
+    "Genes": (
+        ["gid"],
+        ["geneid", "chromosome", "start", "end", "symbol", "immune_process", "time_cluster",
+         "gene_length", "tpm_ctrl", "tpm_20e", "tpm_imd"],
+        [0],
+    ),
+    "Associations": (
+        ["eid", "gid", "exp_condition"],
+        ["eid", "gid", "imd_vs_20e", "20e_vs_ctrl", "imd_vs_ctrl", "exp_condition", "activity", "accessibility"],
+        [0, 1, 5],
+    ),
+    "Activity_class_info": (
+        ["ac_eid"],
+        ["enhancer_name", "activity_class", "accessibility", "geneid", "dist_to_enh", "time_cluster",
+         "broad_immune_role", "chromosome", "start", "end"],
+        [0, 3],
+    ),
+}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def input_hashes():
+    return {path.name: file_sha256(path) for path in INPUT_FILES}
+
+
+def read_manifest(cur):
     cur.execute("""
-        UPDATE Activity_class_info ac
-        INNER JOIN Genes g ON ac.geneid = g.geneid
-        SET ac.gene_symbol = g.symbol
+        CREATE TABLE IF NOT EXISTS Load_manifest (
+            file_name VARCHAR(64) NOT NULL,
+            sha256 CHAR(64) NOT NULL,
+            loaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (file_name)
+        ) ENGINE=InnoDB
     """)
-    print("Updated Activity_class_info.gene_symbol from Genes.symbol")
+    cur.execute("SELECT file_name, sha256 FROM Load_manifest")
+    return dict(cur.fetchall())
+
+
+def record_manifest(cur, hashes):
+    read_manifest(cur)
+    cur.executemany("""
+        INSERT INTO Load_manifest (file_name, sha256, loaded_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON DUPLICATE KEY UPDATE sha256 = VALUES(sha256), loaded_at = CURRENT_TIMESTAMP
+    """, list(hashes.items()))
+
+
+def clear_manifest(cur):
+    """Forget the recorded hashes, so the next incremental run diffs every file"""
+    read_manifest(cur)
+    cur.execute("DELETE FROM Load_manifest")
+
+
+def diff_rows(existing, incoming, key):
+    """Match incoming rows to existing (row_id, values) pairs by natural key.
+
+    Rows sharing a key are paired in order, so a name listed twice in a file keeps
+    its two database rows. Returns (inserts, updates, deletes): new value tuples,
+    (row_id, values) pairs whose values changed, and row_ids no longer in the file.
+    """
+    by_key = {}
+    for row_id, values in existing:
+        by_key.setdefault(key(values), deque()).append((row_id, values))
+
+    inserts, updates = [], []
+    for values in incoming:
+        matches = by_key.get(key(values))
+        if matches:
+            row_id, old = matches.popleft()
+            if old != values:
+                updates.append((row_id, values))
+        else:
+            inserts.append(values)
+
+    deletes = [row_id for matches in by_key.values() for row_id, _ in matches]
+    return inserts, updates, deletes
+
+
+def apply_diff(cur, table, incoming):
+    """Bring table in line with incoming rows through INSERT/UPDATE/DELETE of only the rows that differ"""
+    id_columns, columns, key_positions = DIFF_COLUMNS[table]
+    quoted = [f"`{column}`" for column in columns]
+    where = " AND ".join(f"`{column}` = ?" for column in id_columns)
+
+    cur.execute(f"SELECT {', '.join(id_columns)}, {', '.join(quoted)} FROM {table} "
+                f"ORDER BY {', '.join(id_columns)}")
+    width = len(id_columns)
+    existing = [(tuple(row[:width]), tuple(row[width:])) for row in cur.fetchall()]
+
+    inserts, updates, deletes = diff_rows(
+        existing, incoming, key=lambda values: tuple(values[i] for i in key_positions)
+    )
 
+    if deletes:
+        cur.executemany(f"DELETE FROM {table} WHERE {where}", deletes)
+    if updates:
+        cur.executemany(
+            f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in quoted)} WHERE {where}",
+            [values + row_id for row_id, values in updates]
+        )
+    if inserts:
+        insert_in_batches(
+            cur,
+            f"INSERT INTO {table} ({', '.join(quoted)}) VALUES ({', '.join(['?'] * len(columns))})",
+            inserts, label=table
+        )
+
+    print(f"{table}: {len(inserts)} inserted, {len(updates)} updated, {len(deletes)} deleted")
+    return len(inserts) + len(updates) + len(deletes)
+
+
+def incremental_load(cur):
+    """Apply only the changes in input files whose hash differs from Load_manifest.
+
+    Enhancers and Genes are diffed first; deleting one cascades to its Associations.
+    Associations are re-diffed whenever any of the three files behind them changed,
+    since a new or removed enhancer/gene name changes which rows resolve. Returns the
+    number of rows changed; the caller commits.
+    """
+    hashes = input_hashes()
+    manifest = read_manifest(cur)
+    changed = {name for name, digest in hashes.items() if manifest.get(name) != digest}
+    if not changed:
+        print("No input files changed since the last load.")
+        return 0
+    print(f"Changed files: {', '.join(sorted(changed))}")
+
+    total = 0
+    rejects = []
+    if ENHANCER_CSV.name in changed:
+        rejects.append(Rejects(ENHANCER_CSV.name))
+        total += apply_diff(cur, "Enhancers", read_enhancers(rejects[-1]))
+    if GENES_CSV.name in changed:
+        rejects.append(Rejects(GENES_CSV.name))
+        total += apply_diff(cur, "Genes", read_genes(rejects[-1]))
+
+    if changed & {ENHANCER_CSV.name, GENES_CSV.name, ASSOCIATIONS_CSV.name}:
+        enhancer_lookup = build_lookup(cur, "SELECT eid, name FROM Enhancers")
+        gene_lookup = build_lookup(cur, "SELECT gid, geneid FROM Genes")
+        rejects.append(Rejects(ASSOCIATIONS_CSV.name))
+        total += apply_diff(cur, "Associations", read_associations(enhancer_lookup, gene_lookup, rejects[-1]))
+
+    if TAB3_CSV.name in changed:
+        rejects.append(Rejects(TAB3_CSV.name))
+        total += apply_diff(cur, "Activity_class_info", read_activity_class_info(rejects[-1]))
+
+    for file_rejects in rejects:
+        file_rejects.report()
+    if changed & {TAB3_CSV.name, GENES_CSV.name}:
+        enrich_activity_class_info(cur)
+    if total:
+        build_summaries(cur)
 
-def verify_counts(cur):
-    for table in ["Enhancers", "Genes", "Associations", "Activity_class_info"]:
-        cur.execute(f"SELECT COUNT(*) FROM {table}")
-        count = cur.fetchone()[0]
-        print(f"{table}: {count}")
+    record_manifest(cur, hashes)
+    return total
 
 
-def main():
-    ensure_files_exist()
+def snapshot_version(path):
+    """Data version of an existing snapshot file, or 0"""
+    if not Path(path).exists():
+        return 0
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT version FROM Data_version WHERE id = 1").fetchone()[0]
+    except (sqlite3.Error, TypeError):
+        return 0
+    finally:
+        conn.close()
 
-    conn = connect_db()
-    cur = conn.cursor()
 
+def write_snapshot(path):
+    """Build a SQLite snapshot next to path and move it into place in one rename.
+
+    Apps serving the old file keep their open connections; new ones see the new file,
+    and its data version is one past the file it replaces so their caches refresh.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+
+    conn = sqlite3.connect(tmp_path)
+    cur = conn.cursor()
     try:
-        print("Dropping old tables...")
-        drop_tables(cur)
+        print("Creating snapshot tables...")
+        cur.executescript(SNAPSHOT_SCHEMA)
+        migrate_tables(cur, snapshot=True)
+        record_migrations(cur, snapshot=True)
+        create_summary_tables(cur)
+
+        load_tables(cur, snapshot=True, eids=snapshot_eids(path))
+
+        version = snapshot_version(path) + 1
+        cur.execute("INSERT INTO Data_version (id, version) VALUES (1, ?)", (version,))
+        conn.commit()
+        print(f"Data version is now {version}")
 
-        print("Creating tables...")
-        create_tables(cur)
+        print("\nFinal counts:")
+        verify_counts(cur)
+        cur.execute("ANALYZE")
+        conn.commit()
+    except Exception:
+        conn.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    conn.close()
 
-        print("Loading Enhancers...")
-        load_enhancers(cur)
+    os.replace(tmp_path, path)
+    print(f"\nSnapshot written to {path}")
 
-        print("Loading Genes...")
-        load_genes(cur)
 
-        print("Loading Associations...")
-        load_associations(cur)
+def main():
+    parser = argparse.ArgumentParser(description="Load processed_data/ into the STARR query database")
+    parser.add_argument("--snapshot", metavar="PATH",
+                        help="write a SQLite snapshot file for DB_BACKEND=sqlite instead of loading MariaDB")
+    parser.add_argument("--bulk", action="store_true",
+                        help="load with large multi-row INSERTs, parallel connections and deferred indexes/checks")
+    parser.add_argument("--rollback", action="store_true",
+                        help=f"swap the previous generation of tables (*{OLD}) back in and exit")
+    parser.add_argument("--incremental", action="store_true",
+                        help="apply only the rows that changed in input files edited since the last load")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        ensure_files_exist(require_ca=False)
+        write_snapshot(args.snapshot)
+        return
+
+    if args.rollback:
+        conn = connect_db()
+        cur = conn.cursor()
+        try:
+            rollback_to_old_tables(cur)
+            # The restored tables may predate a migration; every migration is safe to re-run
+            forget_migrations(cur)
+            apply_pending(cur)
+            clear_manifest(cur)
+            bump_data_version(cur)
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+        return
 
-        print("Loading Activity_class_info...")
-        load_activity_class_info(cur)
+    ensure_files_exist()
 
-        print("Enriching Activity_class_info...")
-        enrich_activity_class_info(cur)
+    if args.incremental:
+        conn = connect_db()
+        cur = conn.cursor()
+        try:
+            if incremental_load(cur):
+                bump_data_version(cur)
+            conn.commit()
+            print("\nIncremental load complete.")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+        return
+
+    hashes = input_hashes()
+    conn = connect_db()
+    cur = bulk_cursor(conn) if args.bulk else conn.cursor()
+
+    try:
+        # The live tables keep serving while the next generation is built beside them
+        print(f"Dropping leftover *{NEXT} tables...")
+        drop_tables(cur, NEXT)
+
+        print(f"Creating *{NEXT} tables...")
+        create_tables(cur, indexes=not args.bulk, suffix=NEXT)
+
+        # Enhancers keep their live eids, so workers' cached enhancer index stays valid. Read
+        # on a connection of their own: a read view left open on conn would hide the *_next
+        # rows the parallel bulk phase commits from load_associations' lookups
+        eids = on_own_connection(live_eids)
+        if args.bulk:
+            bulk_load_tables(conn, cur, suffix=NEXT, eids=eids)
+        else:
+            load_tables(cur, suffix=NEXT, eids=eids)
 
         conn.commit()
 
-        print("\nFinal counts:")
-        verify_counts(cur)
+        print(f"\nCounts in *{NEXT} tables:")
+        verify_counts(cur, NEXT)
+
+        swap_in_next_tables(cur)
+        record_migrations(cur)
+        record_manifest(cur, hashes)
+        bump_data_version(cur)
+        conn.commit()
 
         print("\nSeed complete.")
     except Exception:
@@ -408,4 +1187,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,80 @@
+"""Fixtures: a small generated dataset, served from a SQLite snapshot and, with
+TEST_MARIADB=1, from the MariaDB database configured in .env.
+
+The MariaDB run reseeds that database with the test data, so point .env at a scratch
+database first. Without TEST_MARIADB=1 the MariaDB cases are skipped.
+"""
+
+import functools
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(REPO_DIR / "benchmarks"))
+
+# Read by app.py on import: no shared result cache or metrics files between test runs
+os.environ["RESULT_CACHE_MB"] = "0"
+os.environ["METRICS_DIR"] = ""
+
+import generate_data  # noqa: E402
+
+# Share of the real dataset's size; a few hundred enhancers, so several pages per search
+TEST_SCALE = 0.05
+BACKENDS = ["sqlite", "mariadb"]
+
+
+def load(data_dir, *args):
+    subprocess.run([sys.executable, str(REPO_DIR / "table_upload.py"), *args],
+                   env=dict(os.environ, DATA_DIR=str(data_dir)), cwd=REPO_DIR, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+@pytest.fixture(scope="session")
+def dataset(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("data")
+    generate_data.generate(data_dir, TEST_SCALE, seed=0)
+    return data_dir
+
+
+@pytest.fixture(scope="session")
+def snapshot_path(dataset):
+    path = dataset / "snapshot.sqlite"
+    load(dataset, "--snapshot", str(path))
+    return path
+
+
+@pytest.fixture(scope="session")
+def mariadb_loaded(dataset):
+    if os.getenv("TEST_MARIADB") != "1":
+        pytest.skip("set TEST_MARIADB=1 to reseed the .env database with test data")
+    load(dataset)
+    return True
+
+
+@pytest.fixture
+def reseed(dataset, mariadb_loaded):
+    """table_upload.py with these arguments, loading the test data into the .env database again"""
+    return functools.partial(load, dataset)
+
+
+@pytest.fixture(params=BACKENDS)
+def app(request, monkeypatch):
+    """app.py serving the test data from one backend, with its per-worker caches emptied"""
+    import app as app_module
+
+    if request.param == "sqlite":
+        monkeypatch.setattr(app_module, "SNAPSHOT_PATH", str(request.getfixturevalue("snapshot_path")))
+    else:
+        request.getfixturevalue("mariadb_loaded")
+    monkeypatch.setattr(app_module, "DB_BACKEND", request.param)
+
+    app_module._version_cache.clear()
+    app_module._data_version['checked_at'] = None
+    yield app_module
+    app_module._version_cache.clear()
+    app_module._data_version['checked_at'] = None
@@ -0,0 +1,6 @@
+"""Downloads: each distinct row once, wherever its duplicates fall in the result"""
+
+
+def test_export_rows_skip_non_adjacent_duplicates(app):
+    query = "SELECT 1, 'a' UNION ALL SELECT 2, 'b' UNION ALL SELECT 1, 'a' UNION ALL SELECT 2, 'b'"
+    assert list(app.iter_export_rows(query, [], list)) == [[1, 'a'], [2, 'b']]
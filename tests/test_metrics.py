@@ -0,0 +1,82 @@
+"""Shared metrics: exited workers' files are folded into one, and the totals never go down"""
+
+import json
+import os
+import subprocess
+import sys
+
+from metrics import RETIRED_FILE, MetricsRegistry
+
+
+def registry():
+    registry = MetricsRegistry()
+    registry.histogram('starr_test_seconds', 'Test', ['endpoint'])
+    return registry
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+def write_worker_file(directory, pid, count):
+    other = registry()
+    for _ in range(count):
+        other.histograms['starr_test_seconds'].observe(0.01, endpoint='search')
+    other._file = f"{pid}-0.json"
+    other.write(str(directory))
+
+
+def total(registry, directory):
+    """Observations counted across the workers; the last value of a series is the sum"""
+    return sum(registry.collect(str(directory))['starr_test_seconds'][('search',)][:-1])
+
+
+def test_exited_workers_are_retired_without_losing_counts(tmp_path):
+    directory = tmp_path / "metrics"
+    this = registry()
+    write_worker_file(directory, exited_pid(), 2)
+    write_worker_file(directory, exited_pid(), 3)
+    assert oct(os.stat(directory).st_mode & 0o777) == '0o700'
+
+    assert total(this, directory) == 5
+    assert sorted(os.listdir(directory)) == ['.lock', RETIRED_FILE]
+
+    write_worker_file(directory, exited_pid(), 1)
+    assert total(this, directory) == 6
+    assert sorted(os.listdir(directory)) == ['.lock', RETIRED_FILE]
+
+
+def test_live_worker_file_is_kept(tmp_path):
+    directory = tmp_path / "metrics"
+    write_worker_file(directory, os.getppid(), 1)
+    assert total(registry(), directory) == 1
+    assert f"{os.getppid()}-0.json" in os.listdir(directory)
+
+
+def test_directory_open_to_others_is_not_read(tmp_path):
+    directory = tmp_path / "metrics"
+    directory.mkdir(mode=0o777)
+    os.chmod(directory, 0o777)
+    (directory / "1-0.json").write_text(json.dumps({}))
+    assert registry().collect(str(directory))['starr_test_seconds'] == {}
+    assert os.listdir(directory) == ["1-0.json"]
+
+
+def test_metrics_endpoint_exposes_requests(app):
+    client = app.app.test_client()
+    before = client.get('/metrics').get_data(as_text=True)
+    count = f'starr_request_seconds_count{{endpoint="pool_status",method="GET",status="200"}}'
+    served = next((int(line.split()[-1]) for line in before.splitlines() if line.startswith(count + ' ')), 0)
+
+    client.get('/pool_stats').close()
+    response = client.get('/metrics')
+    text = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert '# TYPE starr_request_seconds histogram' in text
+    assert ('starr_request_seconds_bucket{endpoint="pool_status",method="GET",status="200",le="+Inf"} '
+            f'{served + 1}') in text.splitlines()
+    assert f'{count} {served + 1}' in text.splitlines()
@@ -0,0 +1,82 @@
+"""Keyset paging returns every row of a result exactly once, in display order, on both backends"""
+
+import pytest
+
+
+def busiest(app, query):
+    with app.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        return cursor.fetchone()[0]
+
+
+def all_rows(app, built):
+    with app.db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(*built)
+        return cursor.fetchall()
+
+
+def page_through(client, path, params, limit):
+    rows, cursor = [], None
+    while True:
+        query = dict(params, limit=limit, **({'cursor': cursor} if cursor else {}))
+        body = client.get(path, query_string=query).get_json()
+        rows.extend(body['results'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return rows
+
+
+def row_key(row):
+    return (row['enhancer_id'], row['exp_condition'], row['gene_id'])
+
+
+def assert_in_display_order(app, rows):
+    order = [(row['enhancer_id'], app.CONDITION_ORDER[row['exp_condition']]) for row in rows]
+    assert order == sorted(order)
+
+
+@pytest.mark.parametrize("limit", [1, 3, 50])
+def test_api_gene_pages_cover_the_result(app, limit):
+    symbol = busiest(app, """
+        SELECT g.symbol FROM Genes g JOIN Associations a ON a.gid = g.gid
+        GROUP BY g.symbol ORDER BY COUNT(*) DESC, g.symbol LIMIT 1
+    """)
+    params = {'symbol': symbol, 'activity_score': '0'}
+    expected = all_rows(app, app.symbol_query(**app.gene_params(params)))
+
+    rows = page_through(app.app.test_client(), '/api/gene', params, limit)
+    assert len(expected) > 3
+    assert sorted(map(row_key, rows)) == sorted(map(row_key, expected))
+    assert_in_display_order(app, rows)
+
+
+@pytest.mark.parametrize("limit", [3, 50])
+def test_api_region_pages_cover_the_result(app, limit):
+    chromosome = busiest(app, "SELECT chromosome FROM Enhancers GROUP BY chromosome ORDER BY COUNT(*) DESC LIMIT 1")
+    params = {'chr': chromosome, 'start': '0', 'end': '3000000'}
+    expected = all_rows(app, app.region_query(**app.region_params(params)))
+
+    rows = page_through(app.app.test_client(), '/api/region', params, limit)
+    assert len(expected) > 3
+    assert sorted(map(row_key, rows)) == sorted(map(row_key, expected))
+    assert_in_display_order(app, rows)
+
+
+def test_gene_page_cursor_covers_the_result(app):
+    symbol = busiest(app, """
+        SELECT g.symbol FROM Genes g JOIN Associations a ON a.gid = g.gid
+        GROUP BY g.symbol ORDER BY COUNT(*) DESC, g.symbol LIMIT 1
+    """)
+    params = app.gene_params({'symbol': symbol, 'activity_score': '0'})
+    expected = all_rows(app, app.symbol_query(**params))
+
+    rows, after = [], None
+    while True:
+        page, cursor = app.gene_page(params, after, limit=2)
+        rows.extend(page)
+        if cursor is None:
+            break
+        after = app.decode_cursor(cursor, len(app.ASSOCIATION_KEY))
+    assert sorted(map(row_key, rows)) == sorted(map(row_key, expected))
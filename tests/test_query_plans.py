@@ -0,0 +1,12 @@
+"""Every search in migrations.PLAN_CHECKS is answered through an index, never a whole-table scan"""
+
+import pytest
+
+from migrations import PLAN_CHECKS, plan_scans, sample_values
+
+
+@pytest.mark.parametrize("check", PLAN_CHECKS, ids=[check[0] for check in PLAN_CHECKS])
+def test_search_reads_no_whole_table(app, check):
+    with app.db_connection() as conn:
+        cursor = conn.cursor()
+        assert plan_scans(app, cursor, check, sample_values(cursor)) == []
@@ -0,0 +1,20 @@
+"""Reseeding a database that already holds a generation of tables (TEST_MARIADB=1 only)"""
+
+from table_upload import connect_db
+
+
+def enhancer_ids():
+    conn = connect_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT eid, name, exp_condition FROM Enhancers ORDER BY eid")
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def test_bulk_reseed_twice_keeps_enhancer_ids(reseed):
+    reseed("--bulk")
+    before = enhancer_ids()
+    reseed("--bulk")
+    assert before and enhancer_ids() == before
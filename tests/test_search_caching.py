@@ -0,0 +1,41 @@
+"""GET searches: a temporary redirect to the canonical URL, and cache headers only on answers worth keeping"""
+
+
+def test_redirect_to_canonical_query_is_temporary(app):
+    response = app.app.test_client().get('/api/tiles', query_string=[('start', '0'), ('chr', '2L'), ('end', '1000')])
+    assert response.status_code == 302
+    assert response.location.endswith('/api/tiles?chr=2L&end=1000&start=0')
+
+
+def test_canonical_search_is_cacheable(app):
+    client = app.app.test_client()
+    response = client.get('/api/tiles?chr=2L&end=1000&start=0')
+    assert response.status_code == 200
+    assert response.cache_control.public and response.get_etag()[0]
+
+    again = client.get('/api/tiles?chr=2L&end=1000&start=0', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_error_answer_is_not_cached(app):
+    response = app.app.test_client().get('/api/tiles?chr=2L&end=0&start=1000')
+    assert response.status_code == 400
+    assert response.cache_control.no_store
+    assert not response.cache_control.public and response.cache_control.max_age is None
+    assert response.get_etag() == (None, None)
+
+
+def test_page_after_database_error_is_not_cached(app, monkeypatch):
+    client = app.app.test_client()
+    url = '/submit_region?chr=2L&end=3000000&start=0'
+    assert client.get(url).status_code == 200
+
+    def unavailable():
+        raise app.mariadb.Error("pool exhausted")
+    monkeypatch.setattr(app, 'connect_db', unavailable)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.cache_control.no_store
+    assert not response.cache_control.public and response.cache_control.max_age is None
+    assert response.get_etag() == (None, None) and response.last_modified is None
@@ -0,0 +1,38 @@
+"""The SQLite snapshot behind the mariadb cursor API, errors included"""
+
+import pytest
+
+import snapshot
+
+# The second row overflows, so SQLite fails while fetching rather than in execute()
+FAILS_ON_SECOND_ROW = "SELECT abs(x) FROM (SELECT 1 AS x UNION ALL SELECT -9223372036854775807 - 1)"
+
+
+class ConnectorError(Exception):
+    pass
+
+
+@pytest.fixture
+def cursor(snapshot_path):
+    conn = snapshot.connect(snapshot_path, error=ConnectorError)
+    yield conn.cursor()
+    conn.close()
+
+
+def test_fetchmany_pages_through_rows(cursor):
+    cursor.execute("SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3")
+    assert cursor.fetchmany(2) == [(1,), (2,)]
+    assert cursor.fetchmany(2) == [(3,)]
+    assert cursor.fetchmany() == []
+
+
+@pytest.mark.parametrize("fetch", [
+    lambda cursor: cursor.fetchall(),
+    lambda cursor: cursor.fetchmany(5),
+    lambda cursor: [cursor.fetchone(), cursor.fetchone()],
+    lambda cursor: list(cursor),
+], ids=["fetchall", "fetchmany", "fetchone", "iterate"])
+def test_errors_while_fetching_use_the_connector_error(cursor, fetch):
+    cursor.execute(FAILS_ON_SECOND_ROW)
+    with pytest.raises(ConnectorError, match="overflow"):
+        fetch(cursor)